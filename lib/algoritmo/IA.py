@@ -5,18 +5,62 @@ import time
 import queue
 import threading
 from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 import traceback
 
+try:
+    from .motion_gate import MotionGate
+    from .frame_scheduler import FrameScheduler
+    from .alert_state import AlertTracker
+    from .tracker import ObjectTracker
+    from .backends import PROFILES, load_profile, wrap_model
+    from .postprocess import ClassTable, is_weapon_name, parse_predictions
+    from .inference_pool import start_pool
+except ImportError:  # Imported as a top-level module (scripts in this directory)
+    from motion_gate import MotionGate
+    from frame_scheduler import FrameScheduler
+    from alert_state import AlertTracker
+    from tracker import ObjectTracker
+    from backends import PROFILES, load_profile, wrap_model
+    from postprocess import ClassTable, is_weapon_name, parse_predictions
+    from inference_pool import start_pool
+
+def _percentile(values, pct):
+    """Return the pct-th percentile of a list of numbers (nearest rank)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
 class WeaponDetector:
-    def __init__(self, model_path=None, conf_threshold=0.25, detection_threshold=2, cooldown_period=10):
+    def __init__(self, model_path=None, conf_threshold=0.25, detection_threshold=2, cooldown_period=10,
+                 max_batch_size=1, max_batch_wait=0.005, model=None, result_buffer_size=100,
+                 motion_gating=False, motion_threshold=0.01, max_queued_frames=64, adaptive_sampling=False,
+                 quiet_interval=1.0, tracking=False, backend='auto', threads=0, profile='full',
+                 workers=0):
         """
         Initialize the weapon detection model
         
         Args:
             model_path: Path to the YOLO model file
             conf_threshold: Minimum confidence for detection
-            detection_threshold: Number of detections required to trigger alert
-            cooldown_period: Seconds to wait before a new alert can be triggered
+            detection_threshold: Number of detections among a camera's recent frames required to trigger its alert
+            cooldown_period: Seconds to wait before the same camera can trigger a new alert
+            max_batch_size: Maximum number of frames per forward pass (1 disables batching)
+            max_batch_wait: Seconds to wait for more frames once the first frame of a batch arrived
+            model: Already loaded model, backend or stub with the same interface; skips loading model_path
+            result_buffer_size: Number of recent results kept in memory (older ones are dropped)
+            motion_gating: Reuse the last result of a camera for frames without motion (default for all cameras)
+            motion_threshold: Share of changed pixels below which a frame counts as static
+            max_queued_frames: Frames waiting for inference over all cameras together
+            adaptive_sampling: Sample fewer frames of quiet cameras (default for all cameras)
+            quiet_interval: Seconds between sampled frames of a camera with nothing detected for a while
+            tracking: Follow objects across frames and alert once per tracked weapon (default for all cameras)
+            backend: Inference backend ('auto', 'onnx', 'openvino', 'ultralytics', 'torchhub' or 'fake')
+            threads: Intra-op threads of the backend (0 keeps the runtime's default)
+            profile: Inference profile ('full', 'fast' or 'int8', default for all cameras)
+            workers: Worker processes running inference in parallel (0 runs it in the detection thread)
         """
         # Set defaults
         if model_path is None:
@@ -28,47 +72,89 @@ class WeaponDetector:
         self.detection_threshold = detection_threshold
         self.cooldown_period = cooldown_period
         self.model_path = model_path
+        self.backend = backend
+        self.threads = threads
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown profile {profile}, expected one of {', '.join(PROFILES)}")
+        self.profile = profile
+        self.workers = max(0, int(workers))
+        self.pool = None
+        
+        # Models per inference profile (loaded when a camera first asks for one) and profile per camera
+        self.profiles_lock = threading.Lock()
+        self.profile_models = {}
+        self.camera_profiles = {}
+        # Class names and weapon flags per loaded model, built once instead of per box
+        self.class_tables = {}
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_batch_wait = max(0.0, float(max_batch_wait))
         
-        # Detection state tracking
-        self.recent_detections = deque(maxlen=10)  # Reduced size for faster response
-        self.last_notification_time = 0
-        self.detection_active = False
+        # Detection state tracking, per camera (small window for faster response)
+        self.alerts = AlertTracker(threshold=detection_threshold, cooldown=cooldown_period, window=10)
+        self.tracker = ObjectTracker(enabled=tracking)
         
         # Processing queues and threading
-        self.frame_queue = queue.Queue(maxsize=5)  # Smaller queue to reduce latency
-        self.result_queue = queue.Queue()
+        # Small queue per camera to reduce latency, served in weighted round robin
+        self.frame_queue = FrameScheduler(max_pending=max(max_queued_frames, self.max_batch_size * 2),
+                                          adaptive=adaptive_sampling, max_interval=quiet_interval)
         self.notification_queue = queue.Queue()
         self.running = False
         self.model = None
         
-        # Try to load the model immediately
-        self._load_model(model_path)
+        # Bounded result store: latest result per camera plus a ring of recent results.
+        # Results only hold the frame when the caller asked for it (keep_frame).
+        self.results_lock = threading.Lock()
+        self.latest_results = {}
+        self.result_buffer = deque(maxlen=max(1, int(result_buffer_size)))
+        self.results_dropped = 0
+        
+        # Motion pre-filter, with settings per camera
+        self.motion_gate = MotionGate(enabled=motion_gating, threshold=motion_threshold)
+        
+        # Batching statistics (bounded so they never grow with uptime)
+        self.stats_lock = threading.Lock()
+        self.batch_count = 0
+        self.batched_frames = 0
+        self.batch_size_histogram = {}
+        self.frame_latencies = deque(maxlen=1000)
+        self.batch_inference_times = deque(maxlen=1000)
+        
+        # Use the given model or try to load it immediately
+        if model is not None:
+            self.model = wrap_model(model)
+        elif self.workers:
+            self._start_pool(model_path)
+        else:
+            self._load_model(model_path)
+        if self.model is not None:
+            self.profile_models[self.profile] = self.model
+            # Inference runs in an InferencePool when the model is one of its backends
+            self.pool = getattr(self.model, 'pool', None)
         
     def _load_model(self, model_path):
-        """Load the weapon detection model"""
-        if not os.path.exists(model_path):
-            print(f"Error: Model file not found at {model_path}")
-            return
-            
+        """Load the weapon detection model with the configured backend and default profile"""
         try:
-            print(f"Loading model from: {model_path}")
-            # Try YOLOv8 first (ultralytics package)
-            try:
-                from ultralytics import YOLO
-                self.model = YOLO(model_path)
-                print("Model loaded successfully with ultralytics YOLO")
-            except ImportError:
-                # Fall back to YOLOv5 with torch hub
-                import torch
-                self.model = torch.hub.load('ultralytics/yolov5', 'custom', path=model_path)
-                self.model.conf = self.conf_threshold
-                self.model.iou = 0.45  # NMS IoU threshold
-                print("Model loaded successfully with torch.hub YOLOv5")
+            print(f"Loading model from: {model_path} (backend: {self.backend}, profile: {self.profile})")
+            self.model = load_profile(self.profile, self.backend, model_path, self.threads)
+            print(f"Model loaded successfully with the {self.model.kind} backend")
         except Exception as e:
             print(f"Error loading model: {e}")
             traceback.print_exc()
             self.model = None
             
+    def _start_pool(self, model_path):
+        """Start the worker processes, each loading the model of the default profile"""
+        try:
+            print(f"Starting {self.workers} inference workers (backend: {self.backend}, profile: {self.profile})")
+            pool = start_pool(self.workers, self.profile, self.backend, model_path, self.threads)
+            self.model = pool.backend(self.profile)
+            print(f"Inference workers started with the {self.model.kind} backend, "
+                  f"{pool.threads} threads each")
+        except Exception as e:
+            print(f"Error starting inference workers: {e}")
+            traceback.print_exc()
+            self.model = None
+            
     def start(self):
         """Start the detection thread"""
         if self.model is None:
@@ -76,7 +162,12 @@ class WeaponDetector:
             return False
             
         self.running = True
-        self.detection_thread = threading.Thread(target=self._detection_loop)
+        # Backends running several batches at once (worker processes) get a pipelined loop
+        concurrency = getattr(self.model, 'concurrency', 1)
+        if concurrency > 1:
+            self.detection_thread = threading.Thread(target=self._pipelined_detection_loop, args=(concurrency,))
+        else:
+            self.detection_thread = threading.Thread(target=self._detection_loop)
         self.detection_thread.daemon = True
         self.detection_thread.start()
         print("Weapon detection started")
@@ -87,93 +178,85 @@ class WeaponDetector:
         self.running = False
         if hasattr(self, 'detection_thread') and self.detection_thread.is_alive():
             self.detection_thread.join(timeout=2.0)
+            
+        # Release callers still waiting on frames that will never be processed
+        for item in self.frame_queue.drain():
+            self._resolve_dropped(item)
         print("Weapon detection stopped")
         
-    def process_frame(self, frame):
-        """Add a frame to the processing queue"""
+    def process_frame(self, frame, camera_id=None, keep_frame=False):
+        """
+        Add a frame to the processing queue, tagged with the camera it came from
+        
+        Returns a Future that resolves to the result dict of this exact frame (or to
+        None if the frame was dropped to make room for newer ones), or None if the
+        frame could not be queued. The frame is only kept in the result when
+        keep_frame is set, e.g. to draw an annotated image.
+        """
         if self.running:
-            try:
-                # Replace the oldest frame if queue is full to avoid blocking
-                if self.frame_queue.full():
-                    try:
-                        self.frame_queue.get_nowait()
-                    except queue.Empty:
-                        pass
-                
-                self.frame_queue.put(frame, block=False)
-                return True
-            except queue.Full:
-                return False
+            # Between samples or static scene: hand back the last result of this camera without inference
+            last_result = self.get_latest_result(camera_id) if camera_id is not None else None
+            if not self.frame_queue.should_sample(camera_id, last_result):
+                return self._reuse_result(last_result, frame, keep_frame, 'sampled_out')
+            if camera_id is not None and self.motion_gate.should_skip(camera_id, frame, last_result):
+                return self._reuse_result(last_result, frame, keep_frame, 'motion_skipped')
+            
+            item = {
+                'frame': frame,
+                'camera_id': camera_id,
+                'profile': self.camera_profiles.get(camera_id, self.profile),
+                'keep_frame': keep_frame,
+                'submitted_at': time.time(),
+                'future': Future()
+            }
+            # Replace the oldest frame of this camera if its queue is full to avoid blocking
+            for dropped in self.frame_queue.put(item):
+                self._resolve_dropped(dropped)
+            return item['future']
         else:
             # Auto-start if not running
             if self.model is not None:
                 self.start()
-                return self.process_frame(frame)
-        return False
+                return self.process_frame(frame, camera_id, keep_frame)
+        return None
+        
+    def _reuse_result(self, last_result, frame, keep_frame, reason):
+        """Resolved future with a copy of the last result, marked with why inference was skipped"""
+        result = {key: value for key, value in last_result.items() if key != 'frame'}
+        result.update({'timestamp': time.time(), 'notification': None, 'motion_skipped': False,
+                       'sampled_out': False})
+        result[reason] = True
+        if keep_frame:
+            result['frame'] = frame
+        future = Future()
+        future.set_result(result)
+        return future
+        
+    def _resolve_dropped(self, item):
+        """Resolve the future of a frame that was discarded without inference"""
+        if not item['future'].done():
+            item['future'].set_result(None)
         
     def _detection_loop(self):
         """Main detection thread loop"""
         while self.running:
+            batch = []
             try:
-                # Get frame from queue with timeout to allow checking running state
-                frame = self.frame_queue.get(timeout=0.5)  # Shorter timeout for responsiveness
-                
-                # Perform detection
-                if hasattr(self.model, 'predict'):  # YOLOv8 style
-                    results = self.model.predict(
-                        source=frame,
-                        conf=self.conf_threshold,
-                        verbose=False
-                    )
-                else:  # YOLOv5 style
-                    results = self.model(frame)
-                
-                # Process results
-                weapons_detected = False
-                detections = []
-                
-                # Different processing depending on the model type
-                if hasattr(results, 'xyxy'):  # YOLOv5 style results
-                    for pred in results.xyxy[0].tolist():
-                        x1, y1, x2, y2, conf, cls = pred
-                        class_name = self.model.names[int(cls)]
-                        
-                        if self._is_weapon_class(class_name):
-                            weapons_detected = True
-                            
-                        detections.append((class_name, float(conf), (x1, y1, x2, y2)))
-                else:  # YOLOv8 style results
-                    for r in results:
-                        if r.boxes is not None:
-                            for box in r.boxes:
-                                # Get class ID and name
-                                cls = int(box.cls[0])
-                                class_name = self.model.names[cls]
-                                conf = float(box.conf[0])
-                                
-                                # Get bounding box
-                                x1, y1, x2, y2 = box.xyxy[0].tolist()
-                                
-                                if self._is_weapon_class(class_name):
-                                    weapons_detected = True
-                                    
-                                detections.append((class_name, conf, (x1, y1, x2, y2)))
-                
-                # Update detection history
-                self.recent_detections.append(weapons_detected)
+                # Get frames from queue with timeout to allow checking running state
+                batch = self._collect_batch()
+                frames = [item['frame'] for item in batch]
                 
-                # Check if we should trigger notification
-                self._check_detection_threshold()
+                # Perform detection on the whole batch in a single forward pass (one per profile in it)
+                inference_start = time.time()
+                batch_results = self._predict_batch(frames, [item['profile'] for item in batch])
+                inference_end = time.time()
+                self._record_batch_stats(batch, inference_start, inference_end)
                 
-                # Store processed results
-                self.result_queue.put({
-                    'frame': frame,
-                    'weapons_detected': weapons_detected,
-                    'detections': detections,
-                    'alert_triggered': self.detection_active
-                })
+                # Route each result back to the camera its frame came from
+                self._route_results(batch, batch_results, inference_end)
                 
-                self.frame_queue.task_done()
+                # Do not keep the decoded frames alive while waiting for the next batch
+                frames.clear()
                 
             except queue.Empty:
                 pass  # Just continue if no frames
@@ -181,41 +264,206 @@ class WeaponDetector:
                 print(f"Error in detection loop: {e}")
                 traceback.print_exc()
                 
-    def _is_weapon_class(self, class_name):
-        """Check if the class name represents a weapon that should trigger alerts"""
-        # APENAS estas classes específicas devem gerar alertas
-        weapon_classes = ['gun', 'pistol', 'rifle', 'firearms', 'knife', 'weapon']
-        class_lower = class_name.lower()
+                # Fail the frames of this batch instead of leaving callers waiting
+                self._fail_batch(batch, e)
+                
+    def _pipelined_detection_loop(self, concurrency):
+        """Detection loop keeping up to `concurrency` batches in inference at once (worker processes)"""
+        in_flight = deque()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            while self.running or in_flight:
+                if self.running and len(in_flight) < concurrency:
+                    try:
+                        # Only wait briefly for frames while batches are running, they may finish first
+                        batch = self._collect_batch(timeout=0.005 if in_flight else 0.5)
+                        future = executor.submit(self._predict_batch, [item['frame'] for item in batch],
+                                                 [item['profile'] for item in batch])
+                        in_flight.append((batch, time.time(), future))
+                    except queue.Empty:
+                        pass
+                        
+                if in_flight and (len(in_flight) == concurrency or not self.running):
+                    wait([in_flight[0][2]], timeout=0.5)
+                    
+                # Route finished batches in the order they were taken, so each camera's results stay in order
+                while in_flight and in_flight[0][2].done():
+                    batch, inference_start, future = in_flight.popleft()
+                    try:
+                        batch_results = future.result()
+                        inference_end = time.time()
+                        self._record_batch_stats(batch, inference_start, inference_end)
+                        self._route_results(batch, batch_results, inference_end)
+                    except Exception as e:
+                        print(f"Error in detection loop: {e}")
+                        traceback.print_exc()
+                        self._fail_batch(batch, e)
+                        
+    def _route_results(self, batch, batch_results, inference_end):
+        """Route each result back to the camera its frame came from"""
+        for item, (weapons_detected, detections) in zip(batch, batch_results):
+            # Update the camera's sampling rate
+            self.frame_queue.record_result(item['camera_id'], weapons_detected,
+                                           inference_end - item['submitted_at'], inference_end)
+            
+            # Follow the boxes across frames when tracking is on for this camera
+            tracking = self.tracker.update(item['camera_id'], detections, self._is_weapon_class, inference_end)
+            
+            # Update the camera's detection history and check if we should trigger notification
+            if tracking is None:
+                notification, alert_active = self._check_detection_threshold(item['camera_id'],
+                                                                             weapons_detected)
+            else:
+                notification, alert_active = self._check_tracked_weapons(item['camera_id'], tracking)
+            
+            # Store processed results, without the frame unless it was requested
+            result = {
+                'camera_id': item['camera_id'],
+                'profile': item['profile'],
+                'timestamp': inference_end,
+                'weapons_detected': weapons_detected,
+                'detections': detections,
+                'alert_triggered': alert_active,
+                'notification': notification,
+                'motion_skipped': False,
+                'sampled_out': False
+            }
+            if tracking is not None:
+                result['track_ids'] = tracking['track_ids']
+                result['tracks'] = tracking['tracks']
+            frame = item.pop('frame')
+            if item['keep_frame']:
+                result['frame'] = frame
+            self._store_result(result)
+            
+            # Hand the result to the caller waiting on this frame
+            item['future'].set_result(result)
         
-        # Verificação exata para evitar falsos positivos
-        for weapon_class in weapon_classes:
-            if weapon_class in class_lower:
-                return True
+    def _fail_batch(self, batch, error):
+        """Fail the frames of a batch instead of leaving callers waiting"""
+        for item in batch:
+            if not item['future'].done():
+                item['future'].set_exception(error)
+                
+    def _store_result(self, result):
+        """Keep the result in the per-camera slot and the bounded ring of recent results"""
+        with self.results_lock:
+            if len(self.result_buffer) == self.result_buffer.maxlen:
+                self.results_dropped += 1
+            self.result_buffer.append(result)
+            self.latest_results[result['camera_id']] = result
+            
+    def _collect_batch(self, timeout=0.5):
+        """Wait for a frame, then gather up to max_batch_size frames or until max_batch_wait expires"""
+        batch = [self.frame_queue.get(timeout=timeout)]  # Shorter timeout for responsiveness
+        deadline = time.time() + self.max_batch_wait
         
-        return False
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.time()
+            try:
+                if remaining > 0:
+                    batch.append(self.frame_queue.get(timeout=remaining))
+                else:
+                    # Deadline passed, only take frames that are already waiting
+                    batch.append(self.frame_queue.get_nowait())
+            except queue.Empty:
+                break
                 
-    def _check_detection_threshold(self):
-        """Check if detection threshold has been reached and trigger notification if necessary"""
-        if not self.recent_detections:
-            return
+        return batch
+        
+    def _predict_batch(self, frames, profiles):
+        """Run one forward pass per profile over a list of frames and return (weapons_detected, detections) per frame"""
+        groups = {}
+        for index, profile in enumerate(profiles):
+            groups.setdefault(profile, []).append(index)
             
-        # Count True values in the recent detections
-        detection_count = sum(1 for d in self.recent_detections if d)
+        parsed = [None] * len(frames)
+        for profile, indexes in groups.items():
+            model = self.profile_models.get(profile, self.model)
+            predictions = model.predict([frames[i] for i in indexes], self.conf_threshold)
+            if len(predictions) != len(indexes):
+                raise RuntimeError(f"Model returned {len(predictions)} results for a batch of {len(indexes)} frames")
+            table = self._class_table(model)
+            for index, preds in zip(indexes, predictions):
+                parsed[index] = parse_predictions(preds, table)
+        return parsed
         
-        # Check for cooldown period
-        current_time = time.time()
-        time_since_last_notification = current_time - self.last_notification_time
+    def _class_table(self, model):
+        """Class table of a model, built from model.names the first time the model is used"""
+        table = self.class_tables.get(model)
+        if table is None:
+            table = self.class_tables[model] = ClassTable(model.names)
+        return table
         
-        if detection_count >= self.detection_threshold and time_since_last_notification > self.cooldown_period:
-            if not self.detection_active:
-                self.detection_active = True
-                self.last_notification_time = current_time
-                self._send_notification("ALERTA: Arma detectada pela câmera!")
-                print("🚨 WEAPON ALERT TRIGGERED! 🚨")
+    def _record_batch_stats(self, batch, inference_start, inference_end):
+        """Record batch size, inference time and per-frame latency (queue wait + inference)"""
+        with self.stats_lock:
+            self.batch_count += 1
+            self.batched_frames += len(batch)
+            self.batch_size_histogram[len(batch)] = self.batch_size_histogram.get(len(batch), 0) + 1
+            self.batch_inference_times.append(inference_end - inference_start)
+            for item in batch:
+                self.frame_latencies.append(inference_end - item['submitted_at'])
                 
-        # Reset detection active state if no detections for a while
-        elif detection_count == 0 and self.detection_active:
-            self.detection_active = False
+    def get_batch_stats(self):
+        """Get batch-size and latency statistics to tune max_batch_size and max_batch_wait"""
+        with self.stats_lock:
+            latencies = list(self.frame_latencies)
+            inference_times = list(self.batch_inference_times)
+            histogram = dict(sorted(self.batch_size_histogram.items()))
+            batch_count = self.batch_count
+            batched_frames = self.batched_frames
+            
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_batch_wait_ms': self.max_batch_wait * 1000,
+            'batches': batch_count,
+            'frames': batched_frames,
+            'avg_batch_size': batched_frames / batch_count if batch_count else 0.0,
+            'batch_size_histogram': histogram,
+            'avg_inference_ms': 1000 * sum(inference_times) / len(inference_times) if inference_times else 0.0,
+            'latency_ms': {
+                'p50': 1000 * _percentile(latencies, 50),
+                'p95': 1000 * _percentile(latencies, 95),
+                'p99': 1000 * _percentile(latencies, 99),
+                'max': 1000 * max(latencies) if latencies else 0.0
+            }
+        }
+        
+    def _is_weapon_class(self, class_name):
+        """Check if the class name represents a weapon that should trigger alerts"""
+        return is_weapon_name(class_name)
+                
+    def _check_detection_threshold(self, camera_id, weapons_detected):
+        """
+        Check if the camera's detection threshold has been reached and trigger notification if necessary
+        
+        Returns the notification sent for this frame (or None) and whether the camera is in alert.
+        """
+        notify, active = self.alerts.update(camera_id, weapons_detected)
+        if not notify:
+            return None, active
+            
+        if camera_id is not None:
+            notification = self._send_notification(f"ALERTA: Arma detectada pela câmera {camera_id}!")
+        else:
+            notification = self._send_notification("ALERTA: Arma detectada pela câmera!")
+        print(f"🚨 WEAPON ALERT TRIGGERED! 🚨 (camera {camera_id})")
+        return notification, active
+            
+    def _check_tracked_weapons(self, camera_id, tracking):
+        """
+        Trigger one notification for the weapon tracks that were just confirmed
+        
+        Returns the notification sent for this frame (or None) and whether the camera is in alert.
+        """
+        if not tracking['new_weapons']:
+            return None, tracking['active']
+            
+        track_ids = ', '.join(str(track_id) for track_id in tracking['new_weapons'])
+        notification = self._send_notification(f"ALERTA: Arma detectada pela câmera {camera_id}! (objeto {track_ids})")
+        notification['track_ids'] = tracking['new_weapons']
+        print(f"🚨 WEAPON ALERT TRIGGERED! 🚨 (camera {camera_id}, track {track_ids})")
+        return notification, tracking['active']
             
     def _send_notification(self, message):
         """Send a notification about detected weapon"""
@@ -229,18 +477,125 @@ class WeaponDetector:
                 break
                 
         # Add the new notification
-        self.notification_queue.put({
+        notification = {
             'message': message,
             'timestamp': time.time()
-        })
+        }
+        self.notification_queue.put(notification)
+        return notification
         
-    def get_latest_result(self):
-        """Get the latest processing result if available"""
-        try:
-            return self.result_queue.get(block=False)
-        except queue.Empty:
-            return None
+    def get_latest_result(self, camera_id=None):
+        """Get the latest processing result (of a given camera, if specified) if available"""
+        with self.results_lock:
+            if camera_id is not None:
+                return self.latest_results.get(camera_id)
+            return self.result_buffer[-1] if self.result_buffer else None
             
+    def get_result_stats(self):
+        """Get the size of the result store and how many results were dropped from it"""
+        with self.results_lock:
+            return {
+                'buffered': len(self.result_buffer),
+                'capacity': self.result_buffer.maxlen,
+                'dropped': self.results_dropped,
+                'cameras': len(self.latest_results),
+                'with_frames': sum(1 for r in self.result_buffer if 'frame' in r)
+            }
+            
+    def configure_camera(self, camera_id, settings):
+        """
+        Change the settings of one camera at runtime, e.g. {'motion': {'threshold': 0.02}}
+        
+        Returns all settings of the camera; raises ValueError for unknown settings.
+        """
+        sections = {
+            'motion': self.motion_gate.configure,
+            'scheduling': self.frame_queue.configure,
+            'alert': self.alerts.configure,
+            'tracking': self.tracker.configure,
+            'inference': self._configure_inference
+        }
+        for section, values in settings.items():
+            if section not in sections:
+                raise ValueError(f"Unknown settings section: {section}")
+            if not isinstance(values, dict):
+                raise ValueError(f"Settings section {section} must be an object")
+        for section, values in settings.items():
+            sections[section](camera_id, values)
+        return self.get_camera_settings(camera_id)
+        
+    def get_camera_settings(self, camera_id):
+        """All settings of one camera"""
+        return {'motion': self.motion_gate.get_settings(camera_id),
+                'scheduling': self.frame_queue.get_settings(camera_id),
+                'alert': self.alerts.get_settings(camera_id),
+                'tracking': self.tracker.get_settings(camera_id),
+                'inference': {'profile': self.camera_profiles.get(camera_id, self.profile)}}
+        
+    def _configure_inference(self, camera_id, settings):
+        """Choose the inference profile of one camera, loading its model on first use"""
+        for name in settings:
+            if name != 'profile':
+                raise ValueError(f"Unknown inference setting: {name}")
+        profile = settings.get('profile')
+        if profile is None:
+            self.camera_profiles.pop(camera_id, None)
+            return
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown profile {profile}, expected one of {', '.join(PROFILES)}")
+            
+        with self.profiles_lock:
+            if profile not in self.profile_models:
+                try:
+                    if self.pool is not None:
+                        self.profile_models[profile] = self.pool.backend(profile)
+                    else:
+                        self.profile_models[profile] = load_profile(profile, self.backend, self.model_path,
+                                                                    self.threads)
+                except Exception as e:
+                    raise ValueError(f"Could not load profile {profile}: {e}")
+        self.camera_profiles[camera_id] = profile
+        
+    def get_profile_stats(self):
+        """Loaded inference profiles and the cameras using each one"""
+        cameras = dict(self.camera_profiles)
+        return {
+            'default': self.profile,
+            'loaded': {profile: model.kind for profile, model in self.profile_models.items()},
+            'cameras': {profile: sorted((c for c, p in cameras.items() if p == profile), key=str)
+                        for profile in PROFILES}
+        }
+        
+    def get_worker_stats(self):
+        """Inference worker processes: alive, restarted, and batches each one ran (None without workers)"""
+        return self.pool.get_stats() if self.pool is not None else None
+        
+    def get_motion_stats(self):
+        """Frames skipped by the motion gate (inferences saved), per camera and in total"""
+        return self.motion_gate.get_stats()
+        
+    def get_scheduler_stats(self):
+        """Frames submitted, sampled out, dropped and processed per camera, with their latency"""
+        cameras = self.frame_queue.get_stats()
+        for stats in cameras.values():
+            latencies = stats.pop('latencies')
+            stats['latency_ms'] = {
+                'p50': 1000 * _percentile(latencies, 50),
+                'p95': 1000 * _percentile(latencies, 95),
+                'max': 1000 * max(latencies) if latencies else 0.0
+            }
+        totals = {name: sum(stats[name] for stats in cameras.values())
+                  for name in ('submitted', 'sampled_out', 'dropped', 'processed', 'queued')}
+        return dict(totals, cameras=cameras)
+        
+    def get_alert_stats(self):
+        """Cameras currently in alert and alerts raised so far"""
+        return self.alerts.get_stats()
+        
+    def get_tracking_stats(self):
+        """Live tracks per camera, and tracks confirmed and ended so far"""
+        return self.tracker.get_stats()
+        
     def get_notification(self):
         """Get pending notification if available"""
         try:
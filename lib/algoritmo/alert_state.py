@@ -0,0 +1,79 @@
+import time
+import threading
+from collections import deque
+
+try:
+    from .camera_settings import CameraSettings, at_least
+except ImportError:  # Imported as a top-level module (scripts in this directory)
+    from camera_settings import CameraSettings, at_least
+
+
+class AlertTracker(CameraSettings):
+    """
+    Per-camera alert state: a sliding window of recent results, an active flag and a cooldown
+
+    Each camera keeps the weapon/no-weapon outcome of its last `window` inferences
+    together with a running count of the positive ones, so checking the threshold
+    costs the same whatever the window size. Cameras never share a window or a
+    cooldown: detections of one camera cannot trigger or mute another camera's alert.
+    """
+
+    # Per-camera settings and their defaults
+    SETTINGS = {
+        'threshold': int,    # Detections in the window needed to trigger an alert
+        'cooldown': float,   # Seconds after an alert before the camera can trigger a new one
+        'window': int        # Number of recent inferences considered
+    }
+    SECTION = 'alert'
+
+    def __init__(self, threshold=2, cooldown=10, window=10):
+        super().__init__(threshold=threshold, cooldown=cooldown, window=window)
+        self.cameras = {}
+        self.notifications = 0
+        self.lock = threading.Lock()
+
+    def check(self, values):
+        at_least(values, ('threshold', 'window'), 1)
+        at_least(values, ('cooldown',), 0)
+
+    def update(self, camera_id, weapons_detected, now=None):
+        """
+        Add the outcome of one inference of the camera to its window
+
+        Returns (notify, active): whether this result raises a new alert, and
+        whether the camera is in alert after it.
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            settings = self._settings(camera_id)
+            state = self.cameras.get(camera_id)
+            if state is None:
+                state = self.cameras[camera_id] = {'window': deque(), 'count': 0, 'active': False,
+                                                   'last_notification': 0.0}
+
+            # Slide the window: whatever leaves it is subtracted from the running count
+            window = state['window']
+            while len(window) >= settings['window']:
+                state['count'] -= window.popleft()
+            window.append(bool(weapons_detected))
+            state['count'] += window[-1]
+
+            if state['count'] >= settings['threshold'] and now - state['last_notification'] > settings['cooldown']:
+                if not state['active']:
+                    state['active'] = True
+                    state['last_notification'] = now
+                    self.notifications += 1
+                    return True, True
+            # Reset the active state once the window holds no detection
+            elif state['count'] == 0 and state['active']:
+                state['active'] = False
+            return False, state['active']
+
+    def get_stats(self):
+        """Cameras currently in alert and alerts raised so far"""
+        with self.lock:
+            return {
+                'cameras': len(self.cameras),
+                'active': sorted((camera_id for camera_id, state in self.cameras.items() if state['active']), key=str),
+                'notifications': self.notifications
+            }
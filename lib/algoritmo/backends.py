@@ -0,0 +1,436 @@
+import os
+import sys
+import ast
+import json
+import time
+import argparse
+import cv2
+import numpy as np
+
+try:
+    from .postprocess import boxes_to_array
+except ImportError:  # Imported as a top-level module (scripts in this directory)
+    from postprocess import boxes_to_array
+
+
+# Inference backends, for WeaponDetector(backend=...) and DETECTION_BACKEND
+BACKENDS = ('auto', 'onnx', 'openvino', 'ultralytics', 'torchhub', 'fake')
+
+# Inference profiles, chosen per camera to trade accuracy for speed
+PROFILES = {
+    'full': {'imgsz': None, 'int8': False},   # The model as exported (usually 640)
+    'fast': {'imgsz': 416, 'int8': False},    # Smaller network input: roughly 2.4x fewer pixels
+    'int8': {'imgsz': None, 'int8': True}     # Dynamically quantized ONNX model (export --int8)
+}
+
+
+class Backend:
+    """
+    Common interface of the inference backends
+
+    predict() runs one forward pass over a list of BGR frames and returns, per
+    frame, an (N, 6) float array of [x1, y1, x2, y2, confidence, class id] in
+    the frame's pixel coordinates. names maps class ids to class names.
+    """
+
+    kind = None
+    names = {}
+
+    def predict(self, frames, conf_threshold):
+        raise NotImplementedError
+
+
+class UltralyticsBackend(Backend):
+    """ultralytics YOLO (or any model with the same predict() interface)"""
+
+    kind = 'ultralytics'
+
+    def __init__(self, model, imgsz=None):
+        self.model = model
+        self.names = model.names
+        self.options = {'imgsz': imgsz} if imgsz else {}
+
+    def predict(self, frames, conf_threshold):
+        results = self.model.predict(source=frames, conf=conf_threshold, verbose=False, **self.options)
+        return [boxes_to_array(r.boxes) for r in results]
+
+
+class TorchHubBackend(Backend):
+    """YOLOv5 loaded through torch.hub"""
+
+    kind = 'torchhub'
+
+    def __init__(self, model, imgsz=None):
+        self.model = model
+        self.model.iou = 0.45  # NMS IoU threshold
+        self.names = model.names
+        self.options = {'size': imgsz} if imgsz else {}
+
+    def predict(self, frames, conf_threshold):
+        self.model.conf = conf_threshold
+        results = self.model(frames, **self.options)
+        return [preds.cpu().numpy() if hasattr(preds, 'cpu') else np.asarray(preds) for preds in results.xyxy]
+
+
+class ExportedBackend(Backend):
+    """
+    Shared pre- and post-processing of exported YOLO models (ONNX, OpenVINO IR)
+
+    Frames are letterboxed to the network input size and batched into one blob;
+    the raw output is decoded with NumPy (YOLOv8 and YOLOv5 layouts) followed by
+    class-aware NMS, so no torch or ultralytics is needed at inference time.
+    """
+
+    def __init__(self, model_path, input_shape, names, imgsz=None, iou_threshold=0.45, max_detections=300):
+        self.model_path = model_path
+        self.names = names
+        # Fixed batch size of the exported graph (None when the batch axis is dynamic)
+        self.batch_size = input_shape[0] if _is_static(input_shape[0]) else None
+        if _is_static(input_shape[2]) and _is_static(input_shape[3]):
+            self.input_size = (int(input_shape[2]), int(input_shape[3]))
+            if imgsz and self.input_size != (imgsz, imgsz):
+                raise ValueError(f"{model_path} has a fixed input size of {self.input_size}, "
+                                 f"export it with dynamic axes to run it at {imgsz}")
+        else:
+            self.input_size = (imgsz or 640, imgsz or 640)
+        self.iou_threshold = iou_threshold
+        self.max_detections = max_detections
+
+    def predict(self, frames, conf_threshold):
+        letterboxed = [letterbox(frame, self.input_size) for frame in frames]
+        blob = cv2.dnn.blobFromImages([image for image, _, _ in letterboxed], 1 / 255.0, swapRB=True)
+        if self.batch_size is None or self.batch_size == len(frames):
+            outputs = self._run(blob)
+        else:
+            # Graph exported with a fixed batch: one call per frame
+            outputs = np.concatenate([self._run(blob[i:i + 1]) for i in range(len(frames))])
+
+        predictions = []
+        for output, frame, (_, ratio, pad) in zip(outputs, frames, letterboxed):
+            preds = decode_output(output, len(self.names), conf_threshold, self.iou_threshold, self.max_detections)
+            predictions.append(scale_boxes(preds, ratio, pad, frame.shape))
+        return predictions
+
+    def _run(self, blob):
+        raise NotImplementedError
+
+
+class OnnxBackend(ExportedBackend):
+    """ONNX Runtime on the CPU"""
+
+    kind = 'onnx'
+
+    def __init__(self, model_path, threads=0, imgsz=None):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        super().__init__(model_path, self.session.get_inputs()[0].shape, read_names(model_path, metadata), imgsz)
+
+    def _run(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVinoBackend(ExportedBackend):
+    """OpenVINO IR (.xml + .bin) on the CPU"""
+
+    kind = 'openvino'
+
+    def __init__(self, model_path, threads=0, imgsz=None):
+        try:
+            from openvino import Core
+        except ImportError:  # openvino < 2023.1
+            from openvino.runtime import Core
+        core = Core()
+        model = core.read_model(model_path)
+        config = {'PERFORMANCE_HINT': 'LATENCY'}
+        if threads:
+            config['INFERENCE_NUM_THREADS'] = threads
+        self.compiled = core.compile_model(model, 'CPU', config)
+        self.output = self.compiled.output(0)
+        shape = [dim.get_length() if dim.is_static else None for dim in model.input(0).get_partial_shape()]
+        super().__init__(model_path, shape, read_names(model_path), imgsz)
+
+    def _run(self, blob):
+        return self.compiled(blob)[self.output]
+
+
+class FakeBackend(Backend):
+    """
+    Backend without a model, for tests and benchmarks
+
+    Every frame gets a person box, and every weapon_every-th frame a pistol box.
+    The cost model is a fixed overhead per forward pass plus a cost per frame.
+    """
+
+    kind = 'fake'
+    names = {0: 'person', 1: 'pistol', 2: 'knife'}
+
+    def __init__(self, batch_overhead=0.0, frame_cost=0.0, weapon_every=0):
+        self.batch_overhead = batch_overhead
+        self.frame_cost = frame_cost
+        self.weapon_every = weapon_every
+        self.calls = 0
+        self.frames_seen = 0
+
+    def predict(self, frames, conf_threshold):
+        if self.batch_overhead or self.frame_cost:
+            time.sleep(self.batch_overhead + self.frame_cost * len(frames))
+        self.calls += 1
+
+        predictions = []
+        for _ in frames:
+            self.frames_seen += 1
+            rows = [[10.0, 10.0, 50.0, 120.0, 0.9, 0]]
+            if self.weapon_every and self.frames_seen % self.weapon_every == 0:
+                rows.append([20.0, 40.0, 35.0, 60.0, 0.8, 1])
+            predictions.append(np.array(rows, dtype=np.float32))
+        return predictions
+
+
+def wrap_model(model):
+    """Backend for an already loaded model (ultralytics YOLO, torch.hub YOLOv5 or a stub of either)"""
+    if isinstance(model, Backend):
+        return model
+    if hasattr(model, 'predict'):  # YOLOv8 style
+        return UltralyticsBackend(model)
+    return TorchHubBackend(model)
+
+
+def load_backend(kind, model_path, threads=0, imgsz=None):
+    """
+    Load a model with the given backend
+
+    'auto' uses an exported model next to model_path when its runtime is
+    installed (model.onnx, then model_openvino_model/model.xml) and falls back
+    to ultralytics, then torch.hub. threads sets the intra-op thread count
+    (0 keeps the runtime's default) and imgsz the network input size (None
+    keeps the model's own).
+    """
+    if kind not in BACKENDS:
+        raise ValueError(f"Unknown backend {kind}, expected one of {', '.join(BACKENDS)}")
+    if kind == 'fake':
+        return FakeBackend()
+    if kind == 'auto':
+        kind, model_path = resolve_auto(model_path)
+        print(f"Backend 'auto' resolved to {kind} ({model_path})")
+    else:
+        model_path = exported_path(model_path, kind) or model_path
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Model file not found at {model_path}")
+
+    if kind == 'onnx':
+        return OnnxBackend(model_path, threads, imgsz)
+    if kind == 'openvino':
+        return OpenVinoBackend(model_path, threads, imgsz)
+
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+    if kind == 'ultralytics':
+        from ultralytics import YOLO
+        return UltralyticsBackend(YOLO(model_path), imgsz)
+    # Needs network access unless the ultralytics/yolov5 repository is already in the hub cache
+    import torch
+    return TorchHubBackend(torch.hub.load('ultralytics/yolov5', 'custom', path=model_path), imgsz)
+
+
+def load_profile(profile, kind, model_path, threads=0):
+    """Load the model for an inference profile (see PROFILES) with the given backend"""
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown profile {profile}, expected one of {', '.join(PROFILES)}")
+    settings = PROFILES[profile]
+    if kind == 'fake':
+        return FakeBackend()
+    if settings['int8']:
+        # Quantized models only exist as ONNX, whatever backend the other profiles use
+        path = quantized_path(model_path)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Quantized model not found at {path} (export it with --int8)")
+        return OnnxBackend(path, threads, settings['imgsz'])
+    return load_backend(kind, model_path, threads, settings['imgsz'])
+
+
+def quantized_path(model_path):
+    """Where export --int8 writes the dynamically quantized ONNX model of model_path"""
+    base = os.path.splitext(model_path)[0]
+    if base.endswith('.int8'):
+        return model_path
+    return base + '.int8.onnx'
+
+
+def exported_path(model_path, kind):
+    """Path of the model exported for an ONNX or OpenVINO backend next to model_path, if there is one"""
+    base, extension = os.path.splitext(model_path)
+    if kind == 'onnx':
+        candidate = model_path if extension == '.onnx' else base + '.onnx'
+    elif kind == 'openvino':
+        if extension == '.xml':
+            candidate = model_path
+        elif os.path.isdir(model_path):
+            candidate = os.path.join(model_path, os.path.basename(model_path).replace('_openvino_model', '') + '.xml')
+        else:
+            candidate = os.path.join(base + '_openvino_model', os.path.basename(base) + '.xml')
+    else:
+        return None
+    return candidate if os.path.exists(candidate) else None
+
+
+def resolve_auto(model_path):
+    """(backend, path) that 'auto' picks for model_path"""
+    for kind, module in (('onnx', 'onnxruntime'), ('openvino', 'openvino')):
+        path = exported_path(model_path, kind)
+        if path is not None and _importable(module):
+            return kind, path
+    if _importable('ultralytics'):
+        return 'ultralytics', model_path
+    return 'torchhub', model_path
+
+
+def _importable(module):
+    try:
+        __import__(module)
+        return True
+    except ImportError:
+        return False
+
+
+def _is_static(dim):
+    return isinstance(dim, int) and dim > 0
+
+
+def read_names(model_path, metadata=None):
+    """Class names of an exported model: ONNX metadata, names.json next to it, or ultralytics metadata.yaml"""
+    if metadata and 'names' in metadata:
+        return {int(k): v for k, v in ast.literal_eval(metadata['names']).items()}
+    base = os.path.splitext(model_path)[0]
+    for sidecar in (base + '.names.json', base[:-len('.int8')] + '.names.json' if base.endswith('.int8') else None):
+        if sidecar and os.path.exists(sidecar):
+            with open(sidecar) as f:
+                return {int(k): v for k, v in json.load(f).items()}
+    metadata_file = os.path.join(os.path.dirname(model_path), 'metadata.yaml')
+    if os.path.exists(metadata_file):
+        import yaml
+        with open(metadata_file) as f:
+            return {int(k): v for k, v in yaml.safe_load(f)['names'].items()}
+    raise RuntimeError(f"Class names of {model_path} not found (export it with backends.py export)")
+
+
+def letterbox(frame, size):
+    """Resize keeping the aspect ratio and pad to size (height, width); returns (image, ratio, (left, top))"""
+    height, width = frame.shape[:2]
+    target_height, target_width = size
+    ratio = min(target_width / width, target_height / height)
+    new_width, new_height = round(width * ratio), round(height * ratio)
+    if (new_width, new_height) != (width, height):
+        frame = cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+    left = (target_width - new_width) // 2
+    top = (target_height - new_height) // 2
+    image = cv2.copyMakeBorder(frame, top, target_height - new_height - top, left, target_width - new_width - left,
+                               cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    return image, ratio, (left, top)
+
+
+def decode_output(output, num_classes, conf_threshold, iou_threshold, max_detections=300):
+    """
+    Raw output of one image to an (N, 6) array [x1, y1, x2, y2, conf, cls] in network input pixels
+
+    YOLOv8 exports are (4 + classes, anchors) with class scores only; YOLOv5
+    exports are (anchors, 5 + classes) with an objectness score.
+    """
+    if output.shape[0] == 4 + num_classes and output.shape[1] != 4 + num_classes:
+        output = output.T
+        boxes, scores = output[:, :4], output[:, 4:]
+    else:
+        boxes, scores = output[:, :4], output[:, 5:] * output[:, 4:5]
+
+    classes = scores.argmax(axis=1)
+    confidences = scores[np.arange(len(scores)), classes]
+    keep = confidences >= conf_threshold
+    boxes, confidences, classes = boxes[keep], confidences[keep], classes[keep]
+    if not len(boxes):
+        return np.zeros((0, 6), dtype=np.float32)
+
+    # Center/size to corners
+    xyxy = np.empty_like(boxes)
+    xyxy[:, :2] = boxes[:, :2] - boxes[:, 2:] / 2
+    xyxy[:, 2:] = boxes[:, :2] + boxes[:, 2:] / 2
+
+    # Class-aware NMS in one call: boxes of different classes are moved apart so they never overlap
+    offset = classes[:, None].astype(np.float32) * 4096.0
+    rects = np.concatenate([xyxy[:, :2] + offset, boxes[:, 2:]], axis=1)
+    indices = np.asarray(cv2.dnn.NMSBoxes(rects.tolist(), confidences.tolist(), conf_threshold, iou_threshold),
+                         dtype=np.intp).reshape(-1)[:max_detections]
+    return np.concatenate([xyxy[indices], confidences[indices, None], classes[indices, None]], axis=1).astype(np.float32)
+
+
+def scale_boxes(preds, ratio, pad, shape):
+    """Map boxes from letterboxed network input back to the original frame"""
+    if not len(preds):
+        return preds
+    left, top = pad
+    preds[:, [0, 2]] = ((preds[:, [0, 2]] - left) / ratio).clip(0, shape[1])
+    preds[:, [1, 3]] = ((preds[:, [1, 3]] - top) / ratio).clip(0, shape[0])
+    return preds
+
+
+def export_model(model_path, formats, imgsz=640, dynamic=True, int8=False):
+    """
+    Convert a .pt model once into the formats of the CPU backends, next to it
+
+    Uses ultralytics' exporter (YOLOv8 models and YOLOv5 'u' models). Dynamic
+    axes let one export serve every batch size and the smaller input of the
+    'fast' profile. With int8, the ONNX model is also dynamically quantized
+    for the 'int8' profile. The class names are written to <model>.names.json,
+    which the backends fall back to.
+    """
+    from ultralytics import YOLO
+    model = YOLO(model_path)
+    if int8 and 'onnx' not in formats:
+        formats = list(formats) + ['onnx']
+    exported = []
+    for export_format in formats:
+        print(f"Exporting {model_path} to {export_format} (imgsz={imgsz}, dynamic axes={dynamic})")
+        exported.append(model.export(format=export_format, imgsz=imgsz, dynamic=dynamic))
+
+    if int8:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        onnx_path = os.path.splitext(model_path)[0] + '.onnx'
+        print(f"Quantizing {onnx_path} (dynamic, int8 weights)")
+        quantize_dynamic(onnx_path, quantized_path(model_path), weight_type=QuantType.QUInt8)
+        exported.append(quantized_path(model_path))
+
+    sidecar = os.path.splitext(model_path)[0] + '.names.json'
+    with open(sidecar, 'w') as f:
+        json.dump({str(k): v for k, v in model.names.items()}, f, indent=2)
+    exported.append(sidecar)
+    for path in exported:
+        print(f" - {path}")
+    return exported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Weapon detector inference backends")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export = subparsers.add_parser('export', help="Convert a .pt model for the ONNX Runtime / OpenVINO backends")
+    export.add_argument('model', help="Path to the .pt model")
+    export.add_argument('--format', nargs='+', choices=['onnx', 'openvino'], default=['onnx'])
+    export.add_argument('--imgsz', type=int, default=640, help="Network input size")
+    export.add_argument('--static-batch', action='store_true', help="Export with fixed axes instead of dynamic ones")
+    export.add_argument('--int8', action='store_true', help="Also write a dynamically quantized ONNX model")
+
+    args = parser.parse_args()
+    if args.command == 'export':
+        export_model(args.model, args.format, args.imgsz, dynamic=not args.static_batch, int8=args.int8)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,668 @@
+import os
+import sys
+import time
+import json
+import argparse
+import functools
+import threading
+from collections import deque
+import cv2
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Allow running this script directly from any directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from IA import WeaponDetector
+from alert_state import AlertTracker
+from tracker import ObjectTracker, iou_matrix
+from backends import FakeBackend, load_backend, load_profile
+from inference_pool import InferencePool
+from postprocess import ClassTable, parse_predictions
+
+
+class BusyBackend(FakeBackend):
+    """FakeBackend that keeps the CPU busy (holding the GIL) instead of sleeping, like Python-side pre/post-processing"""
+
+    kind = 'busy'
+
+    def predict(self, frames, conf_threshold):
+        deadline = time.thread_time() + self.batch_overhead + self.frame_cost * len(frames)
+        while time.thread_time() < deadline:
+            pass
+        cost, self.batch_overhead, self.frame_cost = (self.batch_overhead, self.frame_cost), 0.0, 0.0
+        try:
+            return super().predict(frames, conf_threshold)
+        finally:
+            self.batch_overhead, self.frame_cost = cost
+
+
+def busy_backend(profile, threads=0, batch_overhead=0.0, frame_cost=0.0):
+    """Loader of BusyBackend for InferencePool workers"""
+    return BusyBackend(batch_overhead, frame_cost)
+
+
+def synthetic_frame(height=480, width=640):
+    """Create a random BGR frame"""
+    return np.random.randint(0, 255, (height, width, 3), dtype=np.uint8)
+
+
+def run_camera_load(detector, cameras, fps, duration, frame):
+    """Post frames from several simulated cameras at a fixed rate (or a list of rates, one per camera) for a while"""
+    stop_at = time.time() + duration
+    rates = fps if isinstance(fps, (list, tuple)) else [fps] * cameras
+
+    def camera_loop(camera_id, fps):
+        interval = 1.0 / fps
+        next_frame = time.time()
+        while time.time() < stop_at:
+            detector.process_frame(frame, camera_id)
+            next_frame += interval
+            time.sleep(max(0.0, next_frame - time.time()))
+
+    threads = [threading.Thread(target=camera_loop, args=(f"cam-{i}", rates[i])) for i in range(cameras)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Let the worker drain what is left in the queue
+    time.sleep(0.5)
+
+
+def benchmark_batching(args):
+    """Report throughput, batch sizes and latency for several max-batch / max-wait settings"""
+    frame = synthetic_frame()
+    rows = []
+
+    for max_batch in args.max_batch:
+        for max_wait_ms in args.max_wait_ms:
+            model = FakeBackend(args.batch_overhead_ms / 1000.0, args.frame_cost_ms / 1000.0)
+            detector = WeaponDetector(model=model, max_batch_size=max_batch, max_batch_wait=max_wait_ms / 1000.0)
+            detector.start()
+            run_camera_load(detector, args.cameras, args.fps, args.duration, frame)
+            detector.stop()
+
+            stats = detector.get_batch_stats()
+            rows.append({
+                'max_batch': max_batch,
+                'max_wait_ms': max_wait_ms,
+                'frames_per_sec': stats['frames'] / args.duration,
+                'avg_batch_size': stats['avg_batch_size'],
+                'p50_ms': stats['latency_ms']['p50'],
+                'p95_ms': stats['latency_ms']['p95'],
+                'p99_ms': stats['latency_ms']['p99']
+            })
+
+    print(f"{'batch':>5} {'wait_ms':>7} {'fps':>8} {'avg_bs':>6} {'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8}")
+    for row in rows:
+        print(f"{row['max_batch']:>5} {row['max_wait_ms']:>7.1f} {row['frames_per_sec']:>8.1f} "
+              f"{row['avg_batch_size']:>6.2f} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f}")
+    return rows
+
+
+def benchmark_motion(args):
+    """Inferences saved by the motion gate on mostly static cameras, and its cost per frame"""
+    rng = np.random.default_rng(1)
+    backgrounds = [synthetic_frame(args.height // 8, args.width // 8) for _ in range(args.cameras)]
+    backgrounds = [cv2.resize(b, (args.width, args.height), interpolation=cv2.INTER_LINEAR) for b in backgrounds]
+
+    def camera_frame(camera, index):
+        """The camera's background with sensor noise, and a moving object some of the time"""
+        frame = backgrounds[camera].copy()
+        noise = rng.integers(-4, 5, size=(args.height // 4, args.width // 4, 1), dtype=np.int16)
+        frame[::4, ::4] = np.clip(frame[::4, ::4] + noise, 0, 255).astype(np.uint8)
+        if rng.random() < args.motion_share:
+            x = (index * 37) % (args.width - args.width // 4)
+            frame[args.height // 3:args.height // 3 * 2, x:x + args.width // 4] = 255
+        return frame
+
+    rows = []
+    for gating in (False, True):
+        model = FakeBackend(batch_overhead=0.0, frame_cost=0.0)
+        detector = WeaponDetector(model=model, max_batch_size=8, motion_gating=gating)
+        detector.start()
+        gate_seconds = 0.0
+        for index in range(args.frames):
+            for camera in range(args.cameras):
+                frame = camera_frame(camera, index)
+                start = time.perf_counter()
+                future = detector.process_frame(frame, f"cam-{camera}")
+                gate_seconds += time.perf_counter() - start
+                future.result(timeout=5)
+        detector.stop()
+
+        stats = detector.get_motion_stats()
+        submitted = args.frames * args.cameras
+        rows.append({
+            'motion_gating': gating,
+            'frames': submitted,
+            'inferences': model.frames_seen,
+            'inferences_saved': stats['inferences_saved'],
+            'skip_rate': stats['skip_rate'],
+            'submit_ms_per_frame': 1000 * gate_seconds / submitted
+        })
+
+    print(f"{args.cameras} cameras x {args.frames} frames of {args.width}x{args.height}, "
+          f"{args.motion_share:.0%} of frames with motion")
+    print(f"{'gating':>6} {'frames':>7} {'inferences':>10} {'saved':>6} {'skip_rate':>9} {'submit_ms':>9}")
+    for row in rows:
+        print(f"{str(row['motion_gating']):>6} {row['frames']:>7} {row['inferences']:>10} {row['inferences_saved']:>6} "
+              f"{row['skip_rate']:>9.2f} {row['submit_ms_per_frame']:>9.3f}")
+    return rows
+
+
+def benchmark_scheduling(args):
+    """One chatty camera next to normal ones: per-camera share, drops and latency, with and without adaptive sampling"""
+    frame = synthetic_frame()
+    # cam-0 floods the detector, the others send at a normal rate
+    rates = [args.chatty_fps] + [args.fps] * (args.cameras - 1)
+    rows = []
+    for adaptive in (False, True):
+        model = FakeBackend(args.batch_overhead_ms / 1000.0, args.frame_cost_ms / 1000.0, weapon_every=args.weapon_every)
+        detector = WeaponDetector(model=model, max_batch_size=8, adaptive_sampling=adaptive,
+                                  quiet_interval=args.quiet_interval)
+        detector.start()
+        run_camera_load(detector, args.cameras, rates, args.duration, frame)
+        detector.stop()
+
+        stats = detector.get_scheduler_stats()
+        for camera_id, camera in sorted(stats['cameras'].items()):
+            rows.append(dict(camera, adaptive=adaptive, camera_id=camera_id))
+
+    print(f"{args.cameras} cameras at {args.fps} fps, cam-0 at {args.chatty_fps} fps, {args.duration:.0f}s each")
+    print(f"{'adaptive':>8} {'camera':>7} {'submitted':>9} {'sampled_out':>11} {'dropped':>7} {'processed':>9} "
+          f"{'p50_ms':>8} {'p95_ms':>8}")
+    for row in rows:
+        print(f"{str(row['adaptive']):>8} {row['camera_id']:>7} {row['submitted']:>9} {row['sampled_out']:>11} "
+              f"{row['dropped']:>7} {row['processed']:>9} {row['latency_ms']['p50']:>8.1f} {row['latency_ms']['p95']:>8.1f}")
+    return rows
+
+
+def benchmark_alerts(args):
+    """Cost per result of the per-camera alert state, against summing one shared window per result"""
+    rng = np.random.default_rng(1)
+    cameras = [f"cam-{i}" for i in range(args.cameras)]
+    results = [(cameras[i], bool(d)) for i, d in zip(rng.integers(0, args.cameras, args.results),
+                                                       rng.random(args.results) < args.positive_share)]
+    rows = []
+    for window in args.window:
+        tracker = AlertTracker(threshold=max(1, window // 5), cooldown=0.0, window=window)
+        start = time.perf_counter()
+        for index, (camera_id, detected) in enumerate(results):
+            tracker.update(camera_id, detected, float(index))
+        per_camera = time.perf_counter() - start
+
+        # The previous scheme: one deque for every camera, counted with sum() on each result
+        shared = deque(maxlen=window)
+        start = time.perf_counter()
+        for camera_id, detected in results:
+            shared.append(detected)
+            sum(1 for d in shared if d)
+        summed = time.perf_counter() - start
+
+        rows.append({
+            'window': window,
+            'per_camera_us': 1e6 * per_camera / len(results),
+            'shared_sum_us': 1e6 * summed / len(results),
+            'alerts': tracker.get_stats()['notifications']
+        })
+
+    print(f"{args.results} results over {args.cameras} cameras, {args.positive_share:.0%} positive")
+    print(f"{'window':>6} {'per_camera_us':>13} {'shared_sum_us':>13} {'alerts':>6}")
+    for row in rows:
+        print(f"{row['window']:>6} {row['per_camera_us']:>13.2f} {row['shared_sum_us']:>13.2f} {row['alerts']:>6}")
+    return rows
+
+
+def benchmark_tracking(args):
+    """Alerts raised for a flickering weapon with and without the tracker, and the tracker's cost per frame"""
+    rng = np.random.default_rng(1)
+    is_weapon = lambda name: name == 'pistol'
+
+    def scene(index):
+        """A walking person holding a pistol that the model misses now and then, plus one-frame false positives"""
+        x = 50.0 + 4.0 * index
+        detections = [('person', 0.9, (x, 100.0, x + 80.0, 300.0))]
+        if rng.random() < args.hit_rate:
+            detections.append(('pistol', 0.7, (x + 60.0, 180.0, x + 90.0, 210.0)))
+        if rng.random() < args.false_positive_rate:
+            fx, fy = rng.uniform(0, 1500, 2)
+            detections.append(('pistol', 0.3, (fx, fy, fx + 30.0, fy + 30.0)))
+        # Background objects, so the association has something to sort out
+        for i in range(args.objects):
+            detections.append(('person', 0.8, (1000.0 + 60 * i, 500.0, 1050.0 + 60 * i, 700.0)))
+        return detections
+
+    frames = [scene(index) for index in range(args.frames)]
+    window = AlertTracker(threshold=2, cooldown=args.cooldown, window=10)
+    tracker = ObjectTracker(enabled=True)
+    per_frame_alerts = 0
+    window_alerts = 0
+    tracked_alerts = 0
+    tracking_seconds = 0.0
+    for index, detections in enumerate(frames):
+        now = index / args.fps
+        weapons = any(is_weapon(name) for name, _, _ in detections)
+        per_frame_alerts += weapons
+        window_alerts += window.update('cam', weapons, now)[0]
+        start = time.perf_counter()
+        tracking = tracker.update('cam', detections, is_weapon, now)
+        tracking_seconds += time.perf_counter() - start
+        tracked_alerts += len(tracking['new_weapons'])
+
+    result = {
+        'frames': args.frames,
+        'boxes_per_frame': sum(len(d) for d in frames) / len(frames),
+        'alerts_per_frame_with_weapon': per_frame_alerts,
+        'alerts_window': window_alerts,
+        'alerts_tracked': tracked_alerts,
+        'tracks_confirmed': tracker.get_stats()['confirmed'],
+        'tracking_us_per_frame': 1e6 * tracking_seconds / args.frames
+    }
+    print(f"{args.frames} frames at {args.fps} fps, {result['boxes_per_frame']:.1f} boxes per frame, "
+          f"pistol seen in {args.hit_rate:.0%} of frames, {args.false_positive_rate:.0%} false positives")
+    print(f"Alerts: one per frame with a weapon {per_frame_alerts}, window + {args.cooldown:.0f}s cooldown "
+          f"{window_alerts}, tracked {tracked_alerts}")
+    print(f"Tracker: {result['tracking_us_per_frame']:.1f} us per frame")
+    return result
+
+
+def benchmark_workers(args):
+    """Throughput with inference in the detection thread (0 workers) and in 1, 2, 4, 8 worker processes"""
+    frame = synthetic_frame(args.height, args.width)
+    cost = {'batch_overhead': args.batch_overhead_ms / 1000.0, 'frame_cost': args.frame_cost_ms / 1000.0}
+    rows = []
+    for workers in args.workers:
+        pool = None
+        if workers:
+            pool = InferencePool(workers, functools.partial(busy_backend, **cost), threads=1).start('full')
+            model = pool.backend('full')
+        else:
+            model = BusyBackend(**cost)
+        detector = WeaponDetector(model=model, max_batch_size=args.max_batch, max_batch_wait=0.005)
+        detector.start()
+        run_camera_load(detector, args.cameras, args.fps, args.duration, frame)
+        detector.stop()
+        if pool is not None:
+            restarts = pool.get_stats()['restarts']
+            pool.close()
+        else:
+            restarts = 0
+
+        stats = detector.get_batch_stats()
+        rows.append({
+            'workers': workers,
+            'frames_per_sec': stats['frames'] / args.duration,
+            'avg_batch_size': stats['avg_batch_size'],
+            'p50_ms': stats['latency_ms']['p50'],
+            'p95_ms': stats['latency_ms']['p95'],
+            'restarts': restarts
+        })
+
+    baseline = rows[0]['frames_per_sec'] if rows and rows[0]['frames_per_sec'] else None
+    print(f"{args.cameras} cameras x {args.fps} fps, {args.width}x{args.height}, {os.cpu_count()} CPUs")
+    print(f"{'workers':>7} {'fps':>8} {'scaling':>7} {'avg_bs':>6} {'p50_ms':>8} {'p95_ms':>8}")
+    for row in rows:
+        scaling = f"{row['frames_per_sec'] / baseline:.2f}x" if baseline else '-'
+        print(f"{row['workers']:>7} {row['frames_per_sec']:>8.1f} {scaling:>7} {row['avg_batch_size']:>6.2f} "
+              f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f}")
+    return rows
+
+
+def benchmark_postprocess(args):
+    """Cost of turning one image's predictions into detections: per-box loop against whole-array parsing"""
+    rng = np.random.default_rng(1)
+    names = {cls: f"object-{cls}" for cls in range(args.classes)}
+    for cls, name in enumerate(['pistol', 'rifle', 'knife']):
+        names[cls * (args.classes // 3)] = name
+    weapon_classes = ['gun', 'pistol', 'rifle', 'firearms', 'knife', 'weapon']
+
+    # The previous parsing: a name lookup and a weapon-name scan per box
+    def parse_per_box(preds):
+        weapons_detected = False
+        detections = []
+        for x1, y1, x2, y2, conf, cls in preds.tolist():
+            class_name = names[int(cls)]
+            if any(weapon_class in class_name.lower() for weapon_class in weapon_classes):
+                weapons_detected = True
+            detections.append((class_name, float(conf), (x1, y1, x2, y2)))
+        return weapons_detected, detections
+
+    table = ClassTable(names)
+    rows = []
+    for boxes in args.boxes:
+        corners = rng.uniform(0, 1000, (boxes, 2))
+        preds = np.column_stack([corners, corners + rng.uniform(10, 200, (boxes, 2)),
+                                 rng.uniform(0.25, 1.0, boxes), rng.integers(0, args.classes, boxes)]).astype(np.float32)
+        if parse_per_box(preds) != parse_predictions(preds, table):
+            raise RuntimeError(f"Parsers disagree on {boxes} boxes")
+
+        timings = {}
+        for label, parse in (('per_box', parse_per_box), ('vectorised', lambda p: parse_predictions(p, table))):
+            start = time.perf_counter()
+            for _ in range(args.iterations):
+                parse(preds)
+            timings[label] = 1000 * (time.perf_counter() - start) / args.iterations
+
+        rows.append({
+            'boxes': boxes,
+            'per_box_ms': timings['per_box'],
+            'vectorised_ms': timings['vectorised'],
+            'speedup': timings['per_box'] / timings['vectorised'] if timings['vectorised'] else 0.0
+        })
+
+    print(f"{args.classes} classes, {args.iterations} iterations per size")
+    print(f"{'boxes':>6} {'per_box_ms':>10} {'vectorised_ms':>13} {'speedup':>7}")
+    for row in rows:
+        print(f"{row['boxes']:>6} {row['per_box_ms']:>10.3f} {row['vectorised_ms']:>13.3f} {row['speedup']:>6.1f}x")
+    return rows
+
+
+def benchmark_backends(args):
+    """Frames per second of each inference backend on the real model (the ones not installed are skipped)"""
+    frames = [synthetic_frame(args.height, args.width) for _ in range(max(args.batch))]
+    rows = []
+    for kind in args.backends:
+        try:
+            backend = load_backend(kind, args.model, args.threads)
+        except Exception as e:
+            print(f"Skipping {kind}: {e}")
+            continue
+        for batch in args.batch:
+            batch_frames = frames[:batch]
+            for _ in range(args.warmup):
+                backend.predict(batch_frames, 0.25)
+            start = time.perf_counter()
+            for _ in range(args.iterations):
+                backend.predict(batch_frames, 0.25)
+            elapsed = time.perf_counter() - start
+            rows.append({
+                'backend': backend.kind,
+                'batch': batch,
+                'threads': args.threads,
+                'ms_per_batch': 1000 * elapsed / args.iterations,
+                'frames_per_sec': batch * args.iterations / elapsed
+            })
+
+    print(f"{args.model}, {args.width}x{args.height} frames, threads={args.threads or 'default'}")
+    print(f"{'backend':>11} {'batch':>5} {'ms/batch':>9} {'fps':>8}")
+    for row in rows:
+        print(f"{row['backend']:>11} {row['batch']:>5} {row['ms_per_batch']:>9.1f} {row['frames_per_sec']:>8.1f}")
+    return rows
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def load_labelled_images(images_dir, labels_dir=None):
+    """
+    (image path, ground truth) pairs of a YOLO-format dataset
+
+    Each image has a .txt label file with one "class cx cy w h" line per object
+    (normalised coordinates), in labels_dir or, by default, next to the image or
+    in the sibling labels/ directory. Ground truth is a list of (class id, box).
+    """
+    samples = []
+    for name in sorted(os.listdir(images_dir)):
+        stem, extension = os.path.splitext(name)
+        if extension.lower() not in IMAGE_EXTENSIONS:
+            continue
+        candidates = [os.path.join(labels_dir, stem + '.txt')] if labels_dir else [
+            os.path.join(images_dir, stem + '.txt'),
+            os.path.join(os.path.dirname(os.path.normpath(images_dir)), 'labels', stem + '.txt')
+        ]
+        label_file = next((path for path in candidates if os.path.exists(path)), None)
+        rows = []
+        if label_file is not None:
+            with open(label_file) as f:
+                rows = [line.split() for line in f if line.strip()]
+        samples.append((os.path.join(images_dir, name), [(int(r[0]), [float(v) for v in r[1:5]]) for r in rows]))
+    return samples
+
+
+def match_boxes(predicted, truths, iou_threshold):
+    """Greedily match predicted (confidence, class, box) to truths (class, box); returns (tp, fp, fn)"""
+    if not predicted or not truths:
+        return 0, len(predicted), len(truths)
+    predicted = sorted(predicted, key=lambda p: -p[0])
+    iou = iou_matrix(np.array([box for _, _, box in predicted], dtype=np.float32),
+                     np.array([box for _, box in truths], dtype=np.float32))
+    matched = set()
+    true_positives = 0
+    for i, (_, cls, _) in enumerate(predicted):
+        for j in np.argsort(-iou[i]):
+            if iou[i, j] < iou_threshold:
+                break
+            if j not in matched and truths[j][0] == cls:
+                matched.add(j)
+                true_positives += 1
+                break
+    return true_positives, len(predicted) - true_positives, len(truths) - true_positives
+
+
+def benchmark_accuracy(args):
+    """Frames per second and precision/recall of each inference profile on a labelled image set"""
+    samples = load_labelled_images(args.images, args.labels)
+    if not samples:
+        raise SystemExit(f"No images found in {args.images}")
+    rows = []
+    for profile in args.profiles:
+        try:
+            backend = load_profile(profile, args.backend, args.model, args.threads)
+        except Exception as e:
+            print(f"Skipping {profile}: {e}")
+            continue
+        # The detector's own prediction and parsing path, without the worker thread
+        detector = WeaponDetector(model=backend, conf_threshold=args.conf, profile=profile)
+        class_ids = {name: cls for cls, name in backend.names.items()}
+        counts = {'all': [0, 0, 0], 'weapons': [0, 0, 0]}
+        inference_seconds = 0.0
+
+        for index, (path, truths) in enumerate(samples):
+            image = cv2.imread(path)
+            height, width = image.shape[:2]
+            if index == 0:
+                detector._predict_batch([image], [profile])  # Warm-up
+            start = time.perf_counter()
+            _, detections = detector._predict_batch([image], [profile])[0]
+            inference_seconds += time.perf_counter() - start
+
+            predicted = [(conf, class_ids[name], box) for name, conf, box in detections]
+            truth_boxes = [(cls, [(cx - w / 2) * width, (cy - h / 2) * height, (cx + w / 2) * width,
+                                  (cy + h / 2) * height]) for cls, (cx, cy, w, h) in truths]
+            weapon = lambda cls: cls in backend.names and detector._is_weapon_class(backend.names[cls])
+            for key, keep in (('all', lambda cls: True), ('weapons', weapon)):
+                # Weapon classes are compared as one class: calling a pistol a gun is still a hit
+                merge = (lambda cls: 0) if key == 'weapons' else (lambda cls: cls)
+                result = match_boxes([(c, merge(cls), b) for c, cls, b in predicted if keep(cls)],
+                                     [(merge(cls), b) for cls, b in truth_boxes if keep(cls)], args.iou)
+                counts[key] = [total + value for total, value in zip(counts[key], result)]
+
+        row = {'profile': profile, 'backend': backend.kind, 'images': len(samples),
+               'frames_per_sec': len(samples) / inference_seconds if inference_seconds else 0.0}
+        for key, (tp, fp, fn) in counts.items():
+            row[f"{key}_precision"] = tp / (tp + fp) if tp + fp else 0.0
+            row[f"{key}_recall"] = tp / (tp + fn) if tp + fn else 0.0
+        rows.append(row)
+
+    print(f"{len(samples)} labelled images from {args.images}, IoU >= {args.iou}, conf >= {args.conf}")
+    print(f"{'profile':>7} {'backend':>11} {'fps':>8} {'precision':>9} {'recall':>6} {'weapon_p':>8} {'weapon_r':>8}")
+    for row in rows:
+        print(f"{row['profile']:>7} {row['backend']:>11} {row['frames_per_sec']:>8.1f} {row['all_precision']:>9.3f} "
+              f"{row['all_recall']:>6.3f} {row['weapons_precision']:>8.3f} {row['weapons_recall']:>8.3f}")
+    return rows
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB (Linux only, 0 elsewhere)"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return 0.0
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+    if resource is None:
+        return 0.0
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def benchmark_memory(args):
+    """Sustained 1080p load with nobody draining results; RSS must stay flat"""
+    # Every camera gets its own frame buffer, like decoded uploads do
+    frames = [synthetic_frame(1080, 1920) for _ in range(args.cameras)]
+    model = FakeBackend(batch_overhead=0.001, frame_cost=0.0005)
+    detector = WeaponDetector(model=model, max_batch_size=8, result_buffer_size=args.result_buffer)
+    detector.start()
+
+    baseline = current_rss_mb()
+    samples = []
+    stop_at = time.time() + args.duration
+    next_sample = time.time()
+    submitted = 0
+    while time.time() < stop_at:
+        for camera, frame in enumerate(frames):
+            # A fresh copy per submission, as every HTTP request decodes a new image
+            detector.process_frame(frame.copy(), f"cam-{camera}", keep_frame=args.keep_frames)
+            submitted += 1
+        time.sleep(1.0 / args.fps)
+        if time.time() >= next_sample:
+            samples.append(current_rss_mb())
+            next_sample += 1.0
+    detector.stop()
+
+    result = {
+        'frames_submitted': submitted,
+        'keep_frames': args.keep_frames,
+        'result_buffer': args.result_buffer,
+        'baseline_rss_mb': baseline,
+        'final_rss_mb': current_rss_mb(),
+        'max_sampled_rss_mb': max(samples) if samples else 0.0,
+        'peak_rss_mb': peak_rss_mb(),
+        'results': detector.get_result_stats()
+    }
+    print(f"Submitted {submitted} frames of 1920x1080 (keep_frames={args.keep_frames})")
+    print(f"RSS baseline {result['baseline_rss_mb']:.0f} MB, max sampled {result['max_sampled_rss_mb']:.0f} MB, "
+          f"final {result['final_rss_mb']:.0f} MB, peak {result['peak_rss_mb']:.0f} MB")
+    print(f"Result store: {result['results']}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the weapon detector (uses the fake backend)")
+    parser.add_argument('--json', action='store_true', help="Print raw results as JSON")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    batching = subparsers.add_parser('batching', help="Batched inference throughput and latency")
+    batching.add_argument('--cameras', type=int, default=40)
+    batching.add_argument('--fps', type=float, default=2.0, help="Frames per second per camera")
+    batching.add_argument('--duration', type=float, default=10.0, help="Seconds per configuration")
+    batching.add_argument('--max-batch', type=int, nargs='+', default=[1, 4, 8, 16])
+    batching.add_argument('--max-wait-ms', type=float, nargs='+', default=[2.0, 5.0, 10.0])
+    batching.add_argument('--batch-overhead-ms', type=float, default=20.0)
+    batching.add_argument('--frame-cost-ms', type=float, default=4.0)
+    batching.set_defaults(func=benchmark_batching)
+
+    memory = subparsers.add_parser('memory', help="Peak RSS under sustained 1080p load")
+    memory.add_argument('--cameras', type=int, default=8)
+    memory.add_argument('--fps', type=float, default=10.0, help="Submission rounds per second")
+    memory.add_argument('--duration', type=float, default=30.0)
+    memory.add_argument('--result-buffer', type=int, default=100)
+    memory.add_argument('--keep-frames', action='store_true', help="Ask for frames in results (annotated output)")
+    memory.set_defaults(func=benchmark_memory)
+
+    motion = subparsers.add_parser('motion', help="Inferences saved by the motion gate and its cost")
+    motion.add_argument('--cameras', type=int, default=4)
+    motion.add_argument('--frames', type=int, default=200, help="Frames per camera")
+    motion.add_argument('--width', type=int, default=1920)
+    motion.add_argument('--height', type=int, default=1080)
+    motion.add_argument('--motion-share', type=float, default=0.1, help="Share of frames with a moving object")
+    motion.set_defaults(func=benchmark_motion)
+
+    scheduling = subparsers.add_parser('scheduling', help="Per-camera fairness and adaptive sampling")
+    scheduling.add_argument('--cameras', type=int, default=8)
+    scheduling.add_argument('--fps', type=float, default=2.0, help="Frames per second of the normal cameras")
+    scheduling.add_argument('--chatty-fps', type=float, default=100.0, help="Frames per second of cam-0")
+    scheduling.add_argument('--duration', type=float, default=10.0, help="Seconds per configuration")
+    scheduling.add_argument('--quiet-interval', type=float, default=1.0)
+    scheduling.add_argument('--weapon-every', type=int, default=200, help="Every Nth inferred frame has a weapon")
+    scheduling.add_argument('--batch-overhead-ms', type=float, default=20.0)
+    scheduling.add_argument('--frame-cost-ms', type=float, default=4.0)
+    scheduling.set_defaults(func=benchmark_scheduling)
+
+    alerts = subparsers.add_parser('alerts', help="Per-result cost of the per-camera alert state")
+    alerts.add_argument('--cameras', type=int, default=500)
+    alerts.add_argument('--results', type=int, default=200000)
+    alerts.add_argument('--window', type=int, nargs='+', default=[10, 100, 1000])
+    alerts.add_argument('--positive-share', type=float, default=0.05)
+    alerts.set_defaults(func=benchmark_alerts)
+
+    tracking = subparsers.add_parser('tracking', help="Alerts per tracked object and the tracker's cost")
+    tracking.add_argument('--frames', type=int, default=300)
+    tracking.add_argument('--fps', type=float, default=10.0)
+    tracking.add_argument('--objects', type=int, default=20, help="Background boxes per frame")
+    tracking.add_argument('--hit-rate', type=float, default=0.7, help="Share of frames where the pistol is found")
+    tracking.add_argument('--false-positive-rate', type=float, default=0.05)
+    tracking.add_argument('--cooldown', type=float, default=10.0)
+    tracking.set_defaults(func=benchmark_tracking)
+
+    workers = subparsers.add_parser('workers', help="Throughput scaling with inference worker processes")
+    workers.add_argument('--workers', type=int, nargs='+', default=[0, 1, 2, 4, 8])
+    workers.add_argument('--cameras', type=int, default=16)
+    workers.add_argument('--fps', type=float, default=25.0, help="Frames per second per camera")
+    workers.add_argument('--duration', type=float, default=10.0, help="Seconds per configuration")
+    workers.add_argument('--max-batch', type=int, default=4)
+    workers.add_argument('--width', type=int, default=1280)
+    workers.add_argument('--height', type=int, default=720)
+    workers.add_argument('--batch-overhead-ms', type=float, default=5.0, help="CPU time per forward pass")
+    workers.add_argument('--frame-cost-ms', type=float, default=10.0, help="CPU time per frame")
+    workers.set_defaults(func=benchmark_workers)
+
+    postprocess = subparsers.add_parser('postprocess', help="Cost of parsing predictions into detections")
+    postprocess.add_argument('--boxes', type=int, nargs='+', default=[10, 100, 300, 1000])
+    postprocess.add_argument('--classes', type=int, default=80)
+    postprocess.add_argument('--iterations', type=int, default=200)
+    postprocess.set_defaults(func=benchmark_postprocess)
+
+    backends = subparsers.add_parser('backends', help="Frames per second of each inference backend")
+    backends.add_argument('--model', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..',
+                                                          'models', 'violence_detectorAerithV2.pt'))
+    backends.add_argument('--backends', nargs='+', default=['ultralytics', 'onnx', 'openvino'])
+    backends.add_argument('--batch', type=int, nargs='+', default=[1, 8])
+    backends.add_argument('--threads', type=int, default=0, help="Intra-op threads, 0 = runtime default")
+    backends.add_argument('--iterations', type=int, default=20)
+    backends.add_argument('--warmup', type=int, default=3)
+    backends.add_argument('--width', type=int, default=1280)
+    backends.add_argument('--height', type=int, default=720)
+    backends.set_defaults(func=benchmark_backends)
+
+    accuracy = subparsers.add_parser('accuracy', help="Speed and precision/recall of each inference profile")
+    accuracy.add_argument('images', help="Directory of images with YOLO-format .txt labels")
+    accuracy.add_argument('--labels', help="Directory of the .txt labels (default: next to the images or ../labels)")
+    accuracy.add_argument('--model', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..',
+                                                          'models', 'violence_detectorAerithV2.pt'))
+    accuracy.add_argument('--backend', default='auto')
+    accuracy.add_argument('--profiles', nargs='+', default=['full', 'fast', 'int8'])
+    accuracy.add_argument('--threads', type=int, default=0, help="Intra-op threads, 0 = runtime default")
+    accuracy.add_argument('--conf', type=float, default=0.25)
+    accuracy.add_argument('--iou', type=float, default=0.5, help="IoU for a prediction to match a label")
+    accuracy.set_defaults(func=benchmark_accuracy)
+
+    args = parser.parse_args()
+    results = args.func(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
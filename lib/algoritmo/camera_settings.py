@@ -0,0 +1,69 @@
+class CameraSettings:
+    """
+    Defaults that each camera can override, for the per-camera components of the detector
+
+    A component declares SETTINGS (name -> converter applied to new values) and
+    SECTION (its name in /detection/settings), passes its defaults to
+    __init__ and guards its state with self.lock. It can override check() to
+    reject out-of-range values before anything changes, and settings_changed()
+    to react to a camera's new settings.
+    """
+
+    SETTINGS = {}
+    SECTION = 'camera'
+
+    def __init__(self, **defaults):
+        self.defaults = defaults
+        self.overrides = {}
+
+    def configure(self, camera_id, settings):
+        """Override settings of one camera (None as a value restores the default), returning them all"""
+        for name in settings:
+            if name not in self.SETTINGS:
+                raise ValueError(f"Unknown {self.SECTION} setting: {name}")
+        # Convert and check everything before changing anything
+        values = {name: None if value is None else self.SETTINGS[name](value) for name, value in settings.items()}
+        self.check(values)
+        with self.lock:
+            overrides = self.overrides.setdefault(camera_id, {})
+            for name, value in values.items():
+                if value is None:
+                    overrides.pop(name, None)
+                else:
+                    overrides[name] = value
+            current = dict(self.defaults, **overrides)
+            self.settings_changed(camera_id, current)
+            return current
+
+    def get_settings(self, camera_id):
+        with self.lock:
+            return dict(self._settings(camera_id))
+
+    def _settings(self, camera_id):
+        """Settings of one camera (the caller holds the lock)"""
+        overrides = self.overrides.get(camera_id)
+        return dict(self.defaults, **overrides) if overrides else self.defaults
+
+    def check(self, values):
+        """Raise ValueError for converted values out of range (None values restore defaults)"""
+
+    def settings_changed(self, camera_id, settings):
+        """Called under the lock with the camera's new settings"""
+
+
+def to_bool(value):
+    """Setting converter for flags: JSON booleans, 0/1 and 'true'/'false'/'1'/'0'/'yes'/'no'"""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in ('true', '1', 'yes', 'false', '0', 'no'):
+        return value.strip().lower() in ('true', '1', 'yes')
+    raise ValueError(f"Expected a boolean, got {value!r}")
+
+
+def at_least(values, names, minimum):
+    """Raise ValueError if any of the named values is below minimum"""
+    for name in names:
+        if values.get(name) is not None and values[name] < minimum:
+            raise ValueError(f"{name} must be at least {minimum}" if minimum else f"{name} must not be negative")
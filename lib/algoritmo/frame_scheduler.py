@@ -0,0 +1,189 @@
+import time
+import queue
+import threading
+from collections import deque
+
+try:
+    from .camera_settings import CameraSettings, at_least, to_bool
+except ImportError:  # Imported as a top-level module (scripts in this directory)
+    from camera_settings import CameraSettings, at_least, to_bool
+
+
+class FrameScheduler(CameraSettings):
+    """
+    Per-camera frame queues in front of the detector
+
+    Every camera gets a small queue of its own, so a chatty camera only drops
+    its own old frames. The detection thread takes frames in weighted round
+    robin: each camera with waiting frames gets up to `weight` frames per turn.
+    With adaptive sampling a camera is sampled at min_interval right after a
+    detection and backs off towards max_interval while its results stay quiet.
+    """
+
+    # Per-camera settings and their defaults
+    SETTINGS = {
+        'weight': int,            # Frames taken from this camera per round-robin turn
+        'queue_size': int,        # Frames waiting for this camera (the oldest is dropped)
+        'adaptive': to_bool,      # Sample frames adaptively instead of taking every one
+        'min_interval': float,    # Seconds between sampled frames right after a detection
+        'max_interval': float,    # Seconds between sampled frames once the camera is quiet
+        'backoff': float,         # Factor the interval grows by after each quiet inference
+        'boost_seconds': float    # Seconds to stay at min_interval after a detection
+    }
+    SECTION = 'scheduling'
+
+    def __init__(self, max_pending=64, weight=1, queue_size=2, adaptive=False, min_interval=0.0,
+                 max_interval=1.0, backoff=2.0, boost_seconds=10.0):
+        super().__init__(weight=weight, queue_size=queue_size, adaptive=adaptive, min_interval=min_interval,
+                         max_interval=max_interval, backoff=backoff, boost_seconds=boost_seconds)
+        self.max_pending = max(1, int(max_pending))
+        self.queues = {}
+        # Cameras with waiting frames, in serving order; the first one has the turn
+        self.ready = deque()
+        self.credit = None
+        self.pending = 0
+        self.cameras = {}
+        # Settings are guarded by the lock under the condition
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+
+    def check(self, values):
+        at_least(values, ('weight', 'queue_size', 'backoff'), 1)
+        at_least(values, ('min_interval', 'max_interval', 'boost_seconds'), 0)
+
+    def _setting(self, camera_id, name):
+        overrides = self.overrides.get(camera_id)
+        if overrides and name in overrides:
+            return overrides[name]
+        return self.defaults[name]
+
+    def _camera(self, camera_id):
+        state = self.cameras.get(camera_id)
+        if state is None:
+            state = self.cameras[camera_id] = {
+                'submitted': 0, 'sampled_out': 0, 'dropped': 0, 'processed': 0,
+                'interval': self._setting(camera_id, 'min_interval'),
+                'last_sample': 0.0, 'boost_until': 0.0,
+                'latencies': deque(maxlen=200)
+            }
+        return state
+
+    def should_sample(self, camera_id, last_result, now=None):
+        """Decide whether the camera's frame goes to the model, or last_result can be reused"""
+        now = time.time() if now is None else now
+        with self.condition:
+            state = self._camera(camera_id)
+            state['submitted'] += 1
+            if last_result is None or not self._setting(camera_id, 'adaptive'):
+                return True
+            if now - state['last_sample'] < state['interval']:
+                state['sampled_out'] += 1
+                return False
+            state['last_sample'] = now
+            return True
+
+    def put(self, item):
+        """Queue a frame under its camera, returning the frames dropped to make room"""
+        camera_id = item['camera_id']
+        dropped = []
+        with self.condition:
+            self._camera(camera_id)
+            frames = self.queues.get(camera_id)
+            if frames is None:
+                frames = self.queues[camera_id] = deque()
+            if not frames:
+                self.ready.append(camera_id)
+            frames.append(item)
+            self.pending += 1
+
+            # A full queue only costs the camera its own oldest frame
+            if len(frames) > self._setting(camera_id, 'queue_size'):
+                dropped.append(self._drop_oldest(camera_id))
+            # Over the global limit, the camera with most waiting frames gives one up
+            if self.pending > self.max_pending:
+                deepest = max(self.ready, key=lambda c: len(self.queues[c]))
+                if len(self.queues[deepest]) == len(frames):
+                    deepest = camera_id
+                dropped.append(self._drop_oldest(deepest))
+            self.condition.notify()
+        return dropped
+
+    def _drop_oldest(self, camera_id):
+        frames = self.queues[camera_id]
+        item = frames.popleft()
+        self.pending -= 1
+        self.cameras[camera_id]['dropped'] += 1
+        if not frames:
+            if self.ready[0] == camera_id:
+                self.credit = None
+            self.ready.remove(camera_id)
+        return item
+
+    def get(self, timeout=None):
+        """Next frame in weighted round-robin order; raises queue.Empty after timeout"""
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.pending > 0, timeout):
+                raise queue.Empty
+            return self._take()
+
+    def get_nowait(self):
+        with self.condition:
+            if not self.pending:
+                raise queue.Empty
+            return self._take()
+
+    def _take(self):
+        camera_id = self.ready[0]
+        if self.credit is None:
+            self.credit = self._setting(camera_id, 'weight')
+        frames = self.queues[camera_id]
+        item = frames.popleft()
+        self.pending -= 1
+        self.credit -= 1
+        if not frames:
+            self.ready.popleft()
+            self.credit = None
+        elif self.credit <= 0:
+            # Turn used up: the camera goes to the back of the line
+            self.ready.rotate(-1)
+            self.credit = None
+        return item
+
+    def drain(self):
+        """Remove and return every waiting frame"""
+        with self.condition:
+            items = [item for frames in self.queues.values() for item in frames]
+            self.queues.clear()
+            self.ready.clear()
+            self.credit = None
+            self.pending = 0
+            return items
+
+    def record_result(self, camera_id, weapons_detected, latency, now=None):
+        """Count an inference of the camera and adapt its sampling interval to the result"""
+        now = time.time() if now is None else now
+        with self.condition:
+            state = self._camera(camera_id)
+            state['processed'] += 1
+            state['latencies'].append(latency)
+            settings = self._settings(camera_id)
+            if weapons_detected:
+                state['interval'] = settings['min_interval']
+                state['boost_until'] = now + settings['boost_seconds']
+            elif now >= state['boost_until']:
+                # Quiet: grow the interval geometrically, starting from a sixteenth of the maximum
+                start = max(state['interval'], settings['min_interval'], settings['max_interval'] / 16)
+                state['interval'] = min(settings['max_interval'], start * settings['backoff'])
+
+    def get_stats(self):
+        """Counters, waiting frames, sampling interval and recent latencies per camera"""
+        with self.condition:
+            return {camera_id: {
+                'submitted': state['submitted'],
+                'sampled_out': state['sampled_out'],
+                'dropped': state['dropped'],
+                'processed': state['processed'],
+                'queued': len(self.queues.get(camera_id, ())),
+                'sample_interval': state['interval'] if self._setting(camera_id, 'adaptive') else 0.0,
+                'latencies': list(state['latencies'])
+            } for camera_id, state in self.cameras.items()}
@@ -0,0 +1,316 @@
+import os
+import time
+import queue
+import atexit
+import threading
+import traceback
+import functools
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+
+try:
+    from .backends import Backend, load_profile
+except ImportError:  # Imported as a top-level module (scripts in this directory)
+    from backends import Backend, load_profile
+
+
+# Frames are written at offsets aligned to this many bytes in a worker's shared memory
+ALIGNMENT = 64
+
+
+class InferencePool:
+    """
+    Inference in worker processes, so forward passes and the Python around them use more than one core
+
+    Every worker process loads its own model (load(profile, threads=n) -> Backend,
+    called in the worker) and runs one batch at a time. Frames are not pickled: they are
+    copied into a shared memory segment owned by the worker's slot and the worker
+    reads them in place; only the small (N, 6) prediction arrays travel back
+    through the pipe. Each worker is limited to `threads` intra-op threads (and,
+    when there are enough cores, pinned to its own share of them) so workers do
+    not fight over the same cores.
+
+    A worker that dies, or does not answer within `timeout`, is restarted: the
+    batch it was running fails, the next one runs on the new process. A monitor
+    thread also checks idle workers every `health_interval` seconds.
+    """
+
+    def __init__(self, workers, load, threads=0, timeout=30.0, health_interval=1.0, frame_bytes=1920 * 1080 * 3):
+        """
+        Args:
+            workers: Number of worker processes
+            load: Picklable callable (profile, threads=n) -> Backend, run in each worker to load a model
+            threads: Intra-op threads per worker (0 shares the cores evenly between the workers)
+            timeout: Seconds a worker may take for one request before it is considered hung
+            health_interval: Seconds between checks of idle workers
+            frame_bytes: Initial shared memory per worker (it grows to fit the largest batch)
+        """
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.size = workers
+        self.load = load
+        cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+        self.threads = threads or max(1, len(cpus) // workers)
+        # Pin each worker to its own cores only when every worker gets at least one
+        if len(cpus) >= workers:
+            share = max(1, len(cpus) // workers)
+            self.cpus = [cpus[i * share:(i + 1) * share] for i in range(workers)]
+        else:
+            self.cpus = [None] * workers
+        self.timeout = timeout
+        self.health_interval = health_interval
+        self.frame_bytes = frame_bytes
+        self.context = multiprocessing.get_context('spawn')
+        self.profiles = []
+        self.names = {}
+        self.kinds = {}
+        self.slots = [{'index': index, 'process': None, 'conn': None, 'memory': None, 'batches': 0,
+                       'frames': 0, 'restarts': 0, 'lock': threading.Lock()} for index in range(workers)]
+        self.idle = queue.Queue()
+        self.running = False
+        self.monitor = None
+
+    def start(self, profile):
+        """Start every worker with the model of the default profile loaded"""
+        self.profiles.append(profile)
+        self.running = True
+        for slot in self.slots:
+            self._spawn(slot)
+            self.idle.put(slot)
+        self.monitor = threading.Thread(target=self._monitor_loop, daemon=True)
+        self.monitor.start()
+        atexit.register(self.close)
+        return self
+
+    def backend(self, profile):
+        """Backend running the profile's model in the workers (loaded in every worker on first use)"""
+        if profile not in self.profiles:
+            slots = self._acquire_all()
+            try:
+                for slot in slots:
+                    self._call(slot, ('load', profile))
+            finally:
+                for slot in slots:
+                    self.idle.put(slot)
+            self.profiles.append(profile)
+        return PoolBackend(self, profile)
+
+    def predict(self, profile, frames, conf_threshold):
+        """Predictions of one batch, on the first idle worker"""
+        slot = self.idle.get()
+        try:
+            layout = self._write_frames(slot, frames)
+            predictions = self._call(slot, ('predict', slot['memory'].name, layout, profile, conf_threshold))
+            with slot['lock']:
+                slot['batches'] += 1
+                slot['frames'] += len(frames)
+            return predictions
+        finally:
+            self.idle.put(slot)
+
+    def close(self):
+        """Stop the workers and free their shared memory"""
+        if not self.running:
+            return
+        self.running = False
+        for slot in self.slots:
+            with slot['lock']:
+                self._stop(slot)
+                if slot['memory'] is not None:
+                    slot['memory'].close()
+                    slot['memory'].unlink()
+                    slot['memory'] = None
+
+    def get_stats(self):
+        """Workers alive, and batches, frames and restarts per worker"""
+        return {
+            'workers': self.size,
+            'threads_per_worker': self.threads,
+            'alive': sum(1 for slot in self.slots if slot['process'] is not None and slot['process'].is_alive()),
+            'restarts': sum(slot['restarts'] for slot in self.slots),
+            'per_worker': [{'pid': slot['process'].pid if slot['process'] is not None else None,
+                            'cpus': self.cpus[slot['index']], 'batches': slot['batches'],
+                            'frames': slot['frames'], 'restarts': slot['restarts']} for slot in self.slots]
+        }
+
+    def _write_frames(self, slot, frames):
+        """Copy the frames into the slot's shared memory, returning (shape, dtype, offset) of each one"""
+        layout = []
+        offset = 0
+        for frame in frames:
+            layout.append((frame.shape, frame.dtype.str, offset))
+            offset += -(-frame.nbytes // ALIGNMENT) * ALIGNMENT
+        memory = slot['memory']
+        if memory is None or memory.size < offset:
+            # Grow to the largest batch seen; the worker attaches to the new segment by name
+            size = max(offset, self.frame_bytes, 2 * memory.size if memory is not None else 0)
+            if memory is not None:
+                memory.close()
+                memory.unlink()
+            memory = slot['memory'] = shared_memory.SharedMemory(create=True, size=size)
+        for frame, (shape, dtype, start) in zip(frames, layout):
+            np.ndarray(shape, dtype, buffer=memory.buf, offset=start)[...] = frame
+        return layout
+
+    def _call(self, slot, message):
+        """Send one request to a worker and wait for its answer, restarting the worker if it fails"""
+        with slot['lock']:
+            if slot['process'] is None or not slot['process'].is_alive():
+                self._restart(slot, "is not running")
+            try:
+                slot['conn'].send(message)
+                if not slot['conn'].poll(self.timeout):
+                    self._restart(slot, f"did not answer within {self.timeout}s")
+                    raise RuntimeError(f"Inference worker {slot['index']} timed out")
+                status, payload = slot['conn'].recv()
+            except (EOFError, OSError) as e:
+                self._restart(slot, f"died during a request ({e})")
+                raise RuntimeError(f"Inference worker {slot['index']} died")
+        if status != 'ok':
+            raise RuntimeError(f"Inference worker {slot['index']}: {payload}")
+        if message[0] == 'load':
+            self.names[message[1]], self.kinds[message[1]] = payload
+        return payload
+
+    def _spawn(self, slot):
+        parent_conn, child_conn = self.context.Pipe()
+        process = self.context.Process(target=_worker_main, daemon=True,
+                                       args=(child_conn, self.load, self.profiles, self.threads, self.cpus[slot['index']]))
+        process.start()
+        child_conn.close()
+        slot['process'] = process
+        slot['conn'] = parent_conn
+        # Wait for the models to load so a broken model fails here instead of on the first frame
+        if not parent_conn.poll(max(self.timeout, 120.0)):
+            self._stop(slot)
+            raise RuntimeError(f"Inference worker {slot['index']} did not start")
+        try:
+            status, payload = parent_conn.recv()
+        except EOFError:
+            status, payload = 'error', f"exited with code {process.exitcode}"
+        if status != 'ok':
+            self._stop(slot)
+            raise RuntimeError(f"Inference worker {slot['index']} could not start: {payload}")
+        for profile, (names, kind) in payload.items():
+            self.names[profile], self.kinds[profile] = names, kind
+
+    def _restart(self, slot, reason):
+        print(f"Inference worker {slot['index']} {reason}, restarting it")
+        self._stop(slot)
+        slot['restarts'] += 1
+        self._spawn(slot)
+
+    def _stop(self, slot):
+        process = slot['process']
+        if process is None:
+            return
+        if process.is_alive():
+            try:
+                slot['conn'].send(None)
+            except OSError:
+                pass
+            process.join(timeout=1.0)
+            if process.is_alive():
+                process.kill()
+                process.join()
+        slot['conn'].close()
+        slot['process'] = None
+
+    def _acquire_all(self):
+        """Take every worker out of the idle queue (waits for running batches)"""
+        return [self.idle.get() for _ in self.slots]
+
+    def _monitor_loop(self):
+        """Restart idle workers that died, so a crash costs no batch"""
+        while self.running:
+            time.sleep(self.health_interval)
+            for slot in self.slots:
+                if not self.running:
+                    break
+                # Busy workers are checked by the request they are running
+                if slot['lock'].acquire(blocking=False):
+                    try:
+                        if slot['process'] is None:
+                            self._restart(slot, "failed to restart")
+                        elif not slot['process'].is_alive():
+                            self._restart(slot, f"exited with code {slot['process'].exitcode}")
+                    except Exception as e:
+                        print(f"Error restarting inference worker {slot['index']}: {e}")
+                    finally:
+                        slot['lock'].release()
+
+
+class PoolBackend(Backend):
+    """One inference profile of an InferencePool, with the interface of the in-process backends"""
+
+    def __init__(self, pool, profile):
+        self.pool = pool
+        self.profile = profile
+        self.kind = pool.kinds[profile]
+        self.names = pool.names[profile]
+        # Batches that can run at the same time
+        self.concurrency = pool.size
+
+    def predict(self, frames, conf_threshold):
+        return self.pool.predict(self.profile, frames, conf_threshold)
+
+
+def start_pool(workers, profile, kind, model_path, threads=0):
+    """Pool of worker processes loading models with load_profile(profile, kind, model_path, threads)"""
+    pool = InferencePool(workers, functools.partial(load_profile, kind=kind, model_path=model_path), threads)
+    return pool.start(profile)
+
+
+def _worker_main(conn, load, profiles, threads, cpus):
+    """Worker process: load the models, then answer requests until told to stop"""
+    # Limit the math libraries before any of them is imported by the model
+    for variable in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[variable] = str(threads)
+    if cpus and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpus)
+    import cv2
+    cv2.setNumThreads(threads)
+
+    models = {}
+    memory = None
+
+    def load_model(profile):
+        model = models[profile] = load(profile, threads=threads)
+        return model.names, model.kind
+
+    try:
+        conn.send(('ok', {profile: load_model(profile) for profile in profiles}))
+    except Exception as e:
+        traceback.print_exc()
+        conn.send(('error', str(e)))
+        return
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if message is None:
+            break
+        try:
+            if message[0] == 'load':
+                conn.send(('ok', load_model(message[1])))
+                continue
+            _, name, layout, profile, conf_threshold = message
+            if memory is None or memory.name != name:
+                if memory is not None:
+                    memory.close()
+                memory = shared_memory.SharedMemory(name=name)
+            frames = [np.ndarray(shape, dtype, buffer=memory.buf, offset=offset) for shape, dtype, offset in layout]
+            if profile not in models:
+                load_model(profile)
+            predictions = [np.asarray(preds) for preds in models[profile].predict(frames, conf_threshold)]
+            # The frames are views of the shared memory: drop them before it can be closed
+            del frames
+            conn.send(('ok', predictions))
+        except Exception as e:
+            traceback.print_exc()
+            conn.send(('error', str(e)))
+    if memory is not None:
+        memory.close()
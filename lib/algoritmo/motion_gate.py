@@ -0,0 +1,100 @@
+import time
+import threading
+import cv2
+import numpy as np
+
+try:
+    from .camera_settings import CameraSettings, at_least, to_bool
+except ImportError:  # Imported as a top-level module (scripts in this directory)
+    from camera_settings import CameraSettings, at_least, to_bool
+
+
+class MotionGate(CameraSettings):
+    """
+    Per-camera motion pre-filter in front of the detector
+
+    Each frame is shrunk to a small grayscale thumbnail and compared with the
+    thumbnail of the last frame that went through the model. When the share of
+    changed pixels stays under the camera's threshold, the previous result is
+    reused instead of running inference. Frames are never skipped while the
+    last result contained a weapon, or once max_skip_seconds have passed since
+    the last inference.
+    """
+
+    # Per-camera settings and their defaults
+    SETTINGS = {
+        'enabled': to_bool,         # Skip static frames for this camera
+        'threshold': float,         # Share of thumbnail pixels that must change (0-1)
+        'pixel_delta': int,         # Gray level difference for a pixel to count as changed
+        'max_skip_seconds': float,  # Run inference at least this often, even on a static scene
+        'width': int                # Thumbnail width in pixels
+    }
+    SECTION = 'motion'
+
+    def __init__(self, enabled=False, threshold=0.01, pixel_delta=25, max_skip_seconds=5.0, width=64):
+        super().__init__(enabled=enabled, threshold=threshold, pixel_delta=pixel_delta,
+                         max_skip_seconds=max_skip_seconds, width=width)
+        self.cameras = {}
+        self.lock = threading.Lock()
+
+    def check(self, values):
+        if values.get('threshold') is not None and not 0 <= values['threshold'] <= 1:
+            raise ValueError("threshold must be in [0, 1]")
+        at_least(values, ('width',), 1)
+        at_least(values, ('pixel_delta', 'max_skip_seconds'), 0)
+
+    def should_skip(self, camera_id, frame, last_result):
+        """Decide whether the frame can reuse last_result, and count the decision"""
+        settings = self.get_settings(camera_id)
+        if not settings['enabled']:
+            return False
+
+        # Shrink first: the comparison then costs the same for any resolution. Area
+        # averaging over a strided view (about 4x4 samples per thumbnail pixel) keeps
+        # sensor noise out at a fraction of the cost of averaging every pixel.
+        height, width = frame.shape[:2]
+        thumb_width = min(settings['width'], width)
+        thumb_height = max(1, round(height * thumb_width / width))
+        step = max(1, width // (thumb_width * 4))
+        thumbnail = cv2.resize(frame[::step, ::step], (thumb_width, thumb_height), interpolation=cv2.INTER_AREA)
+        if thumbnail.ndim == 3:
+            thumbnail = cv2.cvtColor(thumbnail, cv2.COLOR_BGR2GRAY)
+
+        now = time.time()
+        with self.lock:
+            state = self.cameras.setdefault(camera_id, {'reference': None, 'reference_time': 0.0,
+                                                        'frames': 0, 'skipped': 0})
+            state['frames'] += 1
+            reference = state['reference']
+            skip = (reference is not None and reference.shape == thumbnail.shape
+                    and last_result is not None and not last_result['weapons_detected']
+                    and now - state['reference_time'] < settings['max_skip_seconds']
+                    and _changed_fraction(thumbnail, reference, settings['pixel_delta']) < settings['threshold'])
+            if skip:
+                state['skipped'] += 1
+            else:
+                # This frame goes to the model and becomes the new reference
+                state['reference'] = thumbnail
+                state['reference_time'] = now
+            return skip
+
+    def get_stats(self):
+        """Frames seen and skipped (inferences saved) per camera and in total"""
+        with self.lock:
+            cameras = {camera_id: {
+                'frames': state['frames'],
+                'skipped': state['skipped'],
+                'skip_rate': state['skipped'] / state['frames'] if state['frames'] else 0.0
+            } for camera_id, state in self.cameras.items()}
+        frames = sum(camera['frames'] for camera in cameras.values())
+        skipped = sum(camera['skipped'] for camera in cameras.values())
+        return {
+            'frames': frames,
+            'inferences_saved': skipped,
+            'skip_rate': skipped / frames if frames else 0.0,
+            'cameras': cameras
+        }
+
+
+def _changed_fraction(a, b, pixel_delta):
+    return np.count_nonzero(cv2.absdiff(a, b) > pixel_delta) / a.size
@@ -0,0 +1,57 @@
+import numpy as np
+
+
+# APENAS estas classes específicas devem gerar alertas
+WEAPON_CLASSES = ('gun', 'pistol', 'rifle', 'firearms', 'knife', 'weapon')
+
+
+def is_weapon_name(class_name):
+    """Check if the class name represents a weapon that should trigger alerts"""
+    class_lower = class_name.lower()
+    return any(weapon_class in class_lower for weapon_class in WEAPON_CLASSES)
+
+
+class ClassTable:
+    """
+    Class names and is-weapon flags of a model, indexed by class id
+
+    Built once per model from model.names (a dict or a list), so parsing a
+    result looks classes up with one array index instead of a name check per box.
+    """
+
+    def __init__(self, names):
+        if not isinstance(names, dict):
+            names = dict(enumerate(names))
+        size = max(names) + 1 if names else 0
+        self.names = np.array([str(names.get(cls, cls)) for cls in range(size)], dtype=object)
+        self.weapons = np.array([is_weapon_name(name) for name in self.names], dtype=bool)
+
+
+def boxes_to_array(boxes):
+    """(N, 6) array from ultralytics Boxes (or a stub iterating boxes with cls, conf and xyxy)"""
+    if boxes is None:
+        return np.zeros((0, 6), dtype=np.float32)
+    data = getattr(boxes, 'data', None)
+    if data is not None:
+        return data.cpu().numpy() if hasattr(data, 'cpu') else np.asarray(data)
+    rows = [list(box.xyxy[0]) + [float(box.conf[0]), int(box.cls[0])] for box in boxes]
+    return np.array(rows, dtype=np.float32).reshape(-1, 6)
+
+
+def parse_predictions(preds, table, conf_threshold=0.0):
+    """
+    Convert the (N, 6) predictions of one image into (weapons_detected, detections)
+
+    Filtering and the weapon check run on the whole array; the detections are
+    converted to (class_name, confidence, (x1, y1, x2, y2)) tuples in one pass.
+    """
+    preds = np.asarray(preds)
+    if conf_threshold and len(preds):
+        preds = preds[preds[:, 4] >= conf_threshold]
+    if not len(preds):
+        return False, []
+
+    classes = preds[:, 5].astype(np.intp)
+    weapons_detected = bool(table.weapons[classes].any())
+    detections = list(zip(table.names[classes].tolist(), preds[:, 4].tolist(), map(tuple, preds[:, :4].tolist())))
+    return weapons_detected, detections
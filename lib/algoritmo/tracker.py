@@ -0,0 +1,166 @@
+import itertools
+import threading
+import numpy as np
+
+try:
+    from .camera_settings import CameraSettings, at_least, to_bool
+except ImportError:  # Imported as a top-level module (scripts in this directory)
+    from camera_settings import CameraSettings, at_least, to_bool
+
+
+def iou_matrix(a, b):
+    """Intersection over union of every box in a (N, 4) against every box in b (M, 4), as (N, M)"""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+
+class ObjectTracker(CameraSettings):
+    """
+    IoU tracker that follows detected objects from one inference of a camera to the next
+
+    Boxes are associated with the camera's live tracks of the same class, greedily
+    by highest IoU against where each track is predicted to be (its last box moved
+    at its last velocity, so a walking person is not lost to a few missed frames).
+    A track is confirmed after min_hits matches and ends after
+    max_missed inferences without a match, so a box that flickers in and out
+    keeps its track id and a one-frame false positive never gets confirmed.
+    Every confirmed weapon track raises exactly one alert.
+    """
+
+    # Per-camera settings and their defaults
+    SETTINGS = {
+        'enabled': to_bool,       # Track objects of this camera (alerts then fire once per tracked weapon)
+        'iou_threshold': float,   # Minimum IoU between a track and a box to continue the track
+        'min_hits': int,          # Matches before a track is confirmed
+        'max_missed': int         # Inferences without a match before a track ends
+    }
+    SECTION = 'tracking'
+
+    def __init__(self, enabled=False, iou_threshold=0.3, min_hits=2, max_missed=5):
+        super().__init__(enabled=enabled, iou_threshold=iou_threshold, min_hits=min_hits, max_missed=max_missed)
+        self.cameras = {}
+        self.ids = itertools.count(1)
+        self.confirmed = 0
+        self.ended = 0
+        self.lock = threading.Lock()
+
+    def check(self, values):
+        if values.get('iou_threshold') is not None and not 0 < values['iou_threshold'] <= 1:
+            raise ValueError("iou_threshold must be in (0, 1]")
+        at_least(values, ('min_hits', 'max_missed'), 1)
+
+    def settings_changed(self, camera_id, settings):
+        if not settings['enabled']:
+            # Tracks of a camera that stops tracking would never be updated again
+            self.cameras.pop(camera_id, None)
+
+    def update(self, camera_id, detections, is_weapon, now):
+        """
+        Associate the detections of one inference with the camera's tracks (is_weapon(class_name) -> bool)
+
+        Returns None if tracking is off for the camera, otherwise a dict with the
+        track id of every detection ('track_ids'), the tracks seen in this frame
+        ('tracks'), weapon tracks confirmed by this frame ('new_weapons') and whether
+        any confirmed weapon track is still alive ('active').
+        """
+        with self.lock:
+            settings = self._settings(camera_id)
+            if not settings['enabled']:
+                return None
+            tracks = self.cameras.setdefault(camera_id, [])
+
+            # Same-class IoU of every predicted track box against every box, then greedy matching
+            matches = {}
+            velocities = {}
+            if tracks and detections:
+                boxes = np.array([track['box'] for track in tracks], dtype=np.float32)
+                steps = np.array([track['missed'] + 1 for track in tracks], dtype=np.float32)[:, None]
+                predicted = boxes + np.array([track['velocity'] for track in tracks], dtype=np.float32) * steps
+                detected = np.array([box for _, _, box in detections], dtype=np.float32)
+                iou = iou_matrix(predicted, detected)
+                classes = {}
+                track_classes = np.array([classes.setdefault(track['class'], len(classes)) for track in tracks])
+                box_classes = np.array([classes.setdefault(name, len(classes)) for name, _, _ in detections])
+                iou[track_classes[:, None] != box_classes[None, :]] = 0.0
+                candidates = np.argwhere(iou >= settings['iou_threshold'])
+                order = np.argsort(-iou[candidates[:, 0], candidates[:, 1]], kind='stable')
+                used_tracks = set()
+                for t, d in candidates[order].tolist():
+                    if t not in used_tracks and d not in matches:
+                        used_tracks.add(t)
+                        matches[d] = t
+
+                # New velocity of every matched track, per inference since its last match
+                if matches:
+                    d_index = np.fromiter(matches.keys(), dtype=np.intp, count=len(matches))
+                    t_index = np.fromiter(matches.values(), dtype=np.intp, count=len(matches))
+                    moved = (detected[d_index] - boxes[t_index]) / steps[t_index]
+                    velocities = dict(zip(matches, map(tuple, moved.tolist())))
+
+            track_ids = []
+            seen = []
+            new_weapons = []
+            for index, (name, _, box) in enumerate(detections):
+                if index in matches:
+                    track = tracks[matches[index]]
+                    track['velocity'] = velocities[index]
+                    track['box'] = box
+                    track['hits'] += 1
+                    track['missed'] = 0
+                    track['last_seen'] = now
+                else:
+                    track = {'id': next(self.ids), 'class': name, 'box': box, 'weapon': is_weapon(name),
+                             'velocity': (0.0, 0.0, 0.0, 0.0), 'hits': 1, 'missed': 0, 'first_seen': now, 'last_seen': now, 'alerted': False}
+                    tracks.append(track)
+                if track['hits'] == settings['min_hits']:
+                    self.confirmed += 1
+                if track['weapon'] and not track['alerted'] and track['hits'] >= settings['min_hits']:
+                    track['alerted'] = True
+                    new_weapons.append(track['id'])
+                track_ids.append(track['id'])
+                seen.append(track)
+
+            # Tracks not seen in this frame age, and end after max_missed inferences
+            seen_ids = set(track_ids)
+            for track in tracks:
+                if track['id'] not in seen_ids:
+                    track['missed'] += 1
+            alive = [track for track in tracks if track['missed'] < settings['max_missed']]
+            self.ended += len(tracks) - len(alive)
+            tracks[:] = alive
+
+            return {
+                'track_ids': track_ids,
+                'tracks': [_track_summary(track, settings) for track in seen],
+                'new_weapons': new_weapons,
+                'active': any(track['alerted'] for track in alive)
+            }
+
+    def get_stats(self):
+        """Live tracks per camera, and tracks confirmed and ended so far"""
+        with self.lock:
+            return {
+                'live_tracks': sum(len(tracks) for tracks in self.cameras.values()),
+                'cameras': {camera_id: len(tracks) for camera_id, tracks in self.cameras.items()},
+                'confirmed': self.confirmed,
+                'ended': self.ended
+            }
+
+
+def _track_summary(track, settings):
+    return {
+        'track_id': track['id'],
+        'class': track['class'],
+        'weapon': track['weapon'],
+        'confirmed': track['hits'] >= settings['min_hits'],
+        'hits': track['hits'],
+        'first_seen': track['first_seen'],
+        'lifetime_seconds': track['last_seen'] - track['first_seen']
+    }
@@ -4,14 +4,23 @@ import json
 import cv2
 import numpy as np
 import time
+import struct
+import argparse
+import threading
 import traceback
 
+try:
+    from .postprocess import ClassTable, boxes_to_array, is_weapon_name, parse_predictions
+except ImportError:  # Run as a script from this directory
+    from postprocess import ClassTable, boxes_to_array, is_weapon_name, parse_predictions
+
 class WeaponDetector:
     """Standalone weapon detector using YOLOv5 or YOLOv8"""
     
     def __init__(self, model_path=None):
         """Initialize the weapon detector"""
         self.model = None
+        self.class_table = None
         self.notification = None
         self.latest_result = None
         self.running = False
@@ -54,11 +63,16 @@ class WeaponDetector:
                 traceback.print_exc()
                 raise RuntimeError("Could not load model with any available backend")
                 
+        # Class names and weapon flags, built once instead of per box
+        self.class_table = ClassTable(self.model.names)
         self.running = True
         print("Detector initialized successfully")
     
-    def process_frame(self, frame):
-        """Process a frame and detect weapons"""
+    def process_frame(self, frame, camera_id=None):
+        """Process a frame and detect weapons, tagging the result with the camera it came from"""
+        # A frame that fails leaves no result behind, never the previous frame's
+        self.latest_result = None
+        self.notification = None
         if not self.running or self.model is None:
             return False
             
@@ -66,41 +80,18 @@ class WeaponDetector:
             # Process the frame with the model
             results = self.model(frame)
             
-            # Extract detection results
-            detections = []
-            weapons_detected = False
-            
-            # Different processing depending on the model type
+            # Predictions as one (N, 6) array, whatever the model type
             if hasattr(results, 'xyxy'):  # YOLOv5 style results
-                for pred in results.xyxy[0].tolist():
-                    x1, y1, x2, y2, conf, cls = pred
-                    class_name = self.model.names[int(cls)]
-                    
-                    # Check if this is a weapon
-                    if self._is_weapon_class(class_name):
-                        weapons_detected = True
-                        
-                    detections.append((class_name, float(conf), [float(x1), float(y1), float(x2), float(y2)]))
+                preds = results.xyxy[0]
+                preds = preds.cpu().numpy() if hasattr(preds, 'cpu') else np.asarray(preds)
             else:  # YOLOv8 style results
-                for r in results:
-                    if r.boxes is not None:
-                        for box in r.boxes:
-                            # Get class ID and name
-                            cls = int(box.cls[0])
-                            class_name = self.model.names[cls]
-                            conf = float(box.conf[0])
-                            
-                            # Get bounding box
-                            x1, y1, x2, y2 = box.xyxy[0].tolist()
-                            
-                            # Check if this is a weapon
-                            if self._is_weapon_class(class_name):
-                                weapons_detected = True
-                                
-                            detections.append((class_name, conf, [x1, y1, x2, y2]))
+                preds = np.concatenate([boxes_to_array(r.boxes) for r in results] or [np.zeros((0, 6))])
+                
+            weapons_detected, detections = parse_predictions(preds, self.class_table)
             
             # Update latest result
             self.latest_result = {
+                'camera_id': camera_id,
                 'weapons_detected': weapons_detected,
                 'alert_triggered': weapons_detected,
                 'detections': detections
@@ -121,16 +112,7 @@ class WeaponDetector:
             
     def _is_weapon_class(self, class_name):
         """Check if the class name represents a weapon that should trigger alerts"""
-        # APENAS estas classes específicas devem gerar alertas
-        weapon_classes = ['gun', 'pistol', 'rifle', 'firearms', 'knife', 'weapon']
-        class_lower = class_name.lower()
-        
-        # Verificação exata para evitar falsos positivos
-        for weapon_class in weapon_classes:
-            if weapon_class in class_lower:
-                return True
-        
-        return False
+        return is_weapon_name(class_name)
     
     def start(self):
         """Start the detector"""
@@ -151,6 +133,31 @@ class WeaponDetector:
         self.notification = None  # Clear after getting
         return notification
 
+def format_result(detector):
+    """Format the detector's latest result and notification for the JSON output"""
+    result = detector.get_latest_result()
+    notification = detector.get_notification()
+    
+    if result is None:
+        return {
+            'weapons_detected': False,
+            'notification': False,
+            'message': None,
+            'detections': []
+        }
+    
+    # Format detections for JSON response
+    detections_list = [{'class': class_name, 'confidence': confidence, 'box': box}
+                       for class_name, confidence, box in result.get('detections', [])]
+    
+    return {
+        'weapons_detected': result.get('weapons_detected', False),
+        'alert_triggered': result.get('alert_triggered', False),
+        'detections': detections_list,
+        'notification': notification is not None,
+        'message': notification['message'] if notification else None
+    }
+
 def process_image(image_path, model_path=None):
     """Process an image file and return detection results"""
     try:
@@ -163,54 +170,128 @@ def process_image(image_path, model_path=None):
             print(f"Failed to read image: {image_path}")
             return {"error": "Failed to read image"}
             
-        # Process the frame
-        detector.process_frame(img)
-        
-        # Get results
-        result = detector.get_latest_result()
-        notification = detector.get_notification()
-        
-        # Format detection results for JSON
-        if result is None:
-            return {
-                'weapons_detected': False,
-                'notification': False,
-                'message': None,
-                'detections': []
-            }
-        
-        # Format detections for JSON response
-        detections_list = []
-        for class_name, confidence, box in result.get('detections', []):
-            detections_list.append({
-                'class': class_name,
-                'confidence': confidence,
-                'box': box
-            })
-        
-        return {
-            'weapons_detected': result.get('weapons_detected', False),
-            'alert_triggered': result.get('alert_triggered', False),
-            'detections': detections_list,
-            'notification': notification is not None,
-            'message': notification['message'] if notification else None
-        }
+        # Process the frame and get results
+        return detect_image(detector, img)
     
     except Exception as e:
         print(f"Error processing image: {e}")
         traceback.print_exc()
         return {"error": str(e)}
 
+def detect_image(detector, img):
+    """Run the detector on one decoded image and format its result, or an error if it failed"""
+    if not detector.process_frame(img):
+        return {"error": "Detection failed"}
+    return format_result(detector)
+
+def _read_exact(stream, size):
+    """Read exactly size bytes from a binary stream, or None if it ends first"""
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = stream.read(remaining)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
+
+def serve_stream(detector, reader, writer, lock=None):
+    """
+    Answer detection requests from a binary stream until it ends
+    
+    Each request is a 4-byte big-endian length followed by that many bytes of an
+    encoded JPEG/PNG image; a zero length closes the stream. Each response is
+    one JSON line, in the same format as the single-image mode.
+    """
+    request_id = 0
+    while True:
+        header = _read_exact(reader, 4)
+        if header is None:
+            break
+        size = struct.unpack('>I', header)[0]
+        if size == 0:
+            break
+        data = _read_exact(reader, size)
+        if data is None:
+            break
+        
+        request_id += 1
+        try:
+            img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            if img is None:
+                response = {"error": "Failed to decode image"}
+            elif lock is not None:
+                with lock:
+                    response = detect_image(detector, img)
+            else:
+                response = detect_image(detector, img)
+        except Exception as e:
+            traceback.print_exc()
+            response = {"error": str(e)}
+            
+        response['id'] = request_id
+        writer.write(json.dumps(response).encode('utf-8') + b'\n')
+        writer.flush()
+
+def serve_socket(detector, socket_path):
+    """Serve the stream protocol on a Unix socket, one thread per client and one shared model"""
+    import socketserver
+    
+    if not hasattr(socketserver, 'ThreadingUnixStreamServer'):
+        raise RuntimeError("Unix sockets are not supported on this platform, use --serve with stdin instead")
+    
+    lock = threading.Lock()
+    
+    class DetectionHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            serve_stream(detector, self.rfile, self.wfile, lock)
+    
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+        
+    with socketserver.ThreadingUnixStreamServer(socket_path, DetectionHandler) as server:
+        server.daemon_threads = True
+        print(f"Detector listening on {socket_path}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        finally:
+            os.remove(socket_path)
+
 def main():
     """Main function to be called when script is run directly"""
-    if len(sys.argv) < 2:
-        print("Usage: python weapon_detector.py <image_path> [<model_path>]")
-        return 1
+    parser = argparse.ArgumentParser(
+        usage="python weapon_detector.py <image_path> [<model_path>]\n"
+              "       python weapon_detector.py --serve [--socket <path>] [--model <model_path>]")
+    parser.add_argument('image_path', nargs='?')
+    parser.add_argument('model_path', nargs='?')
+    parser.add_argument('--serve', action='store_true',
+                        help="Load the model once and answer length-prefixed images from stdin with JSON lines")
+    parser.add_argument('--socket', help="Serve on this Unix socket path instead of stdin/stdout")
+    parser.add_argument('--model', help="Path to the model file")
+    args = parser.parse_args()
+    
+    model_path = args.model or args.model_path
+    
+    if args.serve or args.socket:
+        # Keep stdout clean for the protocol, everything else goes to stderr
+        protocol_out = sys.stdout.buffer
+        sys.stdout = sys.stderr
         
-    image_path = sys.argv[1]
-    model_path = sys.argv[2] if len(sys.argv) > 2 else None
+        detector = WeaponDetector(model_path)
+        if args.socket:
+            serve_socket(detector, args.socket)
+        else:
+            protocol_out.write(b'{"ready": true}\n')
+            protocol_out.flush()
+            serve_stream(detector, sys.stdin.buffer, protocol_out)
+        return 0
+    
+    if args.image_path is None:
+        parser.print_usage()
+        return 1
     
-    result = process_image(image_path, model_path)
+    result = process_image(args.image_path, model_path)
     
     # Print result as JSON
     print(json.dumps(result))
@@ -0,0 +1,975 @@
+import os
+import sys
+import io
+import time
+import json
+import base64
+import argparse
+import random
+import tempfile
+import threading
+import tracemalloc
+import http.client
+import multiprocessing
+from urllib.parse import urlparse
+import cv2
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Allow running this script directly from any directory
+sys.path.append(str(Path(__file__).parent))
+sys.path.append(str(Path(__file__).parent.parent))
+import camera_api_server as server
+from camera_store import CameraStore
+from sqlite_store import SQLiteCameraStore
+from event_stream import EventBus
+import frame_pool
+from frame_pool import FramePool
+from algoritmo.backends import FakeBackend
+from algoritmo.benchmark_detector import synthetic_frame
+
+
+def install_stub_detector(frame_cost=0.0):
+    """Replace the server's detector with one running the fake backend"""
+    if server.WeaponDetector is None:
+        raise RuntimeError("WeaponDetector could not be imported")
+    server.detector = server.WeaponDetector(model=FakeBackend(batch_overhead=0.0, frame_cost=frame_cost),
+                                            max_batch_size=server.detection_max_batch,
+                                            max_batch_wait=server.detection_max_wait_ms / 1000.0)
+    server.detector.start()
+    return server.detector
+
+
+def encoded_test_image(width, height, quality=90):
+    """A JPEG with some structure, so it compresses like a real camera frame"""
+    frame = synthetic_frame(height // 8, width // 8)
+    frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_LINEAR)
+    success, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not success:
+        raise RuntimeError("Failed to encode test image")
+    return encoded.tobytes()
+
+
+def time_requests(send, requests):
+    """Run send() repeatedly, returning (CPU ms per request, list of wall latencies in ms)"""
+    latencies = []
+    cpu_start = time.process_time()
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = send()
+        latencies.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f"Request failed with {response.status_code}: {response.get_data(as_text=True)}")
+    cpu_ms = (time.process_time() - cpu_start) * 1000 / requests
+    return cpu_ms, latencies
+
+
+def summarize(name, payload_bytes, cpu_ms, latencies):
+    latencies = sorted(latencies)
+    return {
+        'path': name,
+        'payload_kb': payload_bytes / 1024,
+        'cpu_ms_per_frame': cpu_ms,
+        'p50_ms': latencies[len(latencies) // 2],
+        'p95_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    }
+
+
+def benchmark_upload(args):
+    """Compare CPU per frame and latency of the JSON/base64, raw and multipart upload paths"""
+    install_stub_detector()
+    client = server.app.test_client()
+    jpeg = encoded_test_image(args.width, args.height)
+    json_body = json.dumps({'image': base64.b64encode(jpeg).decode('ascii'), 'camera_id': 'bench'})
+
+    paths = {
+        'json-base64': (len(json_body), lambda: client.post(
+            '/detection/detect', data=json_body, content_type='application/json')),
+        'octet-stream': (len(jpeg), lambda: client.post(
+            '/detection/detect/bench', data=jpeg, content_type='application/octet-stream')),
+        'multipart': (len(jpeg), lambda: client.post(
+            '/detection/detect', content_type='multipart/form-data',
+            data={'camera_id': 'bench', 'image': (io.BytesIO(jpeg), 'frame.jpg')}))
+    }
+
+    rows = []
+    for name, (payload_bytes, send) in paths.items():
+        time_requests(send, args.warmup)
+        cpu_ms, latencies = time_requests(send, args.requests)
+        rows.append(summarize(name, payload_bytes, cpu_ms, latencies))
+
+    server.detector.stop()
+
+    print(f"{args.width}x{args.height} JPEG, {args.requests} requests per path")
+    print(f"{'path':<14} {'payload_kb':>10} {'cpu_ms':>8} {'p50_ms':>8} {'p95_ms':>8}")
+    for row in rows:
+        print(f"{row['path']:<14} {row['payload_kb']:>10.1f} {row['cpu_ms_per_frame']:>8.2f} "
+              f"{row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f}")
+    return rows
+
+
+def benchmark_frames(args):
+    """Frame memory allocated per detection request: a new array per decode against the frame pool"""
+    install_stub_detector()
+    client = server.app.test_client()
+    jpeg = encoded_test_image(args.width, args.height)
+    frame_bytes = args.width * args.height * 3
+    send = lambda: client.post('/detection/detect/bench', data=jpeg, content_type='application/octet-stream')
+
+    # (mode, buffers per resolution, decoder); OpenCV decodes into a new array like before the pool,
+    # only simplejpeg decodes into the pooled buffers
+    modes = [('new-array', args.buffers, None)]
+    if frame_pool.simplejpeg is not None:
+        modes.append(('pool-simplejpeg', args.buffers, frame_pool.simplejpeg))
+    else:
+        print("simplejpeg is not installed (pip install simplejpeg): only the OpenCV path is measured")
+    installed_decoder = frame_pool.simplejpeg
+
+    rows = []
+    for mode, buffers, decoder in modes:
+        frame_pool.simplejpeg = decoder
+        server.frame_pool = FramePool(buffers=buffers)
+        time_requests(send, args.warmup)
+
+        # Allocations: the traced peak above the memory in use before each request
+        tracemalloc.start()
+        allocated = []
+        for _ in range(args.requests):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            send()
+            allocated.append(tracemalloc.get_traced_memory()[1] - before)
+        tracemalloc.stop()
+
+        # Timing and page faults without tracemalloc slowing every allocation down
+        faults = resource.getrusage(resource.RUSAGE_SELF).ru_minflt if resource else 0
+        cpu_ms, latencies = time_requests(send, args.requests)
+        faults = resource.getrusage(resource.RUSAGE_SELF).ru_minflt - faults if resource else 0
+
+        rows.append(dict({
+            'mode': mode,
+            'frame_allocations': sum(1 for size in allocated if size >= frame_bytes // 2) / args.requests,
+            'peak_alloc_mb': sum(allocated) / len(allocated) / 1e6,
+            'page_faults': faults / args.requests,
+            'cpu_ms': cpu_ms
+        }, **percentiles(latencies)))
+    frame_pool.simplejpeg = installed_decoder
+    server.detector.stop()
+
+    print(f"{args.width}x{args.height} JPEG, {args.requests} requests per mode, {args.buffers} buffers")
+    print(f"{'mode':<16} {'frame_allocs':>12} {'alloc_mb':>8} {'faults':>7} {'cpu_ms':>7} {'p50_ms':>7} {'p99_ms':>7}")
+    for row in rows:
+        print(f"{row['mode']:<16} {row['frame_allocations']:>12.2f} {row['peak_alloc_mb']:>8.2f} "
+              f"{row['page_faults']:>7.0f} {row['cpu_ms']:>7.2f} {row['p50_ms']:>7.2f} {row['p99_ms']:>7.2f}")
+    return rows
+
+
+def benchmark_ingest(args):
+    """CPU per analysed frame: the client encoding and posting each frame against the server reading the stream"""
+    install_stub_detector()
+    client = server.app.test_client()
+    frames = [cv2.resize(synthetic_frame(args.height // 8, args.width // 8), (args.width, args.height))
+              for _ in range(10)]
+    rows = []
+
+    # Client path: encode every frame to JPEG and post it, the server decodes it again
+    cpu_start = time.process_time()
+    for index in range(args.frames):
+        success, encoded = cv2.imencode('.jpg', frames[index % len(frames)])
+        response = client.post('/detection/detect/bench-post', data=encoded.tobytes(),
+                               content_type='application/octet-stream')
+        if response.status_code != 200:
+            raise RuntimeError(f"Request failed with {response.status_code}: {response.get_data(as_text=True)}")
+    rows.append({'path': 'post-jpeg', 'frames': args.frames,
+                 'cpu_ms_per_frame': (time.process_time() - cpu_start) * 1000 / args.frames})
+
+    # Server path: a stream reader decodes the video once and hands frames straight to the detector
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'stream.avi')
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), args.fps, (args.width, args.height))
+        for index in range(args.frames):
+            writer.write(frames[index % len(frames)])
+        writer.release()
+
+        # The video file stands in for a camera stream
+        server.streams.allow_files = True
+        cpu_start = time.process_time()
+        server.streams.register('bench-stream', path)
+        deadline = time.time() + args.frames / args.fps + 10
+        while server.streams.get_stats('bench-stream')['results'] < args.frames and time.time() < deadline:
+            time.sleep(0.05)
+        stats = server.streams.get_stats('bench-stream')
+        server.streams.unregister('bench-stream')
+        rows.append({'path': 'stream-reader', 'frames': stats['results'],
+                     'cpu_ms_per_frame': (time.process_time() - cpu_start) * 1000 / max(1, stats['results'])})
+    server.detector.stop()
+
+    print(f"{args.width}x{args.height}, {args.frames} frames, fake backend without inference cost")
+    print(f"{'path':<14} {'frames':>6} {'cpu_ms':>8}")
+    for row in rows:
+        print(f"{row['path']:<14} {row['frames']:>6} {row['cpu_ms_per_frame']:>8.2f}")
+    return rows
+
+
+def _stub_server_main(port, frame_cost, subscribers):
+    """Child process entry point: the real server with a stub detector"""
+    install_stub_detector(frame_cost)
+    if subscribers:
+        # One thread per event stream plus the usual pool for the REST endpoints
+        server.event_max_subscribers = subscribers
+        server.server_threads += subscribers
+        server.server_connection_limit += subscribers
+    server.run_server(host='127.0.0.1', server_port=port)
+
+
+def start_stub_server(port, frame_cost, subscribers=0):
+    """Start the server in its own process (own GIL) and wait until it answers /health"""
+    process = multiprocessing.Process(target=_stub_server_main, args=(port, frame_cost, subscribers), daemon=True)
+    process.start()
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/health')
+            if conn.getresponse().status == 200:
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Stub server did not start")
+
+
+def run_load(host, port, build_request, concurrency, duration):
+    """Send requests from concurrent keep-alive connections and report throughput and latency"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.time() + duration
+
+    def client_loop(client_id):
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        sent = 0
+        local_latencies = []
+        local_errors = 0
+        while time.time() < stop_at:
+            method, path, body, headers = build_request(client_id, sent)
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    local_errors += 1
+            except (OSError, http.client.HTTPException):
+                local_errors += 1
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=30)
+            local_latencies.append((time.perf_counter() - start) * 1000)
+            sent += 1
+        conn.close()
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=client_loop, args=(i,)) for i in range(concurrency)]
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - started
+
+    latencies.sort()
+    count = len(latencies)
+    return {
+        'requests': count,
+        'errors': errors[0],
+        'requests_per_sec': count / elapsed if elapsed else 0.0,
+        'p50_ms': latencies[count // 2] if count else 0.0,
+        'p95_ms': latencies[min(count - 1, int(count * 0.95))] if count else 0.0,
+        'p99_ms': latencies[min(count - 1, int(count * 0.99))] if count else 0.0
+    }
+
+
+def benchmark_load(args):
+    """Requests/sec for camera status POSTs and /detection/detect against a running server"""
+    process = None
+    if args.url:
+        target = urlparse(args.url)
+        host, port = target.hostname, target.port or 80
+    else:
+        host, port = '127.0.0.1', args.port
+        process = start_stub_server(port, args.frame_cost_ms / 1000.0)
+
+    jpeg = encoded_test_image(args.width, args.height)
+
+    def status_request(client_id, sent):
+        body = json.dumps({'connected': sent % 50 != 0, 'fps': 15})
+        return 'POST', f'/cameras/cam-{client_id % args.cameras}/status', body, {'Content-Type': 'application/json'}
+
+    def detect_request(client_id, sent):
+        return 'POST', f'/detection/detect/cam-{client_id % args.cameras}', jpeg, {
+            'Content-Type': 'application/octet-stream'}
+
+    rows = []
+    try:
+        for name, build_request in (('status', status_request), ('detect', detect_request)):
+            if name not in args.endpoints:
+                continue
+            for concurrency in args.concurrency:
+                row = run_load(host, port, build_request, concurrency, args.duration)
+                row.update({'endpoint': name, 'concurrency': concurrency})
+                rows.append(row)
+    finally:
+        if process is not None:
+            process.terminate()
+
+    print(f"Target http://{host}:{port} ({'stub detector' if process else 'external server'})")
+    print(f"{'endpoint':<8} {'conc':>5} {'req/s':>9} {'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8} {'errors':>7}")
+    for row in rows:
+        print(f"{row['endpoint']:<8} {row['concurrency']:>5} {row['requests_per_sec']:>9.1f} {row['p50_ms']:>8.2f} "
+              f"{row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['errors']:>7}")
+    return rows
+
+
+def benchmark_bulk(args):
+    """Status updates per second: one POST per camera vs bulk JSON array and NDJSON posts"""
+    process = None
+    if args.url:
+        target = urlparse(args.url)
+        host, port = target.hostname, target.port or 80
+    else:
+        host, port = '127.0.0.1', args.port
+        process = start_stub_server(port, 0.0)
+
+    def update(i):
+        return {'connected': i % 50 != 0, 'fps': 15, 'resolution': '1920x1080'}
+
+    def single(conn, first, count):
+        for i in range(first, first + count):
+            conn.request('POST', f'/cameras/cam-{i % args.cameras}/status', body=json.dumps(update(i)),
+                         headers={'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                raise RuntimeError(f"Status update failed with {response.status}")
+
+    def bulk(content_type, encode):
+        def send(conn, first, count):
+            for batch_start in range(first, first + count, args.batch):
+                items = [dict(update(i), camera_id=f"cam-{i % args.cameras}")
+                         for i in range(batch_start, min(batch_start + args.batch, first + count))]
+                conn.request('POST', '/cameras/status', body=encode(items), headers={'Content-Type': content_type})
+                response = conn.getresponse()
+                result = json.loads(response.read())
+                if response.status != 200 or result['failed']:
+                    raise RuntimeError(f"Bulk update failed with {response.status}")
+        return send
+
+    modes = {
+        'single': single,
+        'bulk-json': bulk('application/json', json.dumps),
+        'bulk-ndjson': bulk('application/x-ndjson', lambda items: '\n'.join(json.dumps(item) for item in items))
+    }
+
+    rows = []
+    try:
+        for name, send in modes.items():
+            per_client = args.updates // args.clients
+            threads = []
+            for client in range(args.clients):
+                conn = http.client.HTTPConnection(host, port, timeout=30)
+                threads.append(threading.Thread(target=send, args=(conn, client * per_client, per_client)))
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            requests = args.updates if name == 'single' else -(-per_client // args.batch) * args.clients
+            rows.append({
+                'mode': name,
+                'updates': per_client * args.clients,
+                'requests': requests,
+                'updates_per_sec': per_client * args.clients / elapsed
+            })
+    finally:
+        if process is not None:
+            process.terminate()
+
+    print(f"{args.updates} status updates over {args.cameras} cameras, {args.clients} clients, batch {args.batch}")
+    print(f"{'mode':<12} {'requests':>9} {'updates/s':>10}")
+    for row in rows:
+        print(f"{row['mode']:<12} {row['requests']:>9} {row['updates_per_sec']:>10.0f}")
+    return rows
+
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        'p50_ms': latencies[count // 2] if count else 0.0,
+        'p95_ms': latencies[min(count - 1, int(count * 0.95))] if count else 0.0,
+        'p99_ms': latencies[min(count - 1, int(count * 0.99))] if count else 0.0,
+        'max_ms': latencies[-1] if count else 0.0
+    }
+
+
+def fanout_bus(args):
+    """Deliver events through an EventBus to subscriber threads; returns {event: [latency ms]}"""
+    bus = EventBus(queue_size=args.events + 1)
+    receipts = {}
+    lock = threading.Lock()
+
+    def subscriber_loop(subscription):
+        for _ in range(args.events):
+            event = subscription.get(timeout=10)
+            if event is None:
+                return
+            latency = (time.time() - event['data']['sent_at']) * 1000
+            with lock:
+                receipts.setdefault(event['data']['index'], []).append(latency)
+
+    subscriptions = [bus.subscribe() for _ in range(args.subscribers)]
+    threads = [threading.Thread(target=subscriber_loop, args=(s,)) for s in subscriptions]
+    for thread in threads:
+        thread.start()
+    for index in range(args.events):
+        bus.publish('alert', {'index': index, 'sent_at': time.time()}, camera_id='bench')
+        time.sleep(1.0 / args.rate)
+    for thread in threads:
+        thread.join()
+    return receipts
+
+
+def fanout_http(args):
+    """Stream /events to subscriber connections while alerts are POSTed; returns {event: [latency ms]}"""
+    process = start_stub_server(args.port, 0.0, subscribers=args.subscribers)
+    receipts = {}
+    lock = threading.Lock()
+    ready = threading.Semaphore(0)
+
+    def subscriber_loop():
+        conn = http.client.HTTPConnection('127.0.0.1', args.port, timeout=30)
+        conn.request('GET', '/events?types=alert')
+        response = conn.getresponse()
+        ready.release()
+        received = 0
+        try:
+            while received < args.events:
+                line = response.readline()
+                if not line:
+                    return
+                if not line.startswith(b'data: '):
+                    continue
+                data = json.loads(line[6:])['data']
+                sent_at, index = json.loads(data['message'])
+                with lock:
+                    receipts.setdefault(index, []).append((time.time() - sent_at) * 1000)
+                received += 1
+        except (OSError, http.client.HTTPException):
+            return
+        finally:
+            conn.close()
+
+    try:
+        threads = [threading.Thread(target=subscriber_loop) for _ in range(args.subscribers)]
+        for thread in threads:
+            thread.start()
+        for _ in threads:
+            ready.acquire()
+
+        publisher = http.client.HTTPConnection('127.0.0.1', args.port, timeout=30)
+        for index in range(args.events):
+            body = json.dumps({'message': json.dumps([time.time(), index]), 'camera_id': 'bench'})
+            publisher.request('POST', '/alerts', body=body, headers={'Content-Type': 'application/json'})
+            publisher.getresponse().read()
+            time.sleep(1.0 / args.rate)
+        publisher.close()
+        for thread in threads:
+            thread.join(timeout=30)
+    finally:
+        process.terminate()
+    return receipts
+
+
+def benchmark_fanout(args):
+    """Latency from publishing an event to its delivery, with many concurrent subscribers"""
+    receipts = fanout_http(args) if args.transport == 'http' else fanout_bus(args)
+
+    deliveries = [latency for latencies in receipts.values() for latency in latencies]
+    # Fan-out latency of an event: until its slowest subscriber received it
+    slowest = [max(latencies) for latencies in receipts.values()]
+    result = {
+        'transport': args.transport,
+        'subscribers': args.subscribers,
+        'events': args.events,
+        'deliveries': len(deliveries),
+        'expected_deliveries': args.subscribers * args.events,
+        'delivery': percentiles(deliveries),
+        'fanout': percentiles(slowest)
+    }
+    print(f"{args.subscribers} subscribers, {args.events} events at {args.rate}/s over {args.transport}: "
+          f"{result['deliveries']}/{result['expected_deliveries']} delivered")
+    print(f"{'latency':<22} {'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8} {'max_ms':>8}")
+    for name, row in (('per delivery', result['delivery']), ('fan-out (slowest)', result['fanout'])):
+        print(f"{name:<22} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['max_ms']:>8.2f}")
+    return result
+
+
+def generate_events(store, events, cameras, seed=1):
+    """Apply a realistic mix of events: mostly status heartbeats, some incidents and alerts"""
+    rng = random.Random(seed)
+    for i in range(events):
+        camera_id = f"cam-{rng.randrange(cameras)}"
+        roll = rng.random()
+        if roll < 0.98:
+            store.update_status(camera_id, {'connected': rng.random() > 0.05, 'fps': 15})
+        elif roll < 0.99:
+            store.create_incident(f"Incident {i}", camera_id=camera_id, severity='high')
+        else:
+            store.create_alert(f"Alert {i}", camera_id=camera_id, alert_type='danger')
+
+
+def benchmark_journal(args):
+    """Write amplification and startup replay time of the journal vs the old full rewrite"""
+    with tempfile.TemporaryDirectory() as directory:
+        data_file = os.path.join(directory, 'camera_analytics.json')
+        store = CameraStore(data_file)
+        store.load()
+
+        start = time.perf_counter()
+        generate_events(store, args.events, args.cameras)
+        append_seconds = time.perf_counter() - start
+        store.close()
+        journal_bytes = os.path.getsize(store.journal_file)
+
+        # Startup with the whole history still in the journal
+        start = time.perf_counter()
+        replayed = CameraStore(data_file)
+        replayed.load()
+        replay_seconds = time.perf_counter() - start
+
+        # Startup after compaction: only the snapshot is read
+        replayed.compact()
+        replayed.close()
+        snapshot_bytes = os.path.getsize(data_file)
+        start = time.perf_counter()
+        CameraStore(data_file).load()
+        snapshot_load_seconds = time.perf_counter() - start
+
+    # Full rewrites of a state that grows linearly with the history: the old
+    # save_data did one every snapshot interval, compaction one every compaction
+    # interval (the journal makes it safe to compact much less often)
+    duration = args.events / args.events_per_sec
+
+    def rewrite_bytes(interval):
+        rewrites = max(1, int(duration // interval))
+        return rewrites, snapshot_bytes * (rewrites + 1) / 2
+
+    legacy_rewrites, legacy_bytes = rewrite_bytes(args.snapshot_interval)
+    compactions, compaction_bytes = rewrite_bytes(args.compaction_interval)
+
+    result = {
+        'events': args.events,
+        'append_events_per_sec': args.events / append_seconds,
+        'snapshot_bytes': snapshot_bytes,
+        'legacy_bytes_per_event': legacy_bytes / args.events,
+        'journal_bytes_per_event': journal_bytes / args.events,
+        'compaction_bytes_per_event': compaction_bytes / args.events,
+        'replay_seconds': replay_seconds,
+        'snapshot_load_seconds': snapshot_load_seconds,
+        'data_at_risk_seconds': {'legacy': args.snapshot_interval, 'journal': 0}
+    }
+    print(f"{args.events} events over {args.cameras} cameras "
+          f"({duration / 3600:.1f} h at {args.events_per_sec} events/s), final snapshot {snapshot_bytes / 1024:.0f} KB")
+    print(f"Append rate:              {result['append_events_per_sec']:.0f} events/s")
+    print(f"Legacy full rewrites:     {legacy_rewrites} -> {result['legacy_bytes_per_event']:.0f} bytes/event")
+    print(f"Journal appends:          {result['journal_bytes_per_event']:.0f} bytes/event")
+    print(f"Compactions:              {compactions} -> {result['compaction_bytes_per_event']:.0f} bytes/event")
+    print(f"Startup: replay {args.events} events {replay_seconds:.2f} s, "
+          f"load compacted snapshot {snapshot_load_seconds:.3f} s")
+    return result
+
+
+def benchmark_recovery(args):
+    """
+    Crash recovery check: a journal whose last write was cut short, then new events and a reload
+
+    Fails (consistent False) if an event appended after recovering from a torn
+    journal is not there after the next load.
+    """
+    cases = {
+        # Crash in the middle of writing an event
+        'torn event': lambda line: line[:len(line) // 2],
+        # Crash after the event but before its newline
+        'missing newline': lambda line: line.rstrip('\n'),
+        # Torn event in the journal of an interrupted compaction
+        'torn compaction journal': lambda line: line[:len(line) // 2]
+    }
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for index, (name, tear) in enumerate(cases.items()):
+            data_file = os.path.join(directory, f'camera_analytics-{index}.json')
+            store = CameraStore(data_file)
+            store.load()
+            for i in range(args.events):
+                store.create_alert(f"Alert {i}", camera_id='cam-1', alert_type='danger')
+            store.close()
+
+            with open(store.journal_file, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+            kept = args.events if name == 'missing newline' else args.events - 1
+            journal_file = store.rotated_journal_file if name == 'torn compaction journal' else store.journal_file
+            if journal_file != store.journal_file:
+                os.remove(store.journal_file)
+            with open(journal_file, 'w', encoding='utf-8') as f:
+                f.write(''.join(lines[:-1]) + tear(lines[-1]))
+
+            # Recover, write after the recovery, then crash-free reload
+            recovered = CameraStore(data_file)
+            recovered.load()
+            recovered.create_alert("After recovery", camera_id='cam-1', alert_type='danger')
+            recovered.close()
+            reloaded = CameraStore(data_file)
+            reloaded.load()
+            messages = [alert['message'] for alert in reloaded.list_alerts()]
+            reloaded.close()
+            results[name] = messages == [f"Alert {i}" for i in range(kept)] + ["After recovery"]
+
+    result = {'events': args.events, 'cases': results, 'consistent': all(results.values())}
+    for name, passed in results.items():
+        print(f"{name:<24} {'ok' if passed else 'LOST EVENTS'}")
+    print(f"Reloaded state consistent: {result['consistent']}")
+    return result
+
+
+def benchmark_concurrency(args):
+    """
+    Stress test: writers, readers and continuous compaction on one store
+
+    Fails (errors > 0 or consistent False) if a reader or the compaction ever sees
+    a dict change during iteration, or if reloading the snapshot and journal does
+    not give back exactly the in-memory state.
+    """
+    errors = []
+    reader_latencies = []
+    writer_latencies = []
+    compaction_seconds = []
+    lock = threading.Lock()
+
+    with tempfile.TemporaryDirectory() as directory:
+        data_file = os.path.join(directory, 'camera_analytics.json')
+        store = CameraStore(data_file)
+        store.load()
+        stop_at = time.time() + args.duration
+
+        def guarded(loop):
+            def run(*loop_args):
+                try:
+                    loop(*loop_args)
+                except Exception as e:
+                    with lock:
+                        errors.append(f"{loop.__name__}: {e!r}")
+            return run
+
+        def writer_loop(writer_id):
+            rng = random.Random(writer_id)
+            latencies = []
+            while time.time() < stop_at:
+                camera_id = f"cam-{rng.randrange(args.cameras)}"
+                roll = rng.random()
+                start = time.perf_counter()
+                if roll < 0.9:
+                    store.update_status(camera_id, {'connected': rng.random() > 0.1, 'fps': rng.randrange(30)})
+                elif roll < 0.97:
+                    store.create_alert(f"Alert from writer {writer_id}", camera_id=camera_id, alert_type='danger')
+                elif roll < 0.99:
+                    store.acknowledge_alerts(camera_id=camera_id)
+                else:
+                    store.create_incident(f"Incident from writer {writer_id}", camera_id=camera_id)
+                latencies.append((time.perf_counter() - start) * 1000)
+            with lock:
+                writer_latencies.extend(latencies)
+
+        def reader_loop(reader_id):
+            latencies = []
+            while time.time() < stop_at:
+                start = time.perf_counter()
+                # What the GET endpoints serialize; json.dump iterates in Python
+                # (like the old save_data), so it sees concurrent modifications
+                json.dump(store.get_status(), io.StringIO())
+                json.dump(store.get_analytics(), io.StringIO())
+                json.dump(store.list_alerts(acknowledged=False, limit=100), io.StringIO())
+                latencies.append((time.perf_counter() - start) * 1000)
+            with lock:
+                reader_latencies.extend(latencies)
+
+        def compaction_loop():
+            while time.time() < stop_at:
+                start = time.perf_counter()
+                store.compact()
+                compaction_seconds.append(time.perf_counter() - start)
+                time.sleep(args.compaction_interval)
+
+        threads = [threading.Thread(target=guarded(writer_loop), args=(i,)) for i in range(args.writers)]
+        threads += [threading.Thread(target=guarded(reader_loop), args=(i,)) for i in range(args.readers)]
+        threads.append(threading.Thread(target=guarded(compaction_loop)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Half the time the state ends in snapshot plus journal, half in a snapshot alone
+        expected = store.snapshot()
+        store.close()
+        reloaded = CameraStore(data_file)
+        reloaded.load()
+        actual = reloaded.snapshot()
+        consistent = all(expected[key] == actual[key]
+                         for key in ('status', 'analytics', 'rollups', 'incidents', 'alerts'))
+
+    result = {
+        'writers': args.writers,
+        'readers': args.readers,
+        'cameras': args.cameras,
+        'writes_per_sec': len(writer_latencies) / args.duration,
+        'write_latency': percentiles(writer_latencies),
+        'reads': len(reader_latencies),
+        'read_latency': percentiles(reader_latencies),
+        'compactions': len(compaction_seconds),
+        'max_compaction_ms': max(compaction_seconds) * 1000 if compaction_seconds else 0.0,
+        'errors': errors,
+        'consistent': consistent
+    }
+    print(f"{args.writers} writers, {args.readers} readers, {args.cameras} cameras, {args.duration:.0f} s")
+    print(f"Writes: {result['writes_per_sec']:.0f}/s, reads: {result['reads']}, "
+          f"compactions: {result['compactions']} (max {result['max_compaction_ms']:.1f} ms)")
+    for name in ('read', 'write'):
+        latency = result[f'{name}_latency']
+        print(f"{name.capitalize()} latency ms: p50 {latency['p50_ms']:.2f} p99 {latency['p99_ms']:.2f} "
+              f"max {latency['max_ms']:.2f}")
+    print(f"Errors: {len(errors)}, reloaded state consistent: {consistent}")
+    for error in errors[:10]:
+        print(f"  {error}")
+    return result
+
+
+def time_queries(query, repeat):
+    """Median latency in ms of a store query"""
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        query()
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return latencies[len(latencies) // 2]
+
+
+def benchmark_storage(args):
+    """Insert rate and filtered query latency of the memory and SQLite backends"""
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        backends = {
+            'memory': lambda: CameraStore(os.path.join(directory, 'camera_analytics.json')),
+            'sqlite': lambda: SQLiteCameraStore(os.path.join(directory, 'camera_analytics.db'))
+        }
+        for name in args.backends:
+            store = backends[name]()
+            store.load()
+            rng = random.Random(1)
+
+            start = time.perf_counter()
+            for i in range(args.status_updates):
+                store.update_status(f"cam-{i % args.cameras}", {'connected': rng.random() > 0.05})
+            status_rate = args.status_updates / (time.perf_counter() - start)
+
+            start = time.perf_counter()
+            for i in range(args.records):
+                camera_id = f"cam-{rng.randrange(args.cameras)}"
+                store.create_incident(f"Incident {i}", camera_id=camera_id,
+                                      severity=rng.choice(['low', 'medium', 'high', 'critical']))
+                store.create_alert(f"Alert {i}", camera_id=camera_id, alert_type=rng.choice(['info', 'danger']))
+            record_rate = 2 * args.records / (time.perf_counter() - start)
+
+            queries = {
+                'incidents camera': lambda: store.list_incidents(camera_id='cam-7'),
+                'incidents critical': lambda: store.list_incidents(severity='critical', camera_id='cam-7'),
+                'alerts unacked camera': lambda: store.list_alerts(camera_id='cam-7', acknowledged=False),
+                'all incidents': lambda: store.list_incidents()
+            }
+            row = {'backend': name, 'status_per_sec': status_rate, 'records_per_sec': record_rate}
+            for query_name, query in queries.items():
+                row[query_name] = time_queries(query, args.repeat)
+            rows.append(row)
+            store.close()
+
+    query_names = [key for key in rows[0] if key not in ('backend', 'status_per_sec', 'records_per_sec')]
+    print(f"{args.records} incidents + {args.records} alerts over {args.cameras} cameras, "
+          f"{args.status_updates} status updates")
+    print(f"{'backend':<8} {'status/s':>9} {'records/s':>10} " + ' '.join(f"{name + ' ms':>24}" for name in query_names))
+    for row in rows:
+        print(f"{row['backend']:<8} {row['status_per_sec']:>9.0f} {row['records_per_sec']:>10.0f} " +
+              ' '.join(f"{row[name]:>24.3f}" for name in query_names))
+    return rows
+
+
+def check_parity(args):
+    """
+    Same operations on the memory and SQLite backends, comparing the records the API returns
+
+    Timestamps are compared by presence only. Fails (consistent False) if a
+    record has different fields or values depending on the backend.
+    """
+    def normalize(value):
+        if isinstance(value, list):
+            return [normalize(item) for item in value]
+        if isinstance(value, dict):
+            return {key: ('<timestamp>' if key in ('timestamp', 'acknowledged_at') and item is not None
+                          else normalize(item)) for key, item in value.items()}
+        return value
+
+    def run(store):
+        outputs = []
+        for i in range(args.records):
+            camera_id = f"cam-{i % 3}"
+            outputs.append(store.create_incident(f"Incident {i}", camera_id=camera_id, severity='high'))
+            outputs.append(store.create_alert(f"Alert {i}", camera_id=camera_id, alert_type='danger'))
+        outputs.append(store.acknowledge_alert(1))
+        outputs.append(store.acknowledge_alert(1))
+        outputs.append(store.acknowledge_alert(args.records + 1))
+        outputs.append(store.acknowledge_alerts(camera_id='cam-1'))
+        outputs.append(store.acknowledge_alerts(alert_ids=[2, 3, args.records + 1]))
+        outputs.append(store.get_alert(2))
+        outputs.append(store.list_alerts())
+        outputs.append(store.list_alerts(acknowledged=False, camera_id='cam-2'))
+        outputs.append(store.list_alerts(since_id=2, limit=3))
+        outputs.append(store.list_incidents(camera_id='cam-0'))
+        outputs.append(store.get_incident(1))
+        return normalize(outputs)
+
+    with tempfile.TemporaryDirectory() as directory:
+        stores = {
+            'memory': CameraStore(os.path.join(directory, 'camera_analytics.json')),
+            'sqlite': SQLiteCameraStore(os.path.join(directory, 'camera_analytics.db'))
+        }
+        outputs = {}
+        for name, store in stores.items():
+            store.load()
+            outputs[name] = run(store)
+            store.close()
+
+    differences = [(index, memory, sqlite) for index, (memory, sqlite)
+                   in enumerate(zip(outputs['memory'], outputs['sqlite'])) if memory != sqlite]
+    result = {'operations': len(outputs['memory']), 'differences': len(differences), 'consistent': not differences}
+    print(f"{result['operations']} operations, {len(differences)} with different results")
+    for index, memory, sqlite in differences[:10]:
+        print(f"  operation {index}:\n    memory: {memory}\n    sqlite: {sqlite}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the camera API server")
+    parser.add_argument('--json', action='store_true', help="Print raw results as JSON")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    upload = subparsers.add_parser('upload', help="JSON/base64 vs binary frame upload on /detection/detect")
+    upload.add_argument('--width', type=int, default=1920)
+    upload.add_argument('--height', type=int, default=1080)
+    upload.add_argument('--requests', type=int, default=200)
+    upload.add_argument('--warmup', type=int, default=10)
+    upload.set_defaults(func=benchmark_upload)
+
+    frames = subparsers.add_parser('frames', help="Frame allocations per detection request, with and without the pool")
+    frames.add_argument('--width', type=int, default=1920)
+    frames.add_argument('--height', type=int, default=1080)
+    frames.add_argument('--requests', type=int, default=200)
+    frames.add_argument('--warmup', type=int, default=10)
+    frames.add_argument('--buffers', type=int, default=16, help="Buffers per resolution")
+    frames.set_defaults(func=benchmark_frames)
+
+    ingest = subparsers.add_parser('ingest', help="CPU per frame: posting JPEGs vs the server reading the stream")
+    ingest.add_argument('--width', type=int, default=1280)
+    ingest.add_argument('--height', type=int, default=720)
+    ingest.add_argument('--frames', type=int, default=300)
+    ingest.add_argument('--fps', type=float, default=50.0, help="Frame rate of the stream file")
+    ingest.set_defaults(func=benchmark_ingest)
+
+    load = subparsers.add_parser('load', help="Load test: requests/sec for status updates and detection")
+    load.add_argument('--url', help="Server to test (default: start one with a stub detector)")
+    load.add_argument('--port', type=int, default=5599, help="Port for the self-hosted stub server")
+    load.add_argument('--endpoints', nargs='+', default=['status', 'detect'], choices=['status', 'detect'])
+    load.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    load.add_argument('--duration', type=float, default=10.0, help="Seconds per run")
+    load.add_argument('--cameras', type=int, default=200)
+    load.add_argument('--width', type=int, default=1280)
+    load.add_argument('--height', type=int, default=720)
+    load.add_argument('--frame-cost-ms', type=float, default=0.0, help="Stub inference cost per frame")
+    load.set_defaults(func=benchmark_load)
+
+    bulk_parser = subparsers.add_parser('bulk', help="Single vs bulk camera status updates")
+    bulk_parser.add_argument('--url', help="Server to test (default: start one with a stub detector)")
+    bulk_parser.add_argument('--port', type=int, default=5599, help="Port for the self-hosted stub server")
+    bulk_parser.add_argument('--updates', type=int, default=20000)
+    bulk_parser.add_argument('--cameras', type=int, default=200)
+    bulk_parser.add_argument('--batch', type=int, default=200, help="Updates per bulk request")
+    bulk_parser.add_argument('--clients', type=int, default=4)
+    bulk_parser.set_defaults(func=benchmark_bulk)
+
+    fanout = subparsers.add_parser('fanout', help="Event stream fan-out latency with many subscribers")
+    fanout.add_argument('--transport', choices=['http', 'bus'], default='http',
+                        help="SSE over a self-hosted stub server, or the in-process EventBus alone")
+    fanout.add_argument('--subscribers', type=int, default=200)
+    fanout.add_argument('--events', type=int, default=100)
+    fanout.add_argument('--rate', type=float, default=20.0, help="Events published per second")
+    fanout.add_argument('--port', type=int, default=5599, help="Port for the self-hosted stub server")
+    fanout.set_defaults(func=benchmark_fanout)
+
+    journal = subparsers.add_parser('journal', help="Journal write amplification and startup replay time")
+    journal.add_argument('--events', type=int, default=1000000)
+    journal.add_argument('--cameras', type=int, default=200)
+    journal.add_argument('--events-per-sec', type=float, default=40.0)
+    journal.add_argument('--snapshot-interval', type=float, default=300.0, help="Old full-rewrite interval")
+    journal.add_argument('--compaction-interval', type=float, default=300.0, help="CAMERA_SNAPSHOT_INTERVAL")
+    journal.set_defaults(func=benchmark_journal)
+
+    recovery = subparsers.add_parser('recovery', help="Crash recovery: torn journal tail, new events, reload")
+    recovery.add_argument('--events', type=int, default=100, help="Events in the journal before the crash")
+    recovery.set_defaults(func=benchmark_recovery)
+
+    concurrency = subparsers.add_parser('concurrency', help="Stress test: concurrent writers, readers and compaction")
+    concurrency.add_argument('--writers', type=int, default=8)
+    concurrency.add_argument('--readers', type=int, default=8)
+    concurrency.add_argument('--cameras', type=int, default=200)
+    concurrency.add_argument('--duration', type=float, default=10.0)
+    concurrency.add_argument('--compaction-interval', type=float, default=0.05)
+    concurrency.set_defaults(func=benchmark_concurrency)
+
+    storage = subparsers.add_parser('storage', help="Insert rate and query latency: memory vs SQLite")
+    storage.add_argument('--backends', nargs='+', default=['memory', 'sqlite'], choices=['memory', 'sqlite'])
+    storage.add_argument('--records', type=int, default=100000, help="Incidents and alerts to create (each)")
+    storage.add_argument('--status-updates', type=int, default=50000)
+    storage.add_argument('--cameras', type=int, default=200)
+    storage.add_argument('--repeat', type=int, default=20)
+    storage.set_defaults(func=benchmark_storage)
+
+    parity = subparsers.add_parser('parity', help="Check: memory and SQLite backends return identical records")
+    parity.add_argument('--records', type=int, default=20, help="Incidents and alerts to create (each)")
+    parity.set_defaults(func=check_parity)
+
+    args = parser.parse_args()
+    results = args.func(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    # Stress tests and checks report whether the state came back intact
+    if isinstance(results, dict) and results.get('consistent') is False:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
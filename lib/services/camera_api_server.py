@@ -1,4 +1,5 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
+from werkzeug.exceptions import RequestEntityTooLarge
 import os
 import json
 import time
@@ -7,7 +8,8 @@ from datetime import datetime
 import sys
 import cv2
 import base64
-import numpy as np
+import binascii
+import concurrent.futures
 from pathlib import Path
 
 # Try to import flask_cors or install it
@@ -43,14 +45,22 @@ from datetime import datetime
 import sys
 import cv2
 import base64
-import numpy as np
 from pathlib import Path
 
-# Add path for importing weapon detector
+# Add paths for importing the camera store and the weapon detector
+sys.path.append(str(Path(__file__).parent))
 sys.path.append(str(Path(__file__).parent.parent))
+from camera_store import CameraStore
+from sqlite_store import SQLiteCameraStore
+from event_stream import EventBus, format_sse
+from rollups import RESOLUTIONS
+from frame_pool import FramePool
+from stream_ingest import StreamIngest
 try:
     from algoritmo.IA import WeaponDetector
+    threaded_detector = True
 except ImportError:
+    threaded_detector = False
     try:
         from algoritmo.weapon_detector import WeaponDetector
     except ImportError:
@@ -69,6 +79,11 @@ def initialize_detector():
         return False
         
     try:
+        # The fake backend runs without a model file (tests, benchmarks)
+        if threaded_detector and detection_backend == 'fake':
+            detector = WeaponDetector(**detector_settings())
+            return detector.start()
+            
         # Look for model in common paths with better diagnostics
         model_paths = [
             Path(__file__).parent.parent.parent / 'models' / 'violence_detectorAerithV2.pt',
@@ -83,9 +98,13 @@ def initialize_detector():
             
         model_path = None
         for path in model_paths:
-            if path.exists():
-                model_path = str(path)
-                print(f"Found model at: {model_path}")
+            # A model exported for ONNX Runtime is enough on its own
+            for candidate in (path, path.with_suffix('.onnx')):
+                if candidate.exists():
+                    model_path = str(candidate)
+                    print(f"Found model at: {model_path}")
+                    break
+            if model_path is not None:
                 break
                 
         if model_path is None:
@@ -96,7 +115,8 @@ def initialize_detector():
             
         # Initialize detector with more detailed logging
         print(f"Creating WeaponDetector with model_path={model_path}")
-        detector = WeaponDetector(model_path=model_path)
+        detector_options = detector_settings() if threaded_detector else {}
+        detector = WeaponDetector(model_path=model_path, **detector_options)
         print("WeaponDetector instance created, calling start()...")
         success = detector.start()
         print(f"Weapon detector initialized and started: {success}")
@@ -107,44 +127,141 @@ def initialize_detector():
         traceback.print_exc()
         return False
 
+def detector_settings():
+    """Options of the threaded detector (IA.WeaponDetector) from the configuration"""
+    return {
+        'max_batch_size': detection_max_batch,
+        'max_batch_wait': detection_max_wait_ms / 1000.0,
+        'motion_gating': detection_motion_gating,
+        'motion_threshold': detection_motion_threshold,
+        'max_queued_frames': detection_max_queued,
+        'adaptive_sampling': detection_adaptive_sampling,
+        'quiet_interval': detection_quiet_interval,
+        'detection_threshold': detection_alert_threshold,
+        'cooldown_period': detection_alert_cooldown,
+        'tracking': detection_tracking,
+        'backend': detection_backend,
+        'threads': detection_threads,
+        'profile': detection_profile,
+        'workers': detection_workers
+    }
+
 # Configuration
 port = int(os.environ.get('CAMERA_API_PORT', 5556))
 data_file = os.environ.get('CAMERA_DATA_FILE', 'camera_analytics.json')
+journal_file = os.environ.get('CAMERA_JOURNAL_FILE', data_file + '.journal')
+journal_fsync = os.environ.get('CAMERA_JOURNAL_FSYNC', '0') == '1'
+snapshot_interval = int(os.environ.get('CAMERA_SNAPSHOT_INTERVAL', 300))
+storage_backend = os.environ.get('CAMERA_STORAGE', 'memory')  # 'memory' (journal + snapshot) or 'sqlite'
+db_file = os.environ.get('CAMERA_DB_FILE', 'camera_analytics.db')
+alert_ack_ttl = int(os.environ.get('ALERT_ACK_TTL', 3600))  # Seconds acknowledged alerts stay listed, 0 = forever
+history_size = int(os.environ.get('CAMERA_HISTORY_SIZE', 100))  # Connection reports kept per camera
+rollup_retention = {
+    'minute': float(os.environ.get('ROLLUP_MINUTE_RETENTION_HOURS', 6)) * 3600,
+    'hour': float(os.environ.get('ROLLUP_HOUR_RETENTION_DAYS', 7)) * 86400,
+    'day': float(os.environ.get('ROLLUP_DAY_RETENTION_DAYS', 365)) * 86400
+}
+detection_max_batch = int(os.environ.get('DETECTION_MAX_BATCH', 8))
+detection_max_wait_ms = float(os.environ.get('DETECTION_MAX_WAIT_MS', 5))
+detection_timeout = float(os.environ.get('DETECTION_TIMEOUT', 5))
+# Inference backend: 'auto' prefers a model exported with `python lib/algoritmo/backends.py export`
+# (ONNX Runtime, then OpenVINO) over ultralytics / torch.hub; 'fake' needs no model at all
+detection_backend = os.environ.get('DETECTION_BACKEND', 'auto')
+detection_threads = int(os.environ.get('DETECTION_THREADS', 0))  # Intra-op threads, 0 = runtime default
+# Run inference in this many worker processes (0 = in the detection thread); with workers,
+# DETECTION_THREADS is per worker and 0 shares the cores evenly between them
+detection_workers = int(os.environ.get('DETECTION_WORKERS', 0))
+# Inference profile of every camera unless set per camera: 'full', 'fast' (smaller input) or 'int8'
+detection_profile = os.environ.get('DETECTION_PROFILE', 'full')
+# Reuse the last result for frames without motion (default for every camera, see /detection/settings)
+detection_motion_gating = os.environ.get('DETECTION_MOTION_GATING', '0') == '1'
+detection_motion_threshold = float(os.environ.get('DETECTION_MOTION_THRESHOLD', 0.01))
+# Frames wait in a small queue per camera; DETECTION_MAX_QUEUED bounds them over all cameras
+detection_max_queued = int(os.environ.get('DETECTION_MAX_QUEUED', 64))
+# Sample quiet cameras down to one frame every DETECTION_QUIET_INTERVAL seconds (more after a detection)
+detection_adaptive_sampling = os.environ.get('DETECTION_ADAPTIVE_SAMPLING', '0') == '1'
+detection_quiet_interval = float(os.environ.get('DETECTION_QUIET_INTERVAL', 1.0))
+# Alert state is kept per camera: detections in its last 10 frames, and a cooldown after each alert
+detection_alert_threshold = int(os.environ.get('DETECTION_ALERT_THRESHOLD', 2))
+detection_alert_cooldown = float(os.environ.get('DETECTION_ALERT_COOLDOWN', 10))
+# Follow objects across frames: track ids in responses and one alert per tracked weapon
+detection_tracking = os.environ.get('DETECTION_TRACKING', '0') == '1'
+# Decoded frames reuse DETECTION_FRAME_BUFFERS preallocated buffers per resolution (0 = a new array per frame)
+detection_frame_buffers = int(os.environ.get('DETECTION_FRAME_BUFFERS', 16))
+
+# Streams pulled by the server (PUT /cameras/<id>/stream): reconnect backoff from
+# STREAM_RECONNECT_DELAY doubling up to STREAM_MAX_RECONNECT_DELAY seconds, and at most
+# STREAM_MAX_FPS frames per second per camera sent to the detector (0 = as fast as it answers)
+stream_reconnect_delay = float(os.environ.get('STREAM_RECONNECT_DELAY', 1))
+stream_max_reconnect_delay = float(os.environ.get('STREAM_MAX_RECONNECT_DELAY', 30))
+stream_read_timeout = float(os.environ.get('STREAM_READ_TIMEOUT', 10))
+stream_max_fps = float(os.environ.get('STREAM_MAX_FPS', 0))
+# Only rtsp(s)/http(s) streams can be registered; STREAM_ALLOW_FILES=1 also accepts local video files (testing)
+stream_allow_files = os.environ.get('STREAM_ALLOW_FILES', '0') == '1'
+
+# Serving: 'waitress' (multi-threaded production server) or 'dev' (Flask debug server).
+# Always a single process: the detector (and its inference workers, if any) and the
+# in-memory state are shared by all request threads, never copied per worker.
+server_mode = os.environ.get('CAMERA_API_SERVER', 'waitress')
+server_threads = int(os.environ.get('CAMERA_API_THREADS', 16))
+server_connection_limit = int(os.environ.get('CAMERA_API_CONNECTION_LIMIT', 256))
+max_request_bytes = int(os.environ.get('CAMERA_API_MAX_REQUEST_BYTES', 16 * 1024 * 1024))  # Larger bodies get a 413, 0 = no limit
+
+# Event stream (GET /events). Every connected client holds one server thread for as
+# long as it stays connected, so CAMERA_API_THREADS must be larger than the number
+# of subscribers; EVENT_MAX_SUBSCRIBERS keeps some threads free for the REST endpoints.
+event_history_size = int(os.environ.get('EVENT_HISTORY_SIZE', 1000))
+event_heartbeat = float(os.environ.get('EVENT_HEARTBEAT', 15))
+event_max_subscribers = int(os.environ.get('EVENT_MAX_SUBSCRIBERS', max(1, server_threads - 4)))
 
 app = Flask(__name__)
+app.config['MAX_CONTENT_LENGTH'] = max_request_bytes or None
 CORS(app)  # Enable CORS for all routes
 
-# In-memory storage
-camera_status = {}
-camera_analytics = {}
-incident_reports = []
-active_alerts = []
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(error):
+    return jsonify({'error': f'Request body larger than {max_request_bytes} bytes'}), 413
+
+# Storage: in memory and journaled to disk as it changes, or in SQLite
+if storage_backend == 'sqlite':
+    store = SQLiteCameraStore(db_file, alert_ack_ttl=alert_ack_ttl, history_size=history_size,
+                              rollup_retention=rollup_retention)
+else:
+    store = CameraStore(data_file, journal_file, fsync=journal_fsync, alert_ack_ttl=alert_ack_ttl,
+                        history_size=history_size, rollup_retention=rollup_retention)
+
+# Alerts, acknowledgements, status changes and detections pushed to /events subscribers
+events = EventBus(history_size=event_history_size)
+
+# Buffers that detection requests decode their frames into
+frame_pool = FramePool(buffers=detection_frame_buffers)
 
-# Load existing data if available
+# Load existing data (snapshot plus journal) if available
 def load_data():
-    try:
-        if os.path.exists(data_file):
-            with open(data_file, 'r') as f:
-                data = json.load(f)
-                return data.get('analytics', {}), data.get('incidents', [])
-        return {}, []
-    except Exception as e:
-        print(f"Error loading data: {e}")
-        return {}, []
+    store.load()
 
-# Save data periodically
+# Compact the journal into a snapshot periodically
 def save_data():
     while True:
+        time.sleep(snapshot_interval)
         try:
-            with open(data_file, 'w') as f:
-                json.dump({
-                    'analytics': camera_analytics,
-                    'incidents': incident_reports
-                }, f)
-            print(f"Data saved to {data_file}")
+            compacted = store.compact()
+            print(f"Data saved to {store.data_file} ({compacted} journal events compacted)")
         except Exception as e:
             print(f"Error saving data: {e}")
-        time.sleep(300)  # Save every 5 minutes
+
+# Drop acknowledged alerts once they are older than ALERT_ACK_TTL, and rollup
+# buckets past their resolution's retention (coarser resolutions keep the data)
+def expire_alerts():
+    while True:
+        time.sleep(60)
+        try:
+            expired = store.expire_alerts()
+            if expired:
+                print(f"Expired {expired} acknowledged alerts")
+            store.prune_rollups()
+        except Exception as e:
+            print(f"Error expiring alerts: {e}")
 
 # Health check endpoint
 @app.route('/health', methods=['GET'])
@@ -152,18 +269,19 @@ def health_check():
     return jsonify({
         'status': 'ok',
         'timestamp': datetime.now().isoformat(),
-        'cameras_tracked': len(camera_status)
+        'cameras_tracked': len(store.get_status())
     })
 
 # Camera status endpoints
 @app.route('/cameras/status', methods=['GET'])
 def get_all_camera_status():
-    return jsonify(camera_status)
+    return jsonify(store.get_status())
 
 @app.route('/cameras/<camera_id>/status', methods=['GET'])
 def get_camera_status(camera_id):
-    if camera_id in camera_status:
-        return jsonify(camera_status[camera_id])
+    status = store.get_status(camera_id)
+    if status is not None:
+        return jsonify(status)
     return jsonify({'error': 'Camera not found'}), 404
 
 @app.route('/cameras/<camera_id>/status', methods=['POST'])
@@ -172,53 +290,209 @@ def update_camera_status(camera_id):
     if not data:
         return jsonify({'error': 'No data provided'}), 400
         
-    # Update camera status
-    if camera_id not in camera_status:
-        camera_status[camera_id] = {}
-    
-    camera_status[camera_id].update(data)
-    camera_status[camera_id]['last_update'] = datetime.now().isoformat()
-    
-    # Update analytics
-    if camera_id not in camera_analytics:
-        camera_analytics[camera_id] = {
-            'connection_history': [],
-            'uptime_seconds': 0,
-            'failure_count': 0
-        }
-    
-    # Record connection status changes
-    if 'connected' in data:
-        camera_analytics[camera_id]['connection_history'].append({
-            'timestamp': datetime.now().isoformat(),
-            'connected': data['connected']
-        })
-        
-        # Limit history size
-        if len(camera_analytics[camera_id]['connection_history']) > 100:
-            camera_analytics[camera_id]['connection_history'] = camera_analytics[camera_id]['connection_history'][-100:]
-            
-        # Update failure count
-        if not data['connected']:
-            camera_analytics[camera_id]['failure_count'] += 1
+    # Update camera status and analytics
+    store.update_status(camera_id, data)
+    events.publish('status', data, camera_id=camera_id)
     
     return jsonify({'success': True})
 
-# Analytics endpoints
+# Bulk status ingest: a JSON array or NDJSON (one object per line) of
+# {'camera_id': ..., <status fields>}, applied in one pass with per-item results
+MAX_BULK_STATUS = 10000
+MAX_BULK_BYTES = 16 * 1024 * 1024
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/jsonl', 'application/json-seq')
+
+class BulkTooLarge(Exception):
+    pass
+
+def read_bulk_status():
+    """
+    Parse the bulk body into a list of items (dicts, or an error string for unparseable NDJSON lines)
+    
+    The body is read at most MAX_BULK_BYTES at a time, also when it has no
+    Content-Length (chunked): a larger one raises BulkTooLarge without being
+    held in memory. NDJSON stops being read one item past MAX_BULK_STATUS.
+    """
+    if request.content_length is not None and request.content_length > MAX_BULK_BYTES:
+        raise BulkTooLarge()
+    
+    if request.mimetype in NDJSON_MIMETYPES:
+        items = []
+        remaining = MAX_BULK_BYTES
+        while len(items) <= MAX_BULK_STATUS:
+            line = request.stream.readline(remaining + 1)
+            if not line:
+                break
+            remaining -= len(line)
+            if remaining < 0:
+                raise BulkTooLarge()
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                items.append('Invalid JSON')
+        return items
+    
+    if not request.is_json:
+        return None
+    body = request.stream.read(MAX_BULK_BYTES + 1)
+    if len(body) > MAX_BULK_BYTES:
+        raise BulkTooLarge()
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return None
+    return data if isinstance(data, list) else None
+
+@app.route('/cameras/status', methods=['POST'])
+def update_camera_statuses():
+    try:
+        items = read_bulk_status()
+    except BulkTooLarge:
+        return jsonify({'error': f'Request body larger than {MAX_BULK_BYTES} bytes'}), 413
+    if items is None:
+        return jsonify({'error': 'Expected a JSON array or NDJSON of status updates'}), 400
+    if len(items) > MAX_BULK_STATUS:
+        return jsonify({'error': f'At most {MAX_BULK_STATUS} updates per request'}), 400
+    
+    results = []
+    updates = []
+    for index, item in enumerate(items):
+        if isinstance(item, str):
+            results.append({'index': index, 'success': False, 'error': item})
+            continue
+        if not isinstance(item, dict) or not isinstance(item.get('camera_id'), str) or not item['camera_id']:
+            results.append({'index': index, 'success': False, 'error': 'camera_id is required'})
+            continue
+        data = {key: value for key, value in item.items() if key != 'camera_id'}
+        if not data:
+            results.append({'index': index, 'success': False, 'error': 'No data provided'})
+            continue
+        results.append({'index': index, 'camera_id': item['camera_id'], 'success': True})
+        updates.append((item['camera_id'], data))
+    
+    if updates:
+        store.update_statuses(updates)
+        for camera_id, data in updates:
+            events.publish('status', data, camera_id=camera_id)
+    
+    return jsonify({'applied': len(updates), 'failed': len(results) - len(updates), 'results': results})
+
+# Analytics endpoints (?history=false leaves out connection_history)
 @app.route('/analytics', methods=['GET'])
 def get_analytics():
-    return jsonify(camera_analytics)
+    return jsonify(store.get_analytics(include_history=parse_bool(request.args.get('history')) is not False))
 
 @app.route('/analytics/<camera_id>', methods=['GET'])
 def get_camera_analytics(camera_id):
-    if camera_id in camera_analytics:
-        return jsonify(camera_analytics[camera_id])
+    analytics = store.get_analytics(camera_id, include_history=parse_bool(request.args.get('history')) is not False)
+    if analytics is not None:
+        return jsonify(analytics)
     return jsonify({'error': 'Camera analytics not found'}), 404
 
+# Rollups: uptime, disconnects, detections and alerts per minute, hour or day
+ROLLUP_DEFAULT_BUCKETS = {'minute': 60, 'hour': 24, 'day': 30}
+MAX_ROLLUP_BUCKETS = 10000
+
+@app.route('/analytics/<camera_id>/rollups', methods=['GET'])
+def get_camera_rollups(camera_id):
+    """?resolution=minute|hour|day&start=<ISO timestamp>&end=<ISO timestamp> (default: recent buckets)"""
+    resolution = request.args.get('resolution', 'hour')
+    if resolution not in RESOLUTIONS:
+        return jsonify({'error': f"resolution must be one of {', '.join(RESOLUTIONS)}"}), 400
+    size = RESOLUTIONS[resolution]
+    
+    try:
+        end = datetime.fromisoformat(request.args['end']).timestamp() if 'end' in request.args else time.time()
+        start = (datetime.fromisoformat(request.args['start']).timestamp() if 'start' in request.args
+                 else end - ROLLUP_DEFAULT_BUCKETS[resolution] * size)
+    except ValueError:
+        return jsonify({'error': 'start and end must be ISO timestamps'}), 400
+    if end <= start:
+        return jsonify({'error': 'end must be after start'}), 400
+    if (end - start) / size > MAX_ROLLUP_BUCKETS:
+        return jsonify({'error': f"Range too large, at most {MAX_ROLLUP_BUCKETS} {resolution} buckets"}), 400
+    
+    buckets = store.get_rollups(camera_id, resolution, start, end)
+    if buckets is None:
+        return jsonify({'error': 'Camera not found'}), 404
+    return jsonify({
+        'camera_id': camera_id,
+        'resolution': resolution,
+        'start': datetime.fromtimestamp(start).isoformat(),
+        'end': datetime.fromtimestamp(end).isoformat(),
+        'buckets': buckets
+    })
+
+# Paginated listing of incidents and alerts
+PAGE_PARAMETERS = ('limit', 'cursor', 'since', 'camera_id', 'severity', 'status', 'type', 'acknowledged')
+MAX_PAGE_SIZE = 1000
+
+def list_page(list_records, filters):
+    """
+    Answer a listing request, paginated when any query parameter is given
+    
+    Without parameters the whole list is returned, as before. With any of
+    limit, cursor (an id), since (an ISO timestamp) or a filter, the response is
+    {'items': [...], 'next_cursor': id, 'has_more': bool}; passing next_cursor
+    back as cursor returns only what was created after it.
+    """
+    if not any(name in request.args for name in PAGE_PARAMETERS):
+        return jsonify(list_records(**filters))
+    
+    try:
+        limit = min(int(request.args.get('limit', 100)), MAX_PAGE_SIZE)
+        cursor = int(request.args['cursor']) if 'cursor' in request.args else None
+    except ValueError:
+        return jsonify({'error': 'limit and cursor must be integers'}), 400
+    if limit <= 0:
+        return jsonify({'error': 'limit must be positive'}), 400
+    try:
+        since = parse_timestamp(request.args['since']) if 'since' in request.args else None
+    except ValueError:
+        return jsonify({'error': 'since must be an ISO timestamp'}), 400
+    
+    # Fetch one extra record to know whether there is another page
+    items = list_records(since_id=cursor, since=since, limit=limit + 1, **filters)
+    has_more = len(items) > limit
+    items = items[:limit]
+    
+    return jsonify({
+        'items': items,
+        'next_cursor': items[-1]['id'] if items else cursor,
+        'has_more': has_more
+    })
+
+def parse_bool(value):
+    """Parse an optional boolean query parameter"""
+    if value is None:
+        return None
+    return value.lower() in ('1', 'true', 'yes')
+
+def parse_timestamp(value):
+    """
+    Normalize an ISO timestamp parameter to the form records are stored with
+    
+    Records carry naive local datetime.now().isoformat() timestamps and are
+    compared as strings, so dates ('2025-01-01'), 'Z' and UTC offsets are
+    converted to that form first. Raises ValueError for anything else.
+    """
+    if not isinstance(value, str):
+        raise ValueError('Timestamp must be a string')
+    moment = datetime.fromisoformat(value[:-1] + '+00:00' if value.endswith('Z') else value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return moment.isoformat()
+
 # Incident reporting endpoints
 @app.route('/incidents', methods=['GET'])
 def get_incidents():
-    return jsonify(incident_reports)
+    return list_page(store.list_incidents, {
+        'camera_id': request.args.get('camera_id'),
+        'severity': request.args.get('severity'),
+        'status': request.args.get('status')
+    })
 
 @app.route('/incidents', methods=['POST'])
 def create_incident():
@@ -227,22 +501,22 @@ def create_incident():
         return jsonify({'error': 'Invalid incident data'}), 400
         
     # Create incident report
-    incident = {
-        'id': len(incident_reports) + 1,
-        'timestamp': datetime.now().isoformat(),
-        'description': data['description'],
-        'camera_id': data.get('camera_id'),
-        'severity': data.get('severity', 'medium'),
-        'status': 'open'
-    }
-    
-    incident_reports.append(incident)
+    incident = store.create_incident(
+        data['description'],
+        camera_id=data.get('camera_id'),
+        severity=data.get('severity', 'medium')
+    )
+    events.publish('incident', incident, camera_id=incident['camera_id'])
     return jsonify(incident)
 
 # Alert management endpoints
 @app.route('/alerts', methods=['GET'])
 def get_alerts():
-    return jsonify(active_alerts)
+    return list_page(store.list_alerts, {
+        'camera_id': request.args.get('camera_id'),
+        'alert_type': request.args.get('type'),
+        'acknowledged': parse_bool(request.args.get('acknowledged'))
+    })
 
 @app.route('/alerts', methods=['POST'])
 def create_alert():
@@ -251,24 +525,44 @@ def create_alert():
         return jsonify({'error': 'Invalid alert data'}), 400
         
     # Create alert
-    alert = {
-        'id': len(active_alerts) + 1,
-        'timestamp': datetime.now().isoformat(),
-        'message': data['message'],
-        'camera_id': data.get('camera_id'),
-        'type': data.get('type', 'info'),
-        'acknowledged': False
-    }
-    
-    active_alerts.append(alert)
+    alert = store.create_alert(
+        data['message'],
+        camera_id=data.get('camera_id'),
+        alert_type=data.get('type', 'info')
+    )
+    events.publish('alert', alert, camera_id=alert['camera_id'])
     return jsonify(alert)
 
+@app.route('/alerts/acknowledge', methods=['POST'])
+def acknowledge_alerts():
+    """Bulk acknowledge: {'ids': [...]}, or {'camera_id': ...} and/or {'before': timestamp}, or {'all': true}"""
+    data = request.get_json(silent=True) or {}
+    
+    if 'ids' in data:
+        if not isinstance(data['ids'], list) or not all(isinstance(i, int) for i in data['ids']):
+            return jsonify({'error': 'ids must be a list of integers'}), 400
+        acknowledged = store.acknowledge_alerts(alert_ids=data['ids'])
+    elif data.get('camera_id') or data.get('before') or data.get('all'):
+        if data.get('camera_id') is not None and not isinstance(data['camera_id'], str):
+            return jsonify({'error': 'camera_id must be a string'}), 400
+        try:
+            before = parse_timestamp(data['before']) if data.get('before') is not None else None
+        except ValueError:
+            return jsonify({'error': 'before must be an ISO timestamp'}), 400
+        acknowledged = store.acknowledge_alerts(camera_id=data.get('camera_id'), before=before)
+    else:
+        return jsonify({'error': 'Provide ids, camera_id, before or all'}), 400
+    
+    if acknowledged:
+        events.publish('acknowledge', {'alert_ids': acknowledged}, camera_id=data.get('camera_id'))
+    return jsonify({'acknowledged': acknowledged, 'count': len(acknowledged)})
+
 @app.route('/alerts/<int:alert_id>/acknowledge', methods=['POST'])
 def acknowledge_alert(alert_id):
-    for alert in active_alerts:
-        if alert['id'] == alert_id:
-            alert['acknowledged'] = True
-            return jsonify(alert)
+    alert = store.acknowledge_alert(alert_id)
+    if alert is not None:
+        events.publish('acknowledge', {'alert_ids': [alert_id]}, camera_id=alert['camera_id'])
+        return jsonify(alert)
     
     return jsonify({'error': 'Alert not found'}), 404
 
@@ -281,10 +575,66 @@ def get_detection_status():
     if detector is not None:
         detector_state = "running" if getattr(detector, 'running', False) else "not running"
     
-    return jsonify({
+    response = {
         'status': detector_state,
         'available': detector is not None
-    })
+    }
+    
+    # Batch-size and latency statistics, to tune DETECTION_MAX_BATCH / DETECTION_MAX_WAIT_MS
+    if detector is not None and hasattr(detector, 'get_batch_stats'):
+        response['batching'] = detector.get_batch_stats()
+    
+    # Size of the bounded result store and how many results it dropped
+    if detector is not None and hasattr(detector, 'get_result_stats'):
+        response['results'] = detector.get_result_stats()
+    
+    # Frames the motion gate answered without inference
+    if detector is not None and hasattr(detector, 'get_motion_stats'):
+        response['motion'] = detector.get_motion_stats()
+    
+    # Frames submitted, sampled out, dropped and processed per camera, with their latency
+    if detector is not None and hasattr(detector, 'get_scheduler_stats'):
+        response['scheduling'] = detector.get_scheduler_stats()
+    
+    # Cameras currently in alert
+    if detector is not None and hasattr(detector, 'get_alert_stats'):
+        response['alert_state'] = detector.get_alert_stats()
+    
+    # Live object tracks
+    if detector is not None and hasattr(detector, 'get_tracking_stats'):
+        response['tracking'] = detector.get_tracking_stats()
+    
+    # Inference profiles in use
+    if detector is not None and hasattr(detector, 'get_profile_stats'):
+        response['profiles'] = detector.get_profile_stats()
+    
+    # Inference worker processes, when DETECTION_WORKERS is set
+    if detector is not None and hasattr(detector, 'get_worker_stats'):
+        response['workers'] = detector.get_worker_stats()
+    
+    # Pooled frame buffers of detection requests
+    response['frame_pool'] = frame_pool.get_stats()
+    
+    return jsonify(response)
+
+@app.route('/detection/settings/<camera_id>', methods=['GET'])
+def get_detection_settings(camera_id):
+    if detector is None or not hasattr(detector, 'get_camera_settings'):
+        return jsonify({'error': 'Detector does not support per-camera settings'}), 404
+    return jsonify(detector.get_camera_settings(camera_id))
+
+@app.route('/detection/settings/<camera_id>', methods=['PUT', 'POST'])
+def update_detection_settings(camera_id):
+    """Change settings of one camera, e.g. {'motion': {'enabled': true}, 'tracking': {'enabled': true}}"""
+    if detector is None or not hasattr(detector, 'configure_camera'):
+        return jsonify({'error': 'Detector does not support per-camera settings'}), 404
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object of settings'}), 400
+    try:
+        return jsonify(detector.configure_camera(camera_id, data))
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
 
 @app.route('/detection/start', methods=['GET', 'POST'])
 def start_detection():
@@ -311,8 +661,60 @@ def stop_detection():
     
     return jsonify({'success': False, 'error': 'Detector not running'}), 400
 
+def annotate_image(image, detections_list):
+    """Draw the detection boxes on a copy of the image and return it as base64 JPEG"""
+    annotated = image.copy()
+    for detection in detections_list:
+        x1, y1, x2, y2 = [int(v) for v in detection['box']]
+        cv2.rectangle(annotated, (x1, y1), (x2, y2), (0, 0, 255), 2)
+        label = f"{detection['class']} {detection['confidence']:.2f}"
+        if detection.get('track_id') is not None:
+            label = f"#{detection['track_id']} {label}"
+        cv2.putText(annotated, label, (x1, max(0, y1 - 5)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+    
+    success, encoded = cv2.imencode('.jpg', annotated)
+    return base64.b64encode(encoded.tobytes()).decode('ascii') if success else None
+
+def read_detection_request(camera_id=None):
+    """
+    Extract (encoded image bytes, camera_id, annotate) from a detection request
+    
+    Supports raw JPEG/PNG bodies (application/octet-stream or image/*), multipart
+    uploads with an 'image' file field, and the original JSON body with a base64
+    'image'. For raw and multipart uploads camera_id comes from the URL, the
+    X-Camera-Id header or the query string / form fields. Raises ValueError if
+    the JSON image is not valid base64, and RequestEntityTooLarge if the body is
+    larger than CAMERA_API_MAX_REQUEST_BYTES.
+    """
+    mimetype = request.mimetype or ''
+    
+    if mimetype == 'application/octet-stream' or mimetype.startswith('image/'):
+        camera_id = camera_id or request.headers.get('X-Camera-Id') or request.args.get('camera_id')
+        annotate = request.args.get('annotate', '').lower() in ('1', 'true', 'yes')
+        return request.get_data(cache=False), camera_id, annotate
+    
+    if mimetype == 'multipart/form-data':
+        upload = request.files.get('image')
+        if upload is None:
+            return None, camera_id, False
+        camera_id = camera_id or request.headers.get('X-Camera-Id') or request.form.get('camera_id')
+        annotate = request.form.get('annotate', '').lower() in ('1', 'true', 'yes')
+        return upload.stream.read(), camera_id, annotate
+    
+    # Original JSON form with a base64 encoded image
+    data = request.get_json(silent=True)
+    if not data or 'image' not in data:
+        return None, camera_id, False
+    try:
+        encoded_data = base64.b64decode(data['image'], validate=True)
+    except (binascii.Error, TypeError):
+        raise ValueError('image must be a base64 encoded string')
+    return encoded_data, camera_id or data.get('camera_id'), bool(data.get('annotate'))
+
 @app.route('/detection/detect', methods=['POST'])
-def detect_objects():
+@app.route('/detection/detect/<camera_id>', methods=['POST'])
+def detect_objects(camera_id=None):
     global detector
     
     # Check if detector is initialized
@@ -321,73 +723,233 @@ def detect_objects():
         if not success:
             return jsonify({'error': 'Detector not available'}), 500
     
-    # Get image from request
-    if not request.json or 'image' not in request.json:
-        return jsonify({'error': 'No image provided'}), 400
-    
+    image = None
+    ticket = None
     try:
-        # Decode base64 image
-        encoded_data = request.json['image']
-        camera_id = request.json.get('camera_id')
+        # Get image from request
+        try:
+            encoded_data, camera_id, annotate = read_detection_request(camera_id)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except RequestEntityTooLarge as e:
+            return request_too_large(e)
+        if not encoded_data:
+            return jsonify({'error': 'No image provided'}), 400
         
-        nparr = np.frombuffer(base64.b64decode(encoded_data), np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        # Decode into a pooled frame buffer, given back below once the detector is done with it
+        image = frame_pool.decode(encoded_data)
         
         if image is None:
             return jsonify({'error': 'Invalid image data'}), 400
         
         # Process the frame
-        detector.process_frame(image)
-        
-        # Get detection result
-        result = detector.get_latest_result()
-        
-        # Check for notifications
-        notification = detector.get_notification()
+        ticket = detector.process_frame(image, camera_id)
         
-        # If weapons detected, create an alert
-        if result and result.get('weapons_detected'):
-            alert_message = notification['message'] if notification and 'message' in notification else "Arma detectada!"
+        if hasattr(ticket, 'result'):
+            # Threaded detector: wait for the result of this exact frame
+            try:
+                result = ticket.result(timeout=detection_timeout)
+            except concurrent.futures.TimeoutError:
+                return jsonify({'error': 'Detection timed out'}), 504
             
-            # Create alert
-            alert = {
-                'id': len(active_alerts) + 1,
-                'timestamp': datetime.now().isoformat(),
-                'message': alert_message,
-                'camera_id': camera_id,
-                'type': 'danger',
-                'acknowledged': False
-            }
-            active_alerts.append(alert)
+            if result is None:
+                return jsonify({'error': 'Frame dropped, detector overloaded'}), 503
+            
+            # Notification raised by this frame, if any
+            notification = result.get('notification')
+        elif ticket:
+            # Synchronous detector: the latest result is the one of this frame
+            result = detector.get_latest_result()
+            notification = detector.get_notification()
+        else:
+            return jsonify({'error': 'Detector busy, frame not queued'}), 503
         
-        # Format detections for JSON response
-        detections_list = []
-        if result and 'detections' in result:
-            for detection in result['detections']:
-                if isinstance(detection, tuple) and len(detection) >= 3:
-                    class_name, confidence, box = detection
-                    detections_list.append({
-                        'class': class_name,
-                        'confidence': confidence,
-                        'box': box
-                    })
-                else:
-                    # Handle alternative formats
-                    detections_list.append(detection)
+        response = handle_detection_result(camera_id, result, notification)
         
-        return jsonify({
-            'weapons_detected': result.get('weapons_detected', False) if result else False,
-            'alert_triggered': result.get('alert_triggered', False) if result else False,
-            'detections': detections_list,
-            'notification': notification is not None,
-            'message': notification['message'] if notification else None
-        })
+        # Annotated output is opt-in, so frames are never kept unless asked for
+        if annotate:
+            response['annotated_image'] = annotate_image(image, response['detections'])
+        
+        return jsonify(response)
     
     except Exception as e:
         print(f"Error processing detection: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
+    finally:
+        if image is not None:
+            release_frame(image, ticket)
+
+def handle_detection_result(camera_id, result, notification, alert_every_frame=True):
+    """
+    Raise the alert of an answered frame and publish it as a 'detection' event
+    
+    Shared by /detection/detect and the stream readers; returns the response body.
+    Without tracking, every frame with a weapon raises an alert unless
+    alert_every_frame is off: then only frames with a notification do (the
+    camera's alert threshold was reached and its cooldown is over).
+    """
+    # If weapons detected, create an alert (with tracking, only once per tracked weapon). Sampled
+    # out and motion skipped frames repeat the camera's last result, already counted and alerted.
+    tracked = result is not None and 'track_ids' in result
+    replayed = result is not None and (result.get('sampled_out') or result.get('motion_skipped'))
+    if result and result.get('weapons_detected') and not replayed:
+        # Every inferred frame with a weapon counts in the detection rollups, alert or not
+        if camera_id is not None:
+            store.record_detection(camera_id)
+        
+        if notification is not None or (alert_every_frame and not tracked):
+            alert_message = notification['message'] if notification and 'message' in notification else "Arma detectada!"
+            
+            # Create alert
+            alert = store.create_alert(alert_message, camera_id=camera_id, alert_type='danger')
+            events.publish('alert', alert, camera_id=camera_id)
+    
+    # Format detections for JSON response
+    detections_list = []
+    if result and 'detections' in result:
+        track_ids = result.get('track_ids')
+        for index, detection in enumerate(result['detections']):
+            if isinstance(detection, tuple) and len(detection) >= 3:
+                class_name, confidence, box = detection
+                detections_list.append({
+                    'class': class_name,
+                    'confidence': confidence,
+                    'box': box
+                })
+                if track_ids is not None:
+                    detections_list[-1]['track_id'] = track_ids[index]
+            else:
+                # Handle alternative formats
+                detections_list.append(detection)
+    
+    response = {
+        'weapons_detected': result.get('weapons_detected', False) if result else False,
+        'alert_triggered': result.get('alert_triggered', False) if result else False,
+        'detections': detections_list,
+        'notification': notification is not None,
+        'message': notification['message'] if notification else None,
+        'motion_skipped': result.get('motion_skipped', False) if result else False,
+        'sampled_out': result.get('sampled_out', False) if result else False,
+        'profile': result.get('profile') if result else None
+    }
+    if tracked:
+        response['tracks'] = result['tracks']
+    events.publish('detection', dict(response), camera_id=camera_id)
+    return response
+
+def release_frame(frame, ticket):
+    """Give a decoded frame back to the pool, or once the detector resolves its ticket if it still holds it"""
+    if hasattr(ticket, 'add_done_callback') and not ticket.done():
+        # Timed out: the frame is still queued or in inference
+        ticket.add_done_callback(lambda _: frame_pool.release(frame))
+    else:
+        frame_pool.release(frame)
+
+# Stream ingestion: the server reads registered RTSP/HTTP MJPEG streams (or, with
+# STREAM_ALLOW_FILES, a local video file) itself, instead of clients posting every frame to /detection/detect
+def handle_stream_result(camera_id, result, notification):
+    """Streams answer many frames per second: they alert through the camera's alert state, never per frame"""
+    handle_detection_result(camera_id, result, notification, alert_every_frame=False)
+
+def record_stream_status(camera_id, data):
+    """Connect/disconnect transitions of a stream reader update the camera's status and analytics"""
+    store.update_status(camera_id, data)
+    events.publish('status', data, camera_id=camera_id)
+
+streams = StreamIngest(lambda: detector, handle_stream_result, record_stream_status, frame_pool=frame_pool,
+                       reconnect_delay=stream_reconnect_delay, max_reconnect_delay=stream_max_reconnect_delay,
+                       read_timeout=stream_read_timeout, allow_files=stream_allow_files)
+
+@app.route('/cameras/streams', methods=['GET'])
+def list_streams():
+    return jsonify(streams.get_stats())
+
+@app.route('/cameras/<camera_id>/stream', methods=['GET'])
+def get_stream(camera_id):
+    stats = streams.get_stats(camera_id)
+    if stats is not None:
+        return jsonify(stats)
+    return jsonify({'error': 'Stream not found'}), 404
+
+@app.route('/cameras/<camera_id>/stream', methods=['PUT', 'POST'])
+def register_stream(camera_id):
+    """Read a camera's stream in the server: {'url': 'rtsp://...', 'max_fps': optional}"""
+    data = request.get_json(silent=True) or {}
+    url = data.get('url')
+    if not isinstance(url, str) or not url:
+        return jsonify({'error': 'url is required'}), 400
+    try:
+        max_fps = float(data.get('max_fps', stream_max_fps))
+        if max_fps < 0:
+            raise ValueError
+    except (TypeError, ValueError):
+        return jsonify({'error': 'max_fps must be a non-negative number'}), 400
+    try:
+        streams.check_url(url)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if detector is None and not initialize_detector():
+        return jsonify({'error': 'Detector not available'}), 500
+    
+    return jsonify(streams.register(camera_id, url, max_fps))
+
+@app.route('/cameras/<camera_id>/stream', methods=['DELETE'])
+def unregister_stream(camera_id):
+    if streams.unregister(camera_id):
+        return jsonify({'success': True})
+    return jsonify({'error': 'Stream not found'}), 404
+
+# Event stream
+EVENT_TYPES = ('alert', 'acknowledge', 'status', 'incident', 'detection')
+
+@app.route('/events', methods=['GET'])
+def stream_events():
+    """
+    Server-sent events: alerts, acknowledgements, status changes, incidents and detections
+    
+    Optional query parameters: camera_id (comma separated) and types (comma
+    separated, from EVENT_TYPES). A reconnecting client sends the Last-Event-ID
+    header (browsers' EventSource do it automatically) or ?last_event_id= and
+    receives the events it missed, or a 'gap' event if they are no longer kept.
+    """
+    camera_ids = [c for c in request.args.get('camera_id', '').split(',') if c]
+    types = [t for t in request.args.get('types', '').split(',') if t]
+    if any(t not in EVENT_TYPES for t in types):
+        return jsonify({'error': f"types must be among {', '.join(EVENT_TYPES)}"}), 400
+    
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({'error': 'Last-Event-ID must be an integer'}), 400
+    
+    if events.subscriber_count() >= event_max_subscribers:
+        return jsonify({'error': 'Too many event subscribers'}), 503
+    
+    subscription = events.subscribe(camera_ids, types, last_event_id)
+    
+    def generate():
+        try:
+            # Tell EventSource clients how long to wait before reconnecting
+            yield "retry: 2000\n\n"
+            while not subscription.overflowed:
+                event = subscription.get(timeout=event_heartbeat)
+                if event is not None:
+                    yield format_sse(event)
+                else:
+                    # Comment line, keeps proxies from closing an idle connection
+                    yield ": heartbeat\n\n"
+            # Too slow to keep up: end the stream, the client reconnects and resumes from its last id
+        finally:
+            events.unsubscribe(subscription)
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @app.route('/detection/diagnostics', methods=['GET'])
 def detector_diagnostics():
@@ -423,16 +985,40 @@ def detector_diagnostics():
         "current_directory": os.getcwd()
     })
 
+def run_server(host='0.0.0.0', server_port=None):
+    """Serve the app in the configured mode (CAMERA_API_SERVER)"""
+    server_port = server_port or port
+    
+    if server_mode == 'dev':
+        print("Using Flask development server (debug mode, not for production traffic)")
+        app.run(host=host, port=server_port, debug=True)
+        return
+    
+    try:
+        from waitress import serve
+    except ImportError:
+        print("waitress not found (pip install waitress). Falling back to Flask's threaded server without debug mode")
+        app.run(host=host, port=server_port, debug=False, threaded=True, use_reloader=False)
+        return
+    
+    print(f"Using waitress with {server_threads} threads, connection limit {server_connection_limit}")
+    # send_bytes=1 flushes every write straight away, so streamed events are not
+    # held back in waitress' output buffer
+    serve(app, host=host, port=server_port, threads=server_threads,
+          connection_limit=server_connection_limit, send_bytes=1, ident='camera-api')
+
 if __name__ == '__main__':
     # Load existing data
-    loaded_analytics, loaded_incidents = load_data()
-    camera_analytics = loaded_analytics
-    incident_reports = loaded_incidents
+    load_data()
     
     # Start data saving thread
     save_thread = threading.Thread(target=save_data, daemon=True)
     save_thread.start()
     
+    # Start acknowledged alert expiry thread
+    expiry_thread = threading.Thread(target=expire_alerts, daemon=True)
+    expiry_thread.start()
+    
     # Initialize weapon detector with better error handling
     print("Initializing weapon detector...")
     detector_initialized = initialize_detector()
@@ -454,6 +1040,8 @@ if __name__ == '__main__':
         print("Detector not properly initialized")
     
     try:
-        app.run(host='0.0.0.0', port=port, debug=True)
+        run_server()
     except Exception as e:
-        print(f"Error starting server: {e}")
\ No newline at end of file
+        print(f"Error starting server: {e}")
+    finally:
+        streams.stop()
\ No newline at end of file
@@ -0,0 +1,831 @@
+import os
+import json
+import bisect
+import shutil
+import time
+import threading
+from array import array
+from collections import deque
+from contextlib import ExitStack, nullcontext
+from datetime import datetime, timedelta
+
+from rollups import CameraRollup, DEFAULT_RETENTION, DETECTIONS, ALERTS
+
+
+class RecordIndex:
+    """
+    Secondary indexes over records with increasing ids (incidents, alerts)
+
+    For every indexed field, the ids of the records with each value are kept in
+    ascending order, so a filtered query starts at the cursor with a bisect and
+    only walks the smallest matching list instead of rescanning every record.
+    """
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.by_id = {}
+        self.ids = []
+        self.timestamps = []
+        self.postings = {field: {} for field in fields}
+
+    def add(self, record):
+        record_id = record['id']
+        if record_id in self.by_id:
+            self.remove(self.by_id[record_id])
+        self.by_id[record_id] = record
+        position = bisect.bisect_right(self.ids, record_id)
+        self.ids.insert(position, record_id)
+        self.timestamps.insert(position, record['timestamp'])
+        for field in self.fields:
+            bisect.insort(self.postings[field].setdefault(record[field], []), record_id)
+
+    def remove(self, record):
+        record_id = record['id']
+        if self.by_id.pop(record_id, None) is None:
+            return
+        position = bisect.bisect_left(self.ids, record_id)
+        del self.ids[position]
+        del self.timestamps[position]
+        for field in self.fields:
+            self._discard(field, record[field], record_id)
+
+    def replace(self, record, new_record):
+        """Swap a record for an updated copy with the same id, moving it between posting lists"""
+        record_id = record['id']
+        self.by_id[record_id] = new_record
+        for field in self.fields:
+            if new_record[field] != record[field]:
+                self._discard(field, record[field], record_id)
+                bisect.insort(self.postings[field].setdefault(new_record[field], []), record_id)
+
+    def _discard(self, field, value, record_id):
+        ids = self.postings[field].get(value)
+        if not ids:
+            return
+        position = bisect.bisect_left(ids, record_id)
+        if position < len(ids) and ids[position] == record_id:
+            del ids[position]
+        if not ids:
+            del self.postings[field][value]
+
+    def get(self, record_id):
+        return self.by_id.get(record_id)
+
+    def records(self):
+        """All records in id order"""
+        return [self.by_id[record_id] for record_id in self.ids]
+
+    def last_id(self):
+        return self.ids[-1] if self.ids else 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def query(self, filters=None, since_id=None, since=None, limit=None, before=None):
+        """
+        Records matching all filters (field -> value, None means any), in id order
+
+        since_id only returns records with a greater id (a cursor), since only
+        records with a later timestamp and before only records with an earlier one.
+        """
+        filters = {field: value for field, value in (filters or {}).items() if value is not None}
+
+        # Walk the shortest candidate list and check the other filters on each record
+        candidates = self.ids
+        for field, value in filters.items():
+            ids = self.postings[field].get(value, [])
+            if len(ids) < len(candidates):
+                candidates = ids
+
+        if since is not None:
+            # Timestamps grow with ids, so a timestamp bound is an id bound
+            position = bisect.bisect_right(self.timestamps, since)
+            if position == len(self.ids):
+                return []
+            first_id = self.ids[position]
+            if since_id is None or since_id < first_id - 1:
+                since_id = first_id - 1
+
+        start = bisect.bisect_right(candidates, since_id) if since_id is not None else 0
+        records = []
+        for record_id in _iter_from(candidates, start):
+            record = self.by_id[record_id]
+            if before is not None and record['timestamp'] >= before:
+                break
+            if all(record[field] == value for field, value in filters.items()):
+                records.append(record)
+                if limit is not None and len(records) >= limit:
+                    break
+        return records
+
+
+def _iter_from(items, start):
+    """Iterate items from start without copying the list"""
+    for position in range(start, len(items)):
+        yield items[position]
+
+
+class ConnectionHistory:
+    """
+    Connection reports of one camera in a fixed-capacity ring buffer
+
+    Timestamps (epoch seconds) and connected bits live in preallocated arrays,
+    so recording a report never allocates or shifts a list. Uptime, downtime,
+    failures and transitions are updated on every state change, so the
+    statistics cost the same however long the camera has been reporting.
+    """
+
+    def __init__(self, capacity=100):
+        if capacity < 1:
+            raise ValueError(f"Connection history capacity must be at least 1, got {capacity}")
+        self.capacity = capacity
+        self.timestamps = array('d', bytes(8 * capacity))
+        self.states = bytearray(capacity)
+        self.start = 0
+        self.count = 0
+
+        # Current state, since when, and totals of the intervals already closed
+        self.connected = None
+        self.state_since = None
+        self.first_seen = None
+        self.uptime_seconds = 0.0
+        self.downtime_seconds = 0.0
+        self.failure_count = 0
+        self.transitions = 0
+
+    def _append(self, timestamp, connected):
+        position = (self.start + self.count) % self.capacity
+        self.timestamps[position] = timestamp
+        self.states[position] = 1 if connected else 0
+        if self.count < self.capacity:
+            self.count += 1
+        else:
+            self.start = (self.start + 1) % self.capacity
+
+    def record(self, timestamp, connected):
+        """Add a report (epoch seconds) and update the statistics if the state changed"""
+        connected = bool(connected)
+        self._append(timestamp, connected)
+        if self.first_seen is None:
+            self.first_seen = timestamp
+
+        if self.connected is None:
+            if not connected:
+                self.failure_count += 1
+        elif connected != self.connected:
+            elapsed = max(0.0, timestamp - self.state_since)
+            if self.connected:
+                self.uptime_seconds += elapsed
+            else:
+                self.downtime_seconds += elapsed
+            self.transitions += 1
+            if not connected:
+                self.failure_count += 1
+        else:
+            return
+        self.connected = connected
+        self.state_since = timestamp
+
+    def entries(self):
+        """Reports from oldest to newest, in the connection_history format"""
+        return [{
+            'timestamp': datetime.fromtimestamp(self.timestamps[position]).isoformat(),
+            'connected': bool(self.states[position])
+        } for position in ((self.start + i) % self.capacity for i in range(self.count))]
+
+    def summary(self, now=None, include_history=True):
+        """Analytics as served by the API, counting the current state up to now"""
+        now = time.time() if now is None else now
+        uptime, downtime = self.uptime_seconds, self.downtime_seconds
+        if self.connected is not None:
+            elapsed = max(0.0, now - self.state_since)
+            if self.connected:
+                uptime += elapsed
+            else:
+                downtime += elapsed
+        observed = uptime + downtime
+
+        analytics = {
+            'connected': self.connected,
+            'state_since': _isoformat(self.state_since),
+            'uptime_seconds': uptime,
+            'downtime_seconds': downtime,
+            'uptime_percent': 100.0 * uptime / observed if observed else None,
+            'failure_count': self.failure_count,
+            'transitions': self.transitions,
+            # Mean time between failures: time connected per disconnection
+            'mtbf_seconds': uptime / self.failure_count if self.failure_count else None,
+            'flap_rate_per_hour': self.transitions * 3600.0 / observed if observed else 0.0
+        }
+        if include_history:
+            analytics['connection_history'] = self.entries()
+        return analytics
+
+    def to_dict(self):
+        """Persistent form: the history plus the totals of closed intervals"""
+        return {
+            'connection_history': self.entries(),
+            'connected': self.connected,
+            'state_since': _isoformat(self.state_since),
+            'first_seen': _isoformat(self.first_seen),
+            'uptime_seconds': self.uptime_seconds,
+            'downtime_seconds': self.downtime_seconds,
+            'failure_count': self.failure_count,
+            'transitions': self.transitions
+        }
+
+    @classmethod
+    def from_dict(cls, data, capacity=100):
+        """Restore from to_dict() output or from the old analytics format (history and failure_count)"""
+        history = cls(capacity)
+        entries = data.get('connection_history', [])
+        for entry in entries[-capacity:]:
+            history._append(_epoch(entry['timestamp']), entry['connected'])
+
+        history.uptime_seconds = data.get('uptime_seconds', 0.0)
+        history.downtime_seconds = data.get('downtime_seconds', 0.0)
+        history.failure_count = data.get('failure_count', 0)
+        history.transitions = data.get('transitions', 0)
+        if entries:
+            # The old format has no state fields: the last report is the current state
+            history.connected = data.get('connected', bool(entries[-1]['connected']))
+            history.state_since = _epoch(data.get('state_since') or entries[-1]['timestamp'])
+            history.first_seen = _epoch(data.get('first_seen') or entries[0]['timestamp'])
+        elif data.get('state_since'):
+            history.connected = data.get('connected')
+            history.state_since = _epoch(data['state_since'])
+            history.first_seen = _epoch(data.get('first_seen') or data['state_since'])
+        return history
+
+
+def _advance(watermarks, key, seq):
+    """Move a sequence watermark forward, False if seq was already applied"""
+    if seq is None:
+        return True
+    if seq <= watermarks.get(key, 0):
+        return False
+    watermarks[key] = seq
+    return True
+
+
+def _epoch(timestamp):
+    return datetime.fromisoformat(timestamp).timestamp()
+
+
+def _isoformat(epoch):
+    return datetime.fromtimestamp(epoch).isoformat() if epoch is not None else None
+
+
+class CameraStore:
+    """
+    In-memory camera status, analytics, incidents and alerts
+
+    Every change is appended to a journal (one JSON event per line) before it is
+    applied, and compact() periodically folds the journal into a snapshot written
+    with an atomic rename. load() replays the snapshot and then the journal, so a
+    crash loses at most the event being written.
+
+    Records are copy-on-write: a camera's status dict, incidents and alerts are
+    replaced by updated copies and never modified once published, so readers use
+    them without locks and serialize them while writers go on. Writers take a
+    lock per camera (status and connection history) or the records lock
+    (incidents and alerts); journal appends are serialized by their own short lock. Events carry
+    a sequence number, and the snapshot remembers the last one applied to each
+    camera and to the records, so it can be taken piece by piece and replaying
+    the journal on top of it skips what it already contains.
+    """
+
+    def __init__(self, data_file, journal_file=None, fsync=False, alert_ack_ttl=3600, history_size=100,
+                 rollup_retention=None):
+        """
+        Args:
+            data_file: Snapshot file (the old camera_analytics.json format)
+            journal_file: Append-only journal, defaults to data_file + '.journal'
+            fsync: fsync the journal after every event (survives power loss, slower)
+            alert_ack_ttl: Seconds an acknowledged alert stays listed (0 keeps them forever)
+            history_size: Connection reports kept per camera (at least 1)
+            rollup_retention: Seconds kept per rollup resolution ('minute', 'hour', 'day')
+        """
+        # Checked here so a bad CAMERA_HISTORY_SIZE fails at startup, not on the first report
+        if history_size < 1:
+            raise ValueError(f"history_size must be at least 1, got {history_size}")
+        self.data_file = data_file
+        self.journal_file = journal_file or data_file + '.journal'
+        self.fsync = fsync
+        self.alert_ack_ttl = alert_ack_ttl
+        self.history_size = history_size
+        self.rollup_retention = dict(DEFAULT_RETENTION, **(rollup_retention or {}))
+
+        # Status dicts are copy-on-write; each ConnectionHistory and CameraRollup is
+        # changed under its camera's lock
+        self.camera_status = {}
+        self.camera_analytics = {}
+        self.camera_rollups = {}
+        self.track_rollup_changes = False
+
+        # Incidents and alerts are stored by id, with secondary indexes for filtering
+        self.incident_index = RecordIndex(('camera_id', 'severity', 'status'))
+        self.alert_index = RecordIndex(('camera_id', 'type', 'acknowledged'))
+        self.next_incident_id = 1
+        self.next_alert_id = 1
+
+        # Acknowledged alert ids in acknowledgement order, for expiry
+        self.acknowledged_alerts = deque()
+
+        # Records lock (incidents and alerts) and one lock per camera for everything
+        # that updates the camera's state. Always taken camera -> records -> journal.
+        self.lock = threading.RLock()
+        self.camera_locks = {}
+
+        self.journal = None
+        self.journal_events = 0
+        self.journal_lock = threading.Lock()
+        self.compaction_lock = threading.Lock()
+
+        # Last journal sequence number written, and applied to each camera (status and
+        # rollups, from status, alert and detection events) and to the records
+        self.journal_seq = 0
+        self.camera_seq = {}
+        self.records_seq = 0
+
+    @property
+    def rotated_journal_file(self):
+        """Journal being folded into a snapshot by a running (or interrupted) compaction"""
+        return self.journal_file + '.compacting'
+
+    def _camera_lock(self, camera_id):
+        lock = self.camera_locks.get(camera_id)
+        if lock is None:
+            lock = self.camera_locks.setdefault(camera_id, threading.Lock())
+        return lock
+
+    def _camera_context(self, camera_id):
+        """The camera's lock, or nothing for events not tied to a camera"""
+        return self._camera_lock(camera_id) if camera_id is not None else nullcontext()
+
+    def _rollup(self, camera_id):
+        rollup = self.camera_rollups.get(camera_id)
+        if rollup is None:
+            rollup = self.camera_rollups[camera_id] = CameraRollup(self.track_rollup_changes)
+        return rollup
+
+    # Persistence
+
+    def load(self):
+        """Load the snapshot, replay the journal on top of it and open the journal for appending"""
+        with self.lock, self.journal_lock:
+            try:
+                if os.path.exists(self.data_file):
+                    with open(self.data_file, 'r') as f:
+                        data = json.load(f)
+                    self.camera_analytics = {
+                        camera_id: ConnectionHistory.from_dict(analytics, self.history_size)
+                        for camera_id, analytics in data.get('analytics', {}).items()
+                    }
+                    self.camera_rollups = {
+                        camera_id: CameraRollup.from_dict(rollup)
+                        for camera_id, rollup in data.get('rollups', {}).items()
+                    }
+                    self.camera_status = data.get('status', {})
+                    self._rebuild_indexes(data.get('incidents', []), data.get('alerts', []))
+                    # Snapshots written before sequence numbers existed contain no journal events
+                    journal_seq = data.get('journal_seq', {})
+                    self.camera_seq = journal_seq.get('cameras', {})
+                    self.records_seq = journal_seq.get('records', 0)
+                    self.journal_seq = max([self.records_seq] + list(self.camera_seq.values()))
+            except Exception as e:
+                print(f"Error loading data: {e}")
+
+            # A compaction interrupted by a crash leaves its journal behind; it comes first
+            replayed = 0
+            for journal_file in (self.rotated_journal_file, self.journal_file):
+                replayed += self._replay_journal(journal_file)
+            if replayed:
+                print(f"Replayed {replayed} journal events from {self.journal_file}")
+
+            self.journal = open(self.journal_file, 'a', encoding='utf-8')
+            self.journal_events = replayed
+
+    def _rebuild_indexes(self, incidents, alerts):
+        self.incident_index = RecordIndex(self.incident_index.fields)
+        for incident in incidents:
+            self._add_incident(incident)
+        self.alert_index = RecordIndex(self.alert_index.fields)
+        self.acknowledged_alerts = deque()
+        for alert in alerts:
+            self._add_alert(alert)
+        for alert in sorted((a for a in alerts if a['acknowledged']), key=lambda a: a.get('acknowledged_at') or ''):
+            self.acknowledged_alerts.append(alert['id'])
+
+    def _replay_journal(self, journal_file):
+        """
+        Apply every event of a journal that is not in the snapshot yet, skipping a torn last line
+
+        The torn line is cut off the file (and a last event missing only its
+        newline gets one), so events appended after recovery start on a line of
+        their own instead of being glued to the fragment.
+        """
+        if not os.path.exists(journal_file):
+            return 0
+
+        replayed = 0
+        offset = 0
+        valid_end = 0
+        needs_newline = False
+        with open(journal_file, 'rb') as f:
+            for line_number, line in enumerate(f, 1):
+                offset += len(line)
+                if line.strip():
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        print(f"Skipping corrupt journal line {line_number} in {journal_file}")
+                        continue
+                    self._apply(event)
+                    self.journal_seq = max(self.journal_seq, event.get('seq', 0))
+                    replayed += 1
+                valid_end = offset
+                needs_newline = not line.endswith(b'\n')
+
+        if valid_end < offset:
+            print(f"Truncating {offset - valid_end} bytes of torn journal tail in {journal_file}")
+            with open(journal_file, 'r+b') as f:
+                f.truncate(valid_end)
+        elif needs_newline:
+            with open(journal_file, 'ab') as f:
+                f.write(b'\n')
+        return replayed
+
+    def snapshot(self):
+        """
+        Return the whole state as a JSON-serializable dict
+
+        Each camera is copied under its own lock and the records under the
+        records lock, so writers are only held up for the time of a copy.
+        """
+        status, analytics, rollups, camera_seq = self._camera_snapshot()
+        with self.lock:
+            incidents = self.incident_index.records()
+            alerts = self.alert_index.records()
+            records_seq = self.records_seq
+        return {
+            'analytics': analytics,
+            'incidents': incidents,
+            'alerts': alerts,
+            'status': status,
+            'rollups': rollups,
+            'journal_seq': {'cameras': camera_seq, 'records': records_seq}
+        }
+
+    def _camera_snapshot(self):
+        """Status, persistent analytics, rollups and last applied sequence number of every camera"""
+        status, analytics, rollups, camera_seq = {}, {}, {}, {}
+        for camera_id in set(self.camera_status) | set(self.camera_rollups):
+            with self._camera_lock(camera_id):
+                if camera_id in self.camera_status:
+                    status[camera_id] = self.camera_status[camera_id]
+                if camera_id in self.camera_analytics:
+                    analytics[camera_id] = self.camera_analytics[camera_id].to_dict()
+                if camera_id in self.camera_rollups:
+                    rollups[camera_id] = self.camera_rollups[camera_id].to_dict()
+                camera_seq[camera_id] = self.camera_seq.get(camera_id, 0)
+        return status, analytics, rollups, camera_seq
+
+    def compact(self):
+        """
+        Write a snapshot atomically and drop the journal it now contains
+
+        The journal is first set aside so new events go to a fresh one; the
+        snapshot is then taken and serialized without holding any store lock.
+        """
+        with self.compaction_lock:
+            compacted = self._rotate_journal()
+            snapshot_text = json.dumps(self.snapshot())
+
+            temp_file = self.data_file + '.tmp'
+            with open(temp_file, 'w') as f:
+                f.write(snapshot_text)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_file, self.data_file)
+
+            # Everything in the rotated journal is now part of the snapshot
+            if os.path.exists(self.rotated_journal_file):
+                os.remove(self.rotated_journal_file)
+            return compacted
+
+    def _rotate_journal(self):
+        """Move the journal aside (after the one a failed compaction left) and start a new one"""
+        with self.journal_lock:
+            if self.journal is not None:
+                self.journal.close()
+            if os.path.exists(self.journal_file):
+                if os.path.exists(self.rotated_journal_file):
+                    with open(self.rotated_journal_file, 'ab') as rotated, open(self.journal_file, 'rb') as f:
+                        shutil.copyfileobj(f, rotated)
+                    os.remove(self.journal_file)
+                else:
+                    os.replace(self.journal_file, self.rotated_journal_file)
+            self.journal = open(self.journal_file, 'a', encoding='utf-8')
+            compacted = self.journal_events
+            self.journal_events = 0
+            return compacted
+
+    def close(self):
+        with self.journal_lock:
+            if self.journal is not None:
+                self.journal.close()
+                self.journal = None
+
+    def _record(self, event):
+        """
+        Append an event to the journal and apply it to the in-memory state
+
+        The caller holds the lock of what the event changes (the camera's lock
+        or the records lock), so events are applied in journal order.
+        """
+        return self._record_many([event])[0]
+
+    def _record_many(self, events):
+        """Append events to the journal with a single write (and fsync), then apply them"""
+        with self.journal_lock:
+            for event in events:
+                self.journal_seq += 1
+                event['seq'] = self.journal_seq
+            if self.journal is not None:
+                self.journal.write(''.join(json.dumps(event) + '\n' for event in events))
+                self.journal.flush()
+                if self.fsync:
+                    os.fsync(self.journal.fileno())
+                self.journal_events += len(events)
+        return [self._apply(event) for event in events]
+
+    def _apply(self, event):
+        event_type = event.get('type')
+        seq = event.get('seq')
+
+        # Skip what the snapshot already contains (journals without seq predate it):
+        # the camera part of an event and its records part are checked separately
+        if event_type in ('status', 'detection'):
+            camera_id = event['camera_id']
+        elif event_type == 'alert':
+            camera_id = event['alert']['camera_id']
+        else:
+            camera_id = None
+        camera_part = camera_id is not None and _advance(self.camera_seq, camera_id, seq)
+        records_part = event_type not in ('status', 'detection') and (seq is None or seq > self.records_seq)
+        if records_part and seq is not None:
+            self.records_seq = seq
+
+        if event_type == 'status':
+            return self._apply_status(camera_id, event['data'], event['timestamp']) if camera_part else None
+        if event_type == 'detection':
+            if camera_part:
+                self._rollup(camera_id).record_count(_epoch(event['timestamp']), DETECTIONS)
+            return None
+        if event_type == 'alert':
+            if camera_part:
+                self._rollup(camera_id).record_count(_epoch(event['alert']['timestamp']), ALERTS)
+            return self._add_alert(event['alert']) if records_part else None
+
+        if not records_part:
+            return None
+        if event_type == 'incident':
+            return self._add_incident(event['incident'])
+        if event_type == 'acknowledge':
+            # Older journals acknowledged a single alert_id
+            alert_ids = event.get('alert_ids', [event.get('alert_id')])
+            return self._apply_acknowledge(alert_ids, event.get('acknowledged_at'))
+        if event_type == 'expire':
+            return self._apply_expire(event['alert_ids'])
+        print(f"Ignoring unknown journal event type: {event_type}")
+        return None
+
+    # Camera status and analytics
+
+    def update_status(self, camera_id, data):
+        """Record a status update of a camera"""
+        with self._camera_lock(camera_id):
+            return self._record({
+                'type': 'status',
+                'camera_id': camera_id,
+                'data': data,
+                'timestamp': datetime.now().isoformat()
+            })
+
+    def update_statuses(self, updates):
+        """Record several status updates, a list of (camera_id, data), returning the new statuses"""
+        timestamp = datetime.now().isoformat()
+        with self._camera_locks(camera_id for camera_id, _ in updates):
+            return self._record_many([{
+                'type': 'status',
+                'camera_id': camera_id,
+                'data': data,
+                'timestamp': timestamp
+            } for camera_id, data in updates])
+
+    def _camera_locks(self, camera_ids):
+        """Hold the locks of several cameras, taken in sorted order so concurrent callers cannot deadlock"""
+        stack = ExitStack()
+        for camera_id in sorted(set(camera_ids)):
+            stack.enter_context(self._camera_lock(camera_id))
+        return stack
+
+    def _apply_status(self, camera_id, data, timestamp):
+        # Build an updated copy and swap it in, readers keep the previous one
+        status = dict(self.camera_status.get(camera_id, {}))
+        status.update(data)
+        status['last_update'] = timestamp
+
+        # Update analytics
+        history = self.camera_analytics.get(camera_id)
+        if history is None:
+            history = self.camera_analytics[camera_id] = ConnectionHistory(self.history_size)
+
+        # Record connection status changes
+        if 'connected' in data:
+            history.record(_epoch(timestamp), data['connected'])
+            self._rollup(camera_id).record_status(_epoch(timestamp), data['connected'], self.rollup_retention)
+
+        self.camera_status[camera_id] = status
+        return status
+
+    def get_status(self, camera_id=None):
+        """Status of one camera (None if unknown), or of all cameras"""
+        if camera_id is None:
+            return dict(self.camera_status)
+        return self.camera_status.get(camera_id)
+
+    def get_analytics(self, camera_id=None, include_history=True):
+        """Analytics of one camera (None if unknown), or of all cameras"""
+        if camera_id is None:
+            return {camera_id: self.get_analytics(camera_id, include_history)
+                    for camera_id in list(self.camera_analytics)}
+        history = self.camera_analytics.get(camera_id)
+        if history is None:
+            return None
+        with self._camera_lock(camera_id):
+            return history.summary(include_history=include_history)
+
+    # Rollups
+
+    def record_detection(self, camera_id):
+        """Count a frame in which weapons were detected"""
+        with self._camera_lock(camera_id):
+            self._record({
+                'type': 'detection',
+                'camera_id': camera_id,
+                'timestamp': datetime.now().isoformat()
+            })
+
+    def get_rollups(self, camera_id, resolution, start, end, now=None):
+        """Rollup buckets of a camera between two epoch times (None if the camera is unknown)"""
+        rollup = self.camera_rollups.get(camera_id)
+        if rollup is None:
+            return None
+        with self._camera_lock(camera_id):
+            return rollup.query(resolution, start, end, time.time() if now is None else now)
+
+    def prune_rollups(self, now=None):
+        """Drop rollup buckets past their retention, returning how many"""
+        now = time.time() if now is None else now
+        pruned = 0
+        for camera_id, rollup in list(self.camera_rollups.items()):
+            with self._camera_lock(camera_id):
+                pruned += rollup.prune(now, self.rollup_retention)
+        return pruned
+
+    # Incidents
+
+    def list_incidents(self, camera_id=None, severity=None, status=None, since_id=None, since=None, limit=None):
+        """Incidents in creation order, optionally filtered and after a cursor (id or timestamp)"""
+        with self.lock:
+            return self.incident_index.query(
+                {'camera_id': camera_id, 'severity': severity, 'status': status},
+                since_id=since_id, since=since, limit=limit)
+
+    def get_incident(self, incident_id):
+        return self.incident_index.get(incident_id)
+
+    def create_incident(self, description, camera_id=None, severity='medium'):
+        """Create an open incident report"""
+        with self.lock:
+            incident = {
+                'id': self.next_incident_id,
+                'timestamp': datetime.now().isoformat(),
+                'description': description,
+                'camera_id': camera_id,
+                'severity': severity,
+                'status': 'open'
+            }
+            return self._record({'type': 'incident', 'incident': incident})
+
+    def _add_incident(self, incident):
+        self.incident_index.add(incident)
+        self.next_incident_id = max(self.next_incident_id, incident['id'] + 1)
+        return incident
+
+    # Alerts
+
+    def list_alerts(self, camera_id=None, alert_type=None, acknowledged=None, since_id=None, since=None, limit=None):
+        """Alerts in creation order, optionally filtered and after a cursor (id or timestamp)"""
+        with self.lock:
+            return self.alert_index.query(
+                {'camera_id': camera_id, 'type': alert_type, 'acknowledged': acknowledged},
+                since_id=since_id, since=since, limit=limit)
+
+    def create_alert(self, message, camera_id=None, alert_type='info'):
+        """Create an unacknowledged alert"""
+        with self._camera_context(camera_id), self.lock:
+            alert = {
+                'id': self.next_alert_id,
+                'timestamp': datetime.now().isoformat(),
+                'message': message,
+                'camera_id': camera_id,
+                'type': alert_type,
+                'acknowledged': False,
+                'acknowledged_at': None
+            }
+            return self._record({'type': 'alert', 'alert': alert})
+
+    def _add_alert(self, alert):
+        if 'acknowledged_at' not in alert:
+            # Alerts journaled before the field existed
+            alert = dict(alert, acknowledged_at=None)
+        self.alert_index.add(alert)
+        self.next_alert_id = max(self.next_alert_id, alert['id'] + 1)
+        return alert
+
+    def get_alert(self, alert_id):
+        return self.alert_index.get(alert_id)
+
+    def acknowledge_alert(self, alert_id):
+        """Acknowledge an alert, returning it or None if it does not exist"""
+        with self.lock:
+            alert = self.alert_index.get(alert_id)
+            if alert is None or alert['acknowledged']:
+                return alert
+            return self._record({
+                'type': 'acknowledge',
+                'alert_ids': [alert_id],
+                'acknowledged_at': datetime.now().isoformat()
+            })[0]
+
+    def acknowledge_alerts(self, alert_ids=None, camera_id=None, before=None):
+        """
+        Acknowledge several alerts at once: the given ids, or all unacknowledged
+        alerts of a camera and/or created before a timestamp. Returns their ids.
+        """
+        with self.lock:
+            if alert_ids is not None:
+                ids = [alert_id for alert_id in alert_ids
+                       if self.alert_index.get(alert_id) is not None
+                       and not self.alert_index.get(alert_id)['acknowledged']]
+            else:
+                ids = [alert['id'] for alert in self.alert_index.query(
+                    {'camera_id': camera_id, 'acknowledged': False}, before=before)]
+            if ids:
+                self._record({
+                    'type': 'acknowledge',
+                    'alert_ids': ids,
+                    'acknowledged_at': datetime.now().isoformat()
+                })
+            return ids
+
+    def _apply_acknowledge(self, alert_ids, acknowledged_at):
+        acknowledged = []
+        for alert_id in alert_ids:
+            alert = self.alert_index.get(alert_id)
+            if alert is not None and not alert['acknowledged']:
+                acknowledged_alert = dict(alert, acknowledged=True, acknowledged_at=acknowledged_at)
+                self.alert_index.replace(alert, acknowledged_alert)
+                self.acknowledged_alerts.append(alert_id)
+                acknowledged.append(acknowledged_alert)
+        return acknowledged
+
+    def expire_alerts(self, now=None):
+        """Drop alerts acknowledged more than alert_ack_ttl seconds ago, returning how many"""
+        if not self.alert_ack_ttl:
+            return 0
+        cutoff = ((now or datetime.now()) - timedelta(seconds=self.alert_ack_ttl)).isoformat()
+        with self.lock:
+            expired = []
+            for alert_id in self.acknowledged_alerts:
+                alert = self.alert_index.get(alert_id)
+                if alert is not None and (alert.get('acknowledged_at') or '') >= cutoff:
+                    break
+                expired.append(alert_id)
+            if expired:
+                self._record({'type': 'expire', 'alert_ids': expired})
+            return len(expired)
+
+    def _apply_expire(self, alert_ids):
+        for alert_id in alert_ids:
+            alert = self.alert_index.get(alert_id)
+            if alert is not None:
+                self.alert_index.remove(alert)
+        # Expiry always removes the oldest acknowledgements first
+        expired = set(alert_ids)
+        while self.acknowledged_alerts and self.acknowledged_alerts[0] in expired:
+            self.acknowledged_alerts.popleft()
+        return len(alert_ids)
@@ -0,0 +1,122 @@
+import json
+import time
+import queue
+import threading
+from collections import deque
+
+
+class Subscription:
+    """A subscriber's bounded queue of events, filtered by camera and event type"""
+
+    def __init__(self, camera_ids=None, types=None, queue_size=1000):
+        self.camera_ids = set(camera_ids) if camera_ids else None
+        self.types = set(types) if types else None
+        self.events = queue.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def matches(self, event):
+        if self.types is not None and event['type'] not in self.types:
+            return False
+        # Events without a camera (e.g. bulk operations) go to every subscriber
+        if self.camera_ids is not None and event['camera_id'] is not None:
+            return event['camera_id'] in self.camera_ids
+        return True
+
+    def deliver(self, event):
+        if self.overflowed:
+            return
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            # A subscriber that cannot keep up gets disconnected and resumes with Last-Event-ID
+            self.overflowed = True
+
+    def get(self, timeout=None):
+        """Next event, or None if nothing arrived within timeout"""
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBus:
+    """
+    Publish/subscribe channel for alerts, acknowledgements, status changes and detections
+
+    Every event gets an increasing id and is kept in a bounded history, so a
+    subscriber that reconnects with the last id it saw receives what it missed.
+    """
+
+    def __init__(self, history_size=1000, queue_size=1000):
+        self.history = deque(maxlen=history_size)
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.next_id = 1
+        self.lock = threading.Lock()
+
+    def publish(self, event_type, data, camera_id=None):
+        """
+        Assign an id to an event, remember it and deliver it to matching subscribers
+
+        Delivery happens under the lock (it never blocks, a full queue just
+        overflows) so every subscriber receives events in id order, and one
+        subscribing meanwhile gets each event once, from the replay or from here.
+        """
+        with self.lock:
+            event = {
+                'id': self.next_id,
+                'type': event_type,
+                'camera_id': camera_id,
+                'timestamp': time.time(),
+                'data': data
+            }
+            self.next_id += 1
+            self.history.append(event)
+            for subscription in self.subscribers:
+                if subscription.matches(event):
+                    subscription.deliver(event)
+        return event
+
+    def subscribe(self, camera_ids=None, types=None, last_event_id=None):
+        """
+        Register a subscriber, replaying the history after last_event_id
+
+        If events after last_event_id already left the history, a 'gap' event is
+        queued first so the client knows to refetch through the REST endpoints.
+        """
+        subscription = Subscription(camera_ids, types, self.queue_size)
+        with self.lock:
+            if last_event_id is not None:
+                oldest_id = self.history[0]['id'] if self.history else self.next_id
+                if last_event_id + 1 < oldest_id:
+                    subscription.deliver({
+                        'id': oldest_id - 1,
+                        'type': 'gap',
+                        'camera_id': None,
+                        'timestamp': time.time(),
+                        'data': {'missed_after': last_event_id}
+                    })
+                for event in self.history:
+                    if event['id'] > last_event_id and subscription.matches(event):
+                        subscription.deliver(event)
+            self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        with self.lock:
+            return len(self.subscribers)
+
+
+def format_sse(event):
+    """Format an event for a text/event-stream response"""
+    payload = json.dumps({
+        'type': event['type'],
+        'camera_id': event['camera_id'],
+        'timestamp': event['timestamp'],
+        'data': event['data']
+    })
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {payload}\n\n"
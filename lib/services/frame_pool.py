@@ -0,0 +1,115 @@
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+try:
+    import simplejpeg  # Decodes JPEGs straight into a pooled buffer (pip install simplejpeg)
+except ImportError:
+    simplejpeg = None
+
+
+class FramePool:
+    """
+    Preallocated frame buffers per resolution, reused by every decode
+
+    The first frame of a resolution allocates `buffers` arrays of that shape; later
+    decodes lease a free one and the caller gives it back with release() once the
+    detector is done with the frame, so steady-state decoding allocates no frame
+    memory. Only decodes that can write into a given array use the pool: JPEGs
+    with simplejpeg installed, and frames a VideoCapture reads in place (see
+    stream_ingest). OpenCV's imdecode always allocates its own array, so without
+    simplejpeg (and for PNG) the decoded frame is returned as is rather than
+    copied into a buffer. When every buffer of a resolution is leased, or
+    `max_resolutions` are already pooled and none can be evicted, the frame is
+    decoded into a fresh array. release() ignores frames that are not pooled.
+    """
+
+    def __init__(self, buffers=16, max_resolutions=4):
+        self.buffers = buffers
+        self.max_resolutions = max_resolutions
+        self.free = OrderedDict()   # shape -> free buffers, least recently used resolution first
+        self.leased = {}            # id(buffer) -> (shape, buffer)
+        self.allocated = {}         # shape -> number of buffers of that shape
+        self.decodes = 0
+        self.unpooled = 0
+        self.overflows = 0
+        self.lock = threading.Lock()
+
+    def decode(self, data):
+        """Decode a JPEG/PNG (into a pooled buffer if simplejpeg can read it), or None if data is not a valid image"""
+        with self.lock:
+            self.decodes += 1
+        if simplejpeg is not None and data[:2] == b'\xff\xd8':
+            try:
+                height, width, _, _ = simplejpeg.decode_jpeg_header(data)
+                frame = self.acquire((height, width, 3))
+                if frame is None:
+                    return simplejpeg.decode_jpeg(data, colorspace='BGR')
+                try:
+                    simplejpeg.decode_jpeg(data, colorspace='BGR', buffer=frame)
+                except ValueError:
+                    self.release(frame)
+                    raise
+                return frame
+            except ValueError:
+                pass  # Not something simplejpeg reads (e.g. CMYK, truncated): let OpenCV try
+
+        # OpenCV cannot decode into an existing array: copying its result into a buffer would only add work
+        with self.lock:
+            self.unpooled += 1
+        return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+    def acquire(self, shape):
+        """Lease a free buffer of this shape, or None if the pool has none to give"""
+        with self.lock:
+            free = self.free.get(shape)
+            if free is None:
+                if not self._make_room():
+                    self.overflows += 1
+                    return None
+                free = self.free[shape] = [np.empty(shape, np.uint8) for _ in range(self.buffers)]
+                self.allocated[shape] = self.buffers
+            self.free.move_to_end(shape)
+            if not free:
+                self.overflows += 1
+                return None
+            frame = free.pop()
+            self.leased[id(frame)] = (shape, frame)
+            return frame
+
+    def release(self, frame):
+        """Give a leased buffer back (frames that did not come from the pool are ignored)"""
+        with self.lock:
+            entry = self.leased.get(id(frame))
+            if entry is None or entry[1] is not frame:
+                return
+            del self.leased[id(frame)]
+            # Resolutions are only evicted with no buffer leased, so this one is still pooled
+            self.free[entry[0]].append(frame)
+
+    def get_stats(self):
+        """Pooled resolutions with their free and leased buffers, decodes (and those OpenCV made unpooled) and overflows"""
+        with self.lock:
+            leased = {}
+            for shape, _ in self.leased.values():
+                leased[shape] = leased.get(shape, 0) + 1
+            return {
+                'decoder': 'simplejpeg' if simplejpeg is not None else 'opencv',
+                'resolutions': {f"{shape[1]}x{shape[0]}": {'free': len(free), 'leased': leased.get(shape, 0)}
+                                for shape, free in self.free.items()},
+                'decodes': self.decodes,
+                'unpooled': self.unpooled,
+                'overflows': self.overflows
+            }
+
+    def _make_room(self):
+        """Check a new resolution fits, evicting the least recently used one with no leased buffer"""
+        if len(self.free) < self.max_resolutions:
+            return True
+        for shape, free in self.free.items():
+            if len(free) == self.allocated[shape]:
+                del self.free[shape]
+                del self.allocated[shape]
+                return True
+        return False
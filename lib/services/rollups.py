@@ -0,0 +1,143 @@
+from datetime import datetime
+
+
+# Bucket sizes in seconds, finest first
+RESOLUTIONS = {'minute': 60, 'hour': 3600, 'day': 86400}
+
+# Seconds each resolution is kept; older buckets only survive in the coarser ones
+DEFAULT_RETENTION = {'minute': 6 * 3600, 'hour': 7 * 86400, 'day': 365 * 86400}
+
+# Values of a bucket, in this order
+FIELDS = ('connected_seconds', 'observed_seconds', 'disconnects', 'detections', 'alerts')
+CONNECTED, OBSERVED, DISCONNECTS, DETECTIONS, ALERTS = range(len(FIELDS))
+
+# Buckets start at local minute, hour and day boundaries (offset taken at startup)
+UTC_OFFSET = datetime.now().astimezone().utcoffset().total_seconds()
+
+
+def bucket_start(timestamp, size):
+    """Start (epoch seconds) of the bucket of the given size containing timestamp"""
+    return int((timestamp + UTC_OFFSET) // size * size - UTC_OFFSET)
+
+
+def _spread(since, until, size):
+    """Split the interval [since, until) into (bucket start, seconds) pieces"""
+    current = since
+    while current < until:
+        start = bucket_start(current, size)
+        end = min(start + size, until)
+        yield start, end - current
+        current = end
+
+
+class CameraRollup:
+    """
+    Per-minute, per-hour and per-day aggregates of one camera
+
+    Every resolution is updated as events arrive, so coarse buckets are exact
+    and a range query reads one bucket per step, however many raw events there
+    were. Connected and observed seconds are accounted when the state changes
+    (and, for the current state, virtually at query time).
+    """
+
+    def __init__(self, track_changes=False):
+        self.buckets = {resolution: {} for resolution in RESOLUTIONS}
+        self.connected = None
+        # Time up to which connected/observed seconds are in the buckets
+        self.since = None
+        # Buckets changed since the last flush, for stores that write them out (SQLite)
+        self.changed = set() if track_changes else None
+
+    def _bucket(self, resolution, start):
+        bucket = self.buckets[resolution].get(start)
+        if bucket is None:
+            bucket = self.buckets[resolution][start] = [0.0, 0.0, 0, 0, 0]
+        if self.changed is not None:
+            self.changed.add((resolution, start))
+        return bucket
+
+    def record_status(self, timestamp, connected, retention):
+        """Account the previous state up to timestamp, then switch to the new one"""
+        if self.connected is not None and self.since is not None and timestamp > self.since:
+            for resolution, size in RESOLUTIONS.items():
+                # Nothing older than the retention would be kept anyway
+                since = max(self.since, timestamp - retention[resolution])
+                for start, seconds in _spread(since, timestamp, size):
+                    bucket = self._bucket(resolution, start)
+                    bucket[OBSERVED] += seconds
+                    if self.connected:
+                        bucket[CONNECTED] += seconds
+        if self.since is None or timestamp > self.since:
+            self.since = timestamp
+
+        connected = bool(connected)
+        if not connected and self.connected is not False:
+            self.record_count(timestamp, DISCONNECTS)
+        self.connected = connected
+
+    def record_count(self, timestamp, field):
+        """Count one event (DISCONNECTS, DETECTIONS or ALERTS) in every resolution"""
+        for resolution, size in RESOLUTIONS.items():
+            self._bucket(resolution, bucket_start(timestamp, size))[field] += 1
+
+    def query(self, resolution, start, end, now):
+        """Buckets of a resolution overlapping [start, end), oldest first"""
+        size = RESOLUTIONS[resolution]
+        buckets = self.buckets[resolution]
+        first = bucket_start(start, size)
+
+        # The current state counts up to now without changing the stored buckets
+        pending = {}
+        if self.connected is not None and self.since is not None:
+            for bucket, seconds in _spread(max(self.since, first), min(now, end), size):
+                pending[bucket] = seconds
+
+        rows = []
+        for bucket in range(first, int(end), size):
+            values = buckets.get(bucket)
+            extra = pending.get(bucket, 0.0)
+            if values is None and not extra:
+                continue
+            connected, observed, disconnects, detections, alerts = values or (0.0, 0.0, 0, 0, 0)
+            observed += extra
+            if self.connected:
+                connected += extra
+            rows.append({
+                'start': datetime.fromtimestamp(bucket).isoformat(),
+                'uptime_percent': 100.0 * connected / observed if observed else None,
+                'connected_seconds': connected,
+                'observed_seconds': observed,
+                'disconnects': disconnects,
+                'detections': detections,
+                'alerts': alerts
+            })
+        return rows
+
+    def prune(self, now, retention):
+        """Drop buckets that ended more than their resolution's retention ago, returning how many"""
+        pruned = 0
+        for resolution, size in RESOLUTIONS.items():
+            cutoff = now - retention[resolution] - size
+            buckets = self.buckets[resolution]
+            for start in [start for start in buckets if start < cutoff]:
+                del buckets[start]
+                pruned += 1
+        return pruned
+
+    def to_dict(self):
+        return {
+            'connected': self.connected,
+            'since': self.since,
+            'buckets': {resolution: [[start] + values for start, values in buckets.items()]
+                        for resolution, buckets in self.buckets.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data, track_changes=False):
+        rollup = cls(track_changes)
+        rollup.connected = data.get('connected')
+        rollup.since = data.get('since')
+        for resolution, rows in data.get('buckets', {}).items():
+            if resolution in rollup.buckets:
+                rollup.buckets[resolution] = {row[0]: list(row[1:]) for row in rows}
+        return rollup
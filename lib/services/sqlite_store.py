@@ -0,0 +1,344 @@
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from camera_store import CameraStore, ConnectionHistory
+from rollups import RESOLUTIONS, DETECTIONS, ALERTS
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cameras (
+    camera_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    analytics TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS status_events (
+    id INTEGER PRIMARY KEY,
+    camera_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    connected INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_status_events_camera ON status_events (camera_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_status_events_timestamp ON status_events (timestamp);
+CREATE TABLE IF NOT EXISTS incidents (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    description TEXT NOT NULL,
+    camera_id TEXT,
+    severity TEXT NOT NULL,
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_incidents_camera ON incidents (camera_id, id);
+CREATE INDEX IF NOT EXISTS idx_incidents_timestamp ON incidents (timestamp);
+CREATE INDEX IF NOT EXISTS idx_incidents_severity ON incidents (severity, id);
+CREATE INDEX IF NOT EXISTS idx_incidents_status ON incidents (status, id);
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    message TEXT NOT NULL,
+    camera_id TEXT,
+    type TEXT NOT NULL,
+    acknowledged INTEGER NOT NULL DEFAULT 0,
+    acknowledged_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_alerts_camera ON alerts (camera_id, acknowledged, id);
+CREATE INDEX IF NOT EXISTS idx_alerts_timestamp ON alerts (timestamp);
+CREATE INDEX IF NOT EXISTS idx_alerts_type ON alerts (type, id);
+CREATE INDEX IF NOT EXISTS idx_alerts_acknowledged ON alerts (acknowledged, id);
+CREATE TABLE IF NOT EXISTS rollups (
+    camera_id TEXT NOT NULL,
+    resolution TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    connected_seconds REAL NOT NULL,
+    observed_seconds REAL NOT NULL,
+    disconnects INTEGER NOT NULL,
+    detections INTEGER NOT NULL,
+    alerts INTEGER NOT NULL,
+    PRIMARY KEY (camera_id, resolution, start)
+);
+CREATE INDEX IF NOT EXISTS idx_rollups_resolution ON rollups (resolution, start);
+'''
+
+MIGRATIONS = (
+    ('alerts', 'acknowledged_at', 'ALTER TABLE alerts ADD COLUMN acknowledged_at TEXT'),
+    ('cameras', 'rollup_state', 'ALTER TABLE cameras ADD COLUMN rollup_state TEXT'),
+)
+
+POST_MIGRATION_SCHEMA = '''
+CREATE INDEX IF NOT EXISTS idx_alerts_acknowledged_at ON alerts (acknowledged_at) WHERE acknowledged = 1;
+'''
+
+INCIDENT_COLUMNS = ('id', 'timestamp', 'description', 'camera_id', 'severity', 'status')
+ALERT_COLUMNS = ('id', 'timestamp', 'message', 'camera_id', 'type', 'acknowledged')
+
+
+class SQLiteCameraStore(CameraStore):
+    """
+    CameraStore keeping incidents, alerts and the full status history in SQLite
+
+    Current status and analytics of each camera stay in memory (they are bounded
+    by the number of cameras) and are mirrored to the cameras table; everything
+    that grows with history lives only in the database, in WAL mode, so
+    filtered queries go through indexes instead of scanning lists.
+    """
+
+    def __init__(self, db_file, alert_ack_ttl=3600, history_size=100, rollup_retention=None):
+        super().__init__(db_file, alert_ack_ttl=alert_ack_ttl, history_size=history_size,
+                         rollup_retention=rollup_retention)
+        self.db_file = db_file
+        # Changed rollup buckets are written in the same transaction as the event
+        self.track_rollup_changes = True
+        self.connection = None
+        self.readers = threading.local()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.db_file, check_same_thread=False)
+        connection.row_factory = sqlite3.Row
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    def _reader(self):
+        """Per-thread read connection, so readers never wait for the writer (WAL)"""
+        connection = getattr(self.readers, 'connection', None)
+        if connection is None:
+            connection = self._connect()
+            self.readers.connection = connection
+        return connection
+
+    # Persistence
+
+    def load(self):
+        """Open the database and load the current status and analytics of every camera"""
+        with self.lock:
+            self.connection = self._connect()
+            self.connection.executescript(SCHEMA)
+            for table, column, statement in MIGRATIONS:
+                columns = [row['name'] for row in self.connection.execute(f'PRAGMA table_info({table})')]
+                if column not in columns:
+                    self.connection.execute(statement)
+            self.connection.executescript(POST_MIGRATION_SCHEMA)
+            for row in self.connection.execute('SELECT camera_id, status, analytics, rollup_state FROM cameras'):
+                self.camera_status[row['camera_id']] = json.loads(row['status'])
+                self.camera_analytics[row['camera_id']] = ConnectionHistory.from_dict(
+                    json.loads(row['analytics']), self.history_size)
+                if row['rollup_state']:
+                    state = json.loads(row['rollup_state'])
+                    rollup = self._rollup(row['camera_id'])
+                    rollup.connected, rollup.since = state['connected'], state['since']
+            for row in self.connection.execute('SELECT * FROM rollups'):
+                self._rollup(row['camera_id']).buckets[row['resolution']][row['start']] = [
+                    row['connected_seconds'], row['observed_seconds'], row['disconnects'],
+                    row['detections'], row['alerts']]
+
+    def snapshot(self):
+        status, analytics, rollups, _ = self._camera_snapshot()
+        return {
+            'analytics': analytics,
+            'incidents': self.list_incidents(),
+            'alerts': self.list_alerts(),
+            'status': status,
+            'rollups': rollups
+        }
+
+    def compact(self):
+        """Checkpoint the WAL into the main database file"""
+        with self.lock:
+            self.connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            return 0
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+    # Camera status and analytics
+
+    def update_status(self, camera_id, data):
+        """Record a status update of a camera"""
+        return self.update_statuses([(camera_id, data)])[0]
+
+    def update_statuses(self, updates):
+        """Record several status updates, a list of (camera_id, data), in one transaction"""
+        timestamp = datetime.now().isoformat()
+        with self._camera_locks(camera_id for camera_id, _ in updates):
+            statuses = [self._apply_status(camera_id, data, timestamp) for camera_id, data in updates]
+            with self.lock, self.connection:
+                self.connection.executemany(
+                    'INSERT INTO status_events (camera_id, timestamp, connected, data) VALUES (?, ?, ?, ?)',
+                    [(camera_id, timestamp, _optional_bool(data.get('connected')), json.dumps(data))
+                     for camera_id, data in updates])
+                # Only the final state of each camera is written
+                camera_ids = list(dict.fromkeys(camera_id for camera_id, _ in updates))
+                self.connection.executemany(
+                    'INSERT OR REPLACE INTO cameras (camera_id, status, analytics, rollup_state) VALUES (?, ?, ?, ?)',
+                    [self._camera_row(camera_id) for camera_id in camera_ids])
+                for camera_id in camera_ids:
+                    self._write_rollup(camera_id)
+            return statuses
+
+    def _camera_row(self, camera_id):
+        rollup = self._rollup(camera_id)
+        return (camera_id, json.dumps(self.camera_status[camera_id]),
+                json.dumps(self.camera_analytics[camera_id].to_dict()),
+                json.dumps({'connected': rollup.connected, 'since': rollup.since}))
+
+    # Rollups
+
+    def _write_rollup(self, camera_id):
+        """Write the changed buckets of a camera (inside the caller's transaction)"""
+        rollup = self.camera_rollups.get(camera_id)
+        if rollup is None or not rollup.changed:
+            return
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO rollups (camera_id, resolution, start, connected_seconds, observed_seconds, '
+            'disconnects, detections, alerts) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            [(camera_id, resolution, start, *rollup.buckets[resolution][start])
+             for resolution, start in rollup.changed if start in rollup.buckets[resolution]])
+        rollup.changed.clear()
+
+    def record_detection(self, camera_id):
+        """Count a frame in which weapons were detected"""
+        with self._camera_lock(camera_id), self.lock, self.connection:
+            self._rollup(camera_id).record_count(time.time(), DETECTIONS)
+            self._write_rollup(camera_id)
+
+    def prune_rollups(self, now=None):
+        """Drop rollup buckets past their retention, returning how many"""
+        now = time.time() if now is None else now
+        pruned = super().prune_rollups(now)
+        with self.lock, self.connection:
+            for resolution, size in RESOLUTIONS.items():
+                self.connection.execute('DELETE FROM rollups WHERE resolution = ? AND start < ?',
+                                        (resolution, now - self.rollup_retention[resolution] - size))
+        return pruned
+
+    # Incidents
+
+    def list_incidents(self, camera_id=None, severity=None, status=None, since_id=None, since=None, limit=None):
+        """Incidents in creation order, optionally filtered and after a cursor (id or timestamp)"""
+        where, params = _where({'camera_id': camera_id, 'severity': severity, 'status': status}, since_id, since)
+        rows = self._reader().execute(f'SELECT * FROM incidents{where} ORDER BY id{_limit(limit)}', params)
+        return [dict(row) for row in rows]
+
+    def get_incident(self, incident_id):
+        row = self._reader().execute('SELECT * FROM incidents WHERE id = ?', (incident_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def create_incident(self, description, camera_id=None, severity='medium'):
+        """Create an open incident report"""
+        incident = {
+            'timestamp': datetime.now().isoformat(),
+            'description': description,
+            'camera_id': camera_id,
+            'severity': severity,
+            'status': 'open'
+        }
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO incidents (timestamp, description, camera_id, severity, status) VALUES (?, ?, ?, ?, ?)',
+                tuple(incident[column] for column in INCIDENT_COLUMNS[1:]))
+        return dict(incident, id=cursor.lastrowid)
+
+    # Alerts
+
+    def list_alerts(self, camera_id=None, alert_type=None, acknowledged=None, since_id=None, since=None, limit=None):
+        """Alerts in creation order, optionally filtered and after a cursor (id or timestamp)"""
+        where, params = _where({'camera_id': camera_id, 'type': alert_type,
+                                'acknowledged': _optional_bool(acknowledged)}, since_id, since)
+        rows = self._reader().execute(f'SELECT * FROM alerts{where} ORDER BY id{_limit(limit)}', params)
+        return [_alert_from_row(row) for row in rows]
+
+    def create_alert(self, message, camera_id=None, alert_type='info'):
+        """Create an unacknowledged alert"""
+        alert = {
+            'timestamp': datetime.now().isoformat(),
+            'message': message,
+            'camera_id': camera_id,
+            'type': alert_type,
+            'acknowledged': False,
+            'acknowledged_at': None
+        }
+        with self._camera_context(camera_id), self.lock, self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO alerts (timestamp, message, camera_id, type, acknowledged) VALUES (?, ?, ?, ?, 0)',
+                tuple(alert[column] for column in ALERT_COLUMNS[1:5]))
+            if camera_id is not None:
+                self._rollup(camera_id).record_count(datetime.fromisoformat(alert['timestamp']).timestamp(), ALERTS)
+                self._write_rollup(camera_id)
+        return dict(alert, id=cursor.lastrowid)
+
+    def get_alert(self, alert_id):
+        row = self._reader().execute('SELECT * FROM alerts WHERE id = ?', (alert_id,)).fetchone()
+        return _alert_from_row(row) if row is not None else None
+
+    def acknowledge_alert(self, alert_id):
+        """Acknowledge an alert, returning it or None if it does not exist"""
+        with self.lock, self.connection:
+            self.connection.execute(
+                'UPDATE alerts SET acknowledged = 1, acknowledged_at = ? WHERE id = ? AND acknowledged = 0',
+                (datetime.now().isoformat(), alert_id))
+            row = self.connection.execute('SELECT * FROM alerts WHERE id = ?', (alert_id,)).fetchone()
+        return _alert_from_row(row) if row is not None else None
+
+    def acknowledge_alerts(self, alert_ids=None, camera_id=None, before=None):
+        """
+        Acknowledge several alerts at once: the given ids, or all unacknowledged
+        alerts of a camera and/or created before a timestamp. Returns their ids.
+        """
+        if alert_ids is not None:
+            if not alert_ids:
+                return []
+            where = f' WHERE acknowledged = 0 AND id IN ({", ".join("?" for _ in alert_ids)})'
+            params = list(alert_ids)
+        else:
+            where, params = _where({'camera_id': camera_id, 'acknowledged': 0})
+            if before is not None:
+                where += ' AND timestamp < ?'
+                params.append(before)
+        with self.lock, self.connection:
+            ids = [row['id'] for row in self.connection.execute(f'SELECT id FROM alerts{where} ORDER BY id', params)]
+            self.connection.execute(
+                f'UPDATE alerts SET acknowledged = 1, acknowledged_at = ?{where}', [datetime.now().isoformat()] + params)
+        return ids
+
+    def expire_alerts(self, now=None):
+        """Delete alerts acknowledged more than alert_ack_ttl seconds ago, returning how many"""
+        if not self.alert_ack_ttl:
+            return 0
+        cutoff = ((now or datetime.now()) - timedelta(seconds=self.alert_ack_ttl)).isoformat()
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                'DELETE FROM alerts WHERE acknowledged = 1 AND acknowledged_at < ?', (cutoff,))
+        return cursor.rowcount
+
+
+def _optional_bool(value):
+    return None if value is None else int(bool(value))
+
+
+def _where(filters, since_id=None, since=None):
+    """Build a WHERE clause from the filters that are not None and the cursor bounds"""
+    clauses = [f'{column} = ?' for column, value in filters.items() if value is not None]
+    params = [value for value in filters.values() if value is not None]
+    if since_id is not None:
+        clauses.append('id > ?')
+        params.append(since_id)
+    if since is not None:
+        clauses.append('timestamp > ?')
+        params.append(since)
+    return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+
+def _limit(limit):
+    return f' LIMIT {int(limit)}' if limit is not None else ''
+
+
+def _alert_from_row(row):
+    alert = dict(row)
+    alert['acknowledged'] = bool(alert['acknowledged'])
+    return alert